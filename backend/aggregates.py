@@ -0,0 +1,301 @@
+import os
+import re
+import time
+import threading
+from collections import Counter
+from sqlalchemy import func, update
+from metrics import metrics, DB_READ_SECONDS
+from models import db, postComment, postSentiment, postSentimentTrend, postSentimentFacet, utcnow, COMMENT_PAGE_SIZE
+from sentinel_analysis_ai.analyzer import analyzer, general_sentiment, ANALYSIS_VERSION
+
+# Aggregate settings
+SENTIMENT_TREND_BUCKET = os.getenv("SENTIMENT_TREND_BUCKET", "day")  # "day" or "hour"
+
+# UI text the scraper can pick up along with comments, never analyzed
+COMMENT_FILTERS = ["reply", "replies", "translation", "like", "meta", "instagram"]
+
+LABELS = ("positive", "neutral", "negative", "spam")
+
+HASHTAG_PATTERN = re.compile(r"#(\w+)")
+
+AGGREGATE_SECONDS = metrics.histogram("sentinel_aggregate_refresh_seconds", "Duration of rolling a post's new comments into its aggregates")
+COMMENTS_ROLLED_UP = metrics.counter("sentinel_comments_rolled_up_total", "Comments added to post aggregates, by whether they were analyzed", ["result"])
+
+# one refresh per post at a time, so no comment is counted twice
+post_locks = {}
+post_locks_lock = threading.Lock()
+
+
+def post_lock(post_pk: int) -> threading.Lock:
+    with post_locks_lock:
+        return post_locks.setdefault(post_pk, threading.Lock())
+
+
+def is_ui_text(comment: str) -> bool:
+    """True for scraped text that is part of Instagram's UI rather than a comment"""
+    text = (comment or "").lower()
+    return any(f in text for f in COMMENT_FILTERS)
+
+
+def trend_bucket(created_at: str) -> str:
+    """Day ("YYYY-MM-DD") or hour ("YYYY-MM-DDTHH") a comment's created_at falls in"""
+    return created_at[:13] if SENTIMENT_TREND_BUCKET == "hour" else created_at[:10]
+
+
+def comment_hashtags(comment: str) -> set:
+    """Hashtags of a comment in lower case, without the leading #"""
+    return {tag.lower()[:100] for tag in HASHTAG_PATTERN.findall(comment or "")}
+
+
+def empty_tally() -> dict:
+    return {**dict.fromkeys(LABELS, 0), "confidence_sum": 0.0, "score_sum": 0.0}
+
+
+def add_result(tally: dict, label: str, confidence: float):
+    """
+    Count one analysis result
+
+    Spam is only counted. Other comments add their confidence to
+    confidence_sum, and to score_sum with a sign (+ positive, - negative),
+    so score_sum / confidence_sum is a confidence-weighted score in [-1, 1].
+    """
+    label = label if label in LABELS else "neutral"
+    tally[label] += 1
+    if label == "spam":
+        return
+    tally["confidence_sum"] += confidence
+    if label == "positive":
+        tally["score_sum"] += confidence
+    elif label == "negative":
+        tally["score_sum"] -= confidence
+
+
+def add_tally(row, tally: dict):
+    """Add a tally's counts and sums to an aggregate, trend or facet row"""
+    for field, value in tally.items():
+        setattr(row, field, (getattr(row, field) or 0) + value)
+
+
+def upsert_tallies(model, post_pk: int, column: str, tallies: dict, **fixed):
+    """
+    Add tallies to a post's trend or facet rows, creating the missing ones
+
+    Args:
+        model: postSentimentTrend or postSentimentFacet
+        post_pk (int): Post the rows belong to
+        column (str): Column the tallies are keyed by ("bucket" or "value")
+        tallies (dict): column value -> tally
+        fixed: Other column values of the rows (the facet's dimension)
+    """
+    if not tallies:
+        return
+    key_column = getattr(model, column)
+    filters = [getattr(model, field) == value for field, value in fixed.items()]
+    existing = {
+        getattr(row, column): row
+        for row in model.query.filter(model.post_pk == post_pk, key_column.in_(list(tallies)), *filters)
+    }
+    for key, tally in tallies.items():
+        row = existing.get(key)
+        if row is None:
+            row = model(post_pk=post_pk, **fixed, **{column: key}, **empty_tally())
+            db.session.add(row)
+        add_tally(row, tally)
+
+
+def rates(counts: dict, confidence_sum: float, score_sum: float) -> dict:
+    """
+    Ratios of a set of label counts
+
+    Returns:
+        dict: analyzed, counts, spam ratio, and the average confidence and
+        confidence-weighted sentiment score of the non-spam comments
+    """
+    analyzed = sum(counts.values())
+    opinions = analyzed - counts["spam"]
+    return {
+        "analyzed": analyzed,
+        "counts": counts,
+        "spam_ratio": round(counts["spam"] / analyzed, 4) if analyzed else 0.0,
+        "average_confidence": round(confidence_sum / opinions, 4) if opinions else 0.0,
+        "sentiment_score": sentiment_score(score_sum, confidence_sum),
+    }
+
+
+# -------------------
+# Reads
+# -------------------
+def get_aggregate(post_pk: int):
+    """The post's aggregate row, or None if it was never analyzed"""
+    with DB_READ_SECONDS.time(query="post_sentiment"):
+        return postSentiment.query.filter_by(post_pk=post_pk).first()
+
+
+def get_trend(post_pk: int) -> list:
+    """The post's trend rows, oldest bucket first"""
+    with DB_READ_SECONDS.time(query="post_sentiment_trend"):
+        return postSentimentTrend.query.filter_by(post_pk=post_pk).order_by(postSentimentTrend.bucket).all()
+
+
+def unanalyzed_comments(post_pk: int, after_id: int, limit: int) -> list:
+    """One page of the post's comments newer than the aggregate's watermark"""
+    with DB_READ_SECONDS.time(query="unanalyzed_comments"):
+        return (
+            db.session.query(postComment.id, postComment.comment, postComment.created_at)
+            .filter(postComment.post_pk == post_pk, postComment.id > after_id)
+            .order_by(postComment.id)
+            .limit(limit)
+            .all()
+        )
+
+
+def sentiment_score(score_sum: float, confidence_sum: float) -> float:
+    return round(score_sum / confidence_sum, 4) if confidence_sum else 0.0
+
+
+def summarize(aggregate, trend: list | None = None) -> dict:
+    """
+    Post summary from its aggregate row (and trend rows, if given)
+
+    Returns:
+        dict: general_sentiment, label counts, spam ratio, average confidence
+        and confidence-weighted sentiment score of the non-spam comments,
+        language mix and, with trend rows, the same per time bucket
+    """
+    counts = {label: getattr(aggregate, label) for label in LABELS}
+    summary = {
+        "post_id": aggregate.post_id,
+        "general_sentiment": aggregate.label,
+        **rates(counts, aggregate.confidence_sum, aggregate.score_sum),
+        "languages": dict(sorted((aggregate.languages or {}).items(), key=lambda item: -item[1])),
+        "updated_at": aggregate.updated_at.isoformat() if aggregate.updated_at else None,
+    }
+    if trend is not None:
+        summary["trend_bucket"] = SENTIMENT_TREND_BUCKET
+        summary["trend"] = [
+            {
+                "bucket": row.bucket,
+                "counts": {label: getattr(row, label) for label in LABELS},
+                "sentiment_score": sentiment_score(row.score_sum, row.confidence_sum),
+            }
+            for row in trend
+        ]
+    return summary
+
+
+# -------------------
+# Incremental refresh
+# -------------------
+def reset_aggregate(aggregate):
+    """Forget everything rolled in, so all comments are analyzed again"""
+    for field in LABELS + ("analyzed", "analyzed_until"):
+        setattr(aggregate, field, 0)
+    aggregate.confidence_sum = 0.0
+    aggregate.score_sum = 0.0
+    aggregate.languages = {}
+    aggregate.analysis_version = ANALYSIS_VERSION
+    postSentimentTrend.query.filter_by(post_pk=aggregate.post_pk).delete()
+    postSentimentFacet.query.filter_by(post_pk=aggregate.post_pk).delete()
+
+
+def roll_in(aggregate, rows: list, results: list):
+    """Store the results on their comment rows and add them to the post, trend and facet aggregates"""
+    tally = empty_tally()
+    buckets = {}
+    facets = {"language": {}, "hashtag": {}}
+    languages = Counter(aggregate.languages or {})
+    updates = []
+    now = utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    for row, result in zip(rows, results):
+        label, confidence = result["label"], float(result["confidence"])
+        updates.append({
+            "id": row.id,
+            "label": label,
+            "confidence": confidence,
+            "detected_language": result["detected_language"],
+            "model_used": result["model_used"],
+        })
+        add_result(tally, label, confidence)
+        add_result(buckets.setdefault(trend_bucket(row.created_at or now), empty_tally()), label, confidence)
+        language = result["detected_language"] or "unknown"
+        languages[language] += 1
+        add_result(facets["language"].setdefault(language, empty_tally()), label, confidence)
+        for hashtag in comment_hashtags(row.comment):
+            add_result(facets["hashtag"].setdefault(hashtag, empty_tally()), label, confidence)
+
+    if updates:
+        db.session.execute(update(postComment), updates)
+
+    add_tally(aggregate, tally)
+    aggregate.analyzed += len(results)
+    aggregate.languages = dict(languages)  # reassigned so the JSON column is written
+
+    upsert_tallies(postSentimentTrend, aggregate.post_pk, "bucket", buckets)
+    for dimension, tallies in facets.items():
+        upsert_tallies(postSentimentFacet, aggregate.post_pk, "value", tallies, dimension=dimension)
+
+
+def refresh_post_aggregate(post, progress=None, page_size: int = COMMENT_PAGE_SIZE):
+    """
+    Analyze the post's comments that are not rolled up yet and add them to its aggregates
+
+    Comments are read page by page after the aggregate's watermark (the
+    last comment id already counted), so only newly ingested comments are
+    analyzed. Each page is analyzed first and then commits its
+    per-comment results, the aggregate, trend and facet increments and
+    the new watermark together. The aggregate is rebuilt from scratch
+    when ANALYSIS_VERSION changes.
+
+    Args:
+        post (Post): Post to refresh
+        progress (callable): progress(stage, done, total), as for jobs
+        page_size (int): Comments analyzed per page
+
+    Returns:
+        postSentiment: The up-to-date aggregate row
+    """
+    progress = progress or (lambda stage, done=0, total=0: None)
+    started = time.perf_counter()
+    with post_lock(post.id):
+        aggregate = get_aggregate(post.id)
+        if aggregate is None:
+            aggregate = postSentiment(
+                post_id=post.post_id, post_pk=post.id, analysis_version=ANALYSIS_VERSION,
+                label=general_sentiment(0, 0, 0), languages={}, analyzed=0, analyzed_until=0, **empty_tally()
+            )
+            db.session.add(aggregate)
+        elif aggregate.analysis_version != ANALYSIS_VERSION:
+            reset_aggregate(aggregate)
+        # no write transaction may stay open while the models run: the result
+        # cache writes to the same SQLite database through its own connection
+        db.session.commit()
+
+        total = (
+            db.session.query(func.count(postComment.id))
+            .filter(postComment.post_pk == post.id, postComment.id > aggregate.analyzed_until)
+            .scalar()
+        )
+        done = 0
+        progress("sentiment", done, total)
+        while True:
+            page = unanalyzed_comments(post.id, aggregate.analyzed_until, page_size)
+            if not page:
+                break
+            rows = [row for row in page if not is_ui_text(row.comment)]
+            results = analyzer.analyze_dicts([row.comment for row in rows]) if rows else []
+            roll_in(aggregate, rows, results)
+            aggregate.analyzed_until = page[-1].id
+            aggregate.label = general_sentiment(aggregate.positive, aggregate.neutral, aggregate.negative)
+            aggregate.updated_at = utcnow()
+            db.session.commit()
+
+            COMMENTS_ROLLED_UP.inc(len(rows), result="analyzed")
+            COMMENTS_ROLLED_UP.inc(len(page) - len(rows), result="filtered")
+            done += len(page)
+            progress("sentiment", done, total)
+            if len(page) < page_size:
+                break
+
+        db.session.commit()
+    AGGREGATE_SECONDS.observe(time.perf_counter() - started)
+    return aggregate
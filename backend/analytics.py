@@ -0,0 +1,127 @@
+import io
+from datetime import date, timedelta
+from sqlalchemy import func, select
+from metrics import DB_READ_SECONDS
+from models import db, Post, postSentiment, postSentimentTrend, postSentimentFacet
+from aggregates import LABELS, SENTIMENT_TREND_BUCKET, rates
+
+# dimensions /api/analytics can group by
+GROUP_BY = ("campaign", "hashtag", "language", "day")
+
+# most groups returned by one query (days are never cut)
+ANALYTICS_MAX_LIMIT = 1000
+
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+
+
+def parse_day(value: str | None, name: str) -> date | None:
+    """A since/until filter as a date, ValueError if it is not YYYY-MM-DD"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+
+
+def analytics_query(group_by: str, campaign: str | None = None, since: date | None = None,
+                    until: date | None = None, limit: int = 100):
+    """
+    Grouped sentiment counts across posts, as one SQL aggregation
+
+    Every dimension is read from a per-post rollup kept up to date by
+    aggregates.refresh_post_aggregate, never from the comment table, so a
+    query reads (posts x groups) rows however many comments they stand for:
+    campaigns join post to postSentiment, days read postSentimentTrend and
+    languages and hashtags postSentimentFacet, each through a covering index.
+
+    Args:
+        group_by (str): One of GROUP_BY
+        campaign (str): Only count posts of this campaign
+        since, until (date): Only count these days (inclusive), for group_by="day"
+        limit (int): Most groups returned, the largest first (all days are returned, oldest first)
+
+    Returns:
+        Select: key, posts, the four label counts, confidence_sum and score_sum per group
+    """
+    if group_by == "campaign":
+        source = postSentiment
+        key = Post.campaign
+    elif group_by == "day":
+        source = postSentimentTrend
+        # daily buckets are grouped in index order; hourly ones ("YYYY-MM-DDTHH") are cut to the day
+        key = postSentimentTrend.bucket if SENTIMENT_TREND_BUCKET == "day" else func.substr(postSentimentTrend.bucket, 1, 10)
+    else:
+        source = postSentimentFacet
+        key = postSentimentFacet.value
+
+    query = select(
+        key.label("key"),
+        func.count(func.distinct(source.post_pk)).label("posts"),
+        *(func.sum(getattr(source, label)).label(label) for label in LABELS),
+        func.sum(source.confidence_sum).label("confidence_sum"),
+        func.sum(source.score_sum).label("score_sum"),
+    )
+    if group_by == "campaign" or campaign:
+        query = query.join(Post, Post.id == source.post_pk)
+    if campaign:
+        query = query.where(Post.campaign == campaign)
+    if source is postSentimentFacet:
+        query = query.where(postSentimentFacet.dimension == group_by)
+    if group_by == "day":
+        # compared on the bucket itself so the index range is used
+        if since:
+            query = query.where(postSentimentTrend.bucket >= since.isoformat())
+        if until:
+            query = query.where(postSentimentTrend.bucket < (until + timedelta(days=1)).isoformat())
+        return query.group_by(key).order_by(key)
+
+    analyzed = func.sum(source.positive + source.neutral + source.negative + source.spam)
+    return query.group_by(key).order_by(analyzed.desc(), key).limit(limit)
+
+
+def run_analytics(group_by: str, **filters) -> list:
+    """
+    Run analytics_query and work out each group's ratios
+
+    Returns:
+        list: One dict per group: key, posts, and the analyzed count, label
+        counts, spam ratio, average confidence and sentiment score as in a
+        post summary
+    """
+    with DB_READ_SECONDS.time(query=f"analytics_{group_by}"):
+        rows = db.session.execute(analytics_query(group_by, **filters)).all()
+    return [
+        {
+            "key": row.key,
+            "posts": row.posts,
+            **rates({label: getattr(row, label) or 0 for label in LABELS}, row.confidence_sum or 0.0, row.score_sum or 0.0),
+        }
+        for row in rows
+    ]
+
+
+def analytics_parquet(group_by: str, groups: list) -> bytes:
+    """
+    Groups from run_analytics as a Parquet file, one row per group
+
+    pandas (and pyarrow for the Parquet engine) are only imported here, so
+    the backend runs without them unless Parquet output is asked for.
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame([
+        {
+            group_by: group["key"],
+            "posts": group["posts"],
+            "analyzed": group["analyzed"],
+            **group["counts"],
+            "spam_ratio": group["spam_ratio"],
+            "average_confidence": group["average_confidence"],
+            "sentiment_score": group["sentiment_score"],
+        }
+        for group in groups
+    ], columns=[group_by, "posts", "analyzed", *LABELS, "spam_ratio", "average_confidence", "sentiment_score"])
+    buffer = io.BytesIO()
+    frame.to_parquet(buffer, index=False)
+    return buffer.getvalue()
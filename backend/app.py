@@ -1,17 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from concurrent.futures import as_completed
 from selenium.webdriver.support import expected_conditions as EC
-from scraper.instabot import main
+from scraper.browser_pool import scrape_post, get_pool
+from scraper.scheduler import ScrapeScheduler
+from jobs import JobManager
 from dotenv import load_dotenv
 import os
-import pandas as pd
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 import json
 import json
 import sys
-from spam_filtering.spam_filter import *
-from sentinel_analysis_ai.fastapi_ai_service import *
+from sentinel_analysis_ai.analyzer import analyzer, analysis_cascade, open_result_cache, ANALYSIS_MODELS
+from model_registry import registry, start_warm_up
+from metrics import metrics, PROMETHEUS_CONTENT_TYPE
+from models import db, upgrade_schema, database_path, find_post, comment_page, iter_comments, COMMENT_PAGE_SIZE
+from ingest import SCRAPE_TTL_SECONDS, is_fresh, ingest_comments, tag_campaign, backfill_posts
+from aggregates import refresh_post_aggregate, get_aggregate, get_trend, summarize
+from analytics import GROUP_BY, ANALYTICS_MAX_LIMIT, PARQUET_CONTENT_TYPE, parse_day, run_analytics, analytics_parquet
 sys.stdout.reconfigure(encoding="utf-8")
 
 load_dotenv()
@@ -20,199 +26,304 @@ password = os.getenv("insta_password")
 
 
 app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///app.db"
-db = SQLAlchemy(app)
+app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///app.db")
+db.init_app(app)
 migrate = Migrate(app, db)
 CORS(app)
 
-# define models
-class postComment(db.Model):
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    post_id = db.Column(db.String(120), nullable = False)
-    comment = db.Column(db.String(255))
-
-class Sentiment(db.Model):
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    comment = db.Column(db.String(255))
-    label = db.Column(db.String(100))
-    confidence = db.Column(db.Float, nullable = False)
-
-class postSentiment(db.Model):
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    post_id = db.Column(db.String(120), nullable = False)
-    label = db.Column(db.String(100))
-
+MAX_COMMENT_PAGE_SIZE = 1000
 
 @app.route("/api/health", methods = ['GET'])
 def check_status():
-    return jsonify({"status": "running", "message": "backend is running"})
+    return jsonify({
+        "status": "running",
+        "message": "backend is running",
+        "result_cache": analyzer.cache.stats() if analyzer.cache else "disabled",
+        "cascade": analysis_cascade.stats(),
+        "jobs": jobs.stats(),
+        "models": registry.status(),
+        "memory": registry.memory_report()
+    })
 
-# helper function which calls web scraper bot
-def insta_scraper(url):
-    print("Redirecting to website...")
+@app.route("/metrics", methods = ['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype=PROMETHEUS_CONTENT_TYPE)
 
-    main(username, password, url)
+# helper function which calls web scraper bot, skipped while stored comments are fresh
+def insta_scraper(url, force=False):
+    if not force and is_fresh(url):
+        print(f"Comments scraped less than {SCRAPE_TTL_SECONDS}s ago, using database")
+        return
 
-    with open('instagram_comments.json', 'r', encoding="utf-8") as file:
-            data = json.load(file)
-    # print(str(data).encode("cp1252", errors="ignore").decode("cp1252"))
-    for entry in data:
-        # print(entry["comment"])
-        comment_entry = postComment(
-            post_id = url,
-            comment = entry["comment"]
-        )
+    print("Redirecting to website...")
+
+    # a warm, logged-in browser is checked out of the shared pool, and the comments
+    # are passed straight to the database instead of through instagram_comments.json
+    data = scrape_post(username, password, url)
 
-        db.session.add(comment_entry)
-        db.session.commit()
+    inserted = ingest_comments(url, data)
+    print(f"Stored {inserted} new comments out of {len(data)} scraped")
 
 @app.route("/api/comment", methods = ['POST'])
 def post_scraper():
     data = request.get_json()
     url = data["url"]
-    insta_scraper(url=url)
+    if data.get("campaign"):
+        tag_campaign([url], data["campaign"])
+    if data.get("async", False):
+        return submit_job("scrape", post_id=url, refresh=data.get("force", False))
+    insta_scraper(url=url, force=data.get("force", False))
     return jsonify(200)
 
-# helper function to get comments and return as list 
-def fetch_comments(post_id):
-    if not post_id:
-        return jsonify({"error: post id is required"}, 400)
-    
-    results = postComment.query.filter_by(post_id=post_id).all()
-    return [{"id": r.id, "post_id": r.post_id, "comment": r.comment} for r in results]
+# background scheduler for scraping many posts, created on first use
+scheduler = None
+
+def store_scraped(url, comments):
+    with app.app_context():
+        inserted = ingest_comments(url, comments)
+    print(f"Stored {inserted} new comments out of {len(comments)} scraped for {url}")
+
+def get_scheduler():
+    global scheduler
+    if scheduler is None:
+        scheduler = ScrapeScheduler(get_pool(username, password), on_result=store_scraped)
+    return scheduler
+
+@app.route("/api/comment/batch", methods = ['POST'])
+def batch_scraper():
+    data = request.get_json()
+    urls = data.get("urls", [])
+    if not urls and not data.get("account"):
+        return jsonify({"error": "urls or account is required"}), 400
+
+    # the account lookup drives a browser, so it runs in the job too, never in the request
+    job = jobs.submit("batch", run_batch_job, urls=urls, account=data.get("account"), limit=data.get("limit", 12),
+                      campaign=data.get("campaign"), refresh=data.get("force", False))
+    return job_response(job)
 
 @app.route("/api/getcomment", methods = ['GET'])
 def get_comments():
     post_id = request.args.get("post_id") # args is a multidict, use dict syntax to query
+    if not post_id:
+        return jsonify({"error": "post id is required"}), 400
 
-    comments = fetch_comments(post_id)
-
-    if comments == []:
+    post = find_post(post_id)
+    if not post:
         return jsonify("no post found", 200)
 
-    return jsonify(comments, 200)
+    # stream=1 returns every comment as newline-delimited JSON, one page read at a time
+    if request.args.get("stream") == "1":
+        def generate():
+            for r in iter_comments(post.id):
+                yield json.dumps({"id": r.id, "post_id": post_id, "comment": r.comment}, ensure_ascii=False) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    # otherwise one page, pass next_after back as `after` to get the next one
+    after = request.args.get("after", 0, type=int)
+    limit = max(1, min(request.args.get("limit", COMMENT_PAGE_SIZE, type=int), MAX_COMMENT_PAGE_SIZE))
+    page = comment_page(post.id, after, limit)
+
+    return jsonify({
+        "post_id": post_id,
+        "shortcode": post.shortcode,
+        "comments": [{"id": r.id, "post_id": post_id, "comment": r.comment} for r in page],
+        "next_after": page[-1].id if len(page) == limit else None
+    }), 200
+
+# helper function which scrapes (if stale) a post and analyzes its new comments, reporting progress as it goes
+def post_sentiment(post_id, refresh=False, progress=None):
+    progress = progress or (lambda stage, done=0, total=0: None)
+
+    progress("scrape")
+    insta_scraper(post_id, force=refresh)
+
+    post = find_post(post_id)
+    if not post:
+        return None
+
+    # only comments ingested since the last analysis go through the models (UI text is
+    # filtered out), the rest of the post's counts come from its stored aggregate
+    aggregate = refresh_post_aggregate(post, progress)
+    print(f"positive: {aggregate.positive}, neutral: {aggregate.neutral}, negative: {aggregate.negative}, spam: {aggregate.spam}")
+
+    return summarize(aggregate)
 
 @app.route("/api/filter", methods = ["GET"])
 def spam_filter():
     post_id = request.args.get("post_id") # args is a multidict, use dict syntax to query
-    
-    insta_scraper(post_id)
+    refresh = request.args.get("refresh") == "1" # force a re-scrape even if comments are fresh
 
-    comments = fetch_comments(post_id)
+    # async=1 returns a job id straight away instead of holding the request open
+    if request.args.get("async") == "1":
+        return submit_job("filter", post_id=post_id, refresh=refresh)
 
-    if comments == []:
+    summary = post_sentiment(post_id, refresh)
+    if summary is None:
         return jsonify("no post found", 200)
 
-    results = []
-    comment_list = []
-
-    general_sentiment = ""
-    negative = 0
-    neutral = 0
-    positive = 0
-
-    # apply filter to data from database
-    filters = ["reply", "replies", "translation", "like", "meta", "instagram"]
-    for comment in comments:
-        text = comment['comment'].lower()
-        if not any(f in text for f in filters):
-            comment_list.append(comment['comment'])
-    
-    for comment in comment_list:
+    return jsonify(summary), 200
+
+@app.route("/api/summary", methods = ["GET"])
+def post_summary():
+    post_id = request.args.get("post_id")
+    if not post_id:
+        return jsonify({"error": "post id is required"}), 400
+
+    # stored aggregates only: nothing is scraped or analyzed here
+    post = find_post(post_id)
+    aggregate = get_aggregate(post.id) if post else None
+    if not aggregate:
+        return jsonify({"error": "post has not been analyzed yet, call /api/filter first"}), 404
+
+    return jsonify(summarize(aggregate, get_trend(post.id))), 200
+
+@app.route("/api/campaign", methods = ["POST"])
+def set_campaign():
+    data = request.get_json()
+    urls = data.get("urls", [])
+    if not urls:
+        return jsonify({"error": "urls are required"}), 400
+    # "campaign": null takes the posts out of their campaign
+    tagged = tag_campaign(urls, data.get("campaign"))
+    return jsonify({"campaign": data.get("campaign"), "posts": tagged}), 200
+
+@app.route("/api/analytics", methods = ["GET"])
+def analytics():
+    group_by = request.args.get("group_by", "campaign")
+    if group_by not in GROUP_BY:
+        return jsonify({"error": f"group_by must be one of {list(GROUP_BY)}"}), 400
+    try:
+        since = parse_day(request.args.get("since"), "since")
+        until = parse_day(request.args.get("until"), "until")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if (since or until) and group_by != "day":
+        return jsonify({"error": "since and until only apply to group_by=day"}), 400
+
+    # grouped in SQL over the per-post rollups, nothing is scraped or analyzed here
+    limit = max(1, min(request.args.get("limit", 100, type=int), ANALYTICS_MAX_LIMIT))
+    groups = run_analytics(group_by, campaign=request.args.get("campaign"), since=since, until=until, limit=limit)
+
+    if request.args.get("format") == "parquet":
         try:
-            # Step 1: Detect language
-            detected_language = detect_language(comment)
-            logger.info(f"Detected language for '{comment[:30]}...': {detected_language}")
-            
-            # Step 2: Multilingual spam filter
-            spam_detected, spam_confidence = is_multilingual_spam(comment, detected_language)
-            if spam_detected:
-                results.append({
-                    "comment": comment,
-                    "label": "spam",
-                    "confidence": spam_confidence,
-                    "detected_language": detected_language,
-                    "model_used": "multilingual_spam_detector"
-                })
-                continue
+            body = analytics_parquet(group_by, groups)
+        except ImportError as e:
+            return jsonify({"error": f"parquet output needs pandas and pyarrow: {e}"}), 501
+        return Response(body, mimetype=PARQUET_CONTENT_TYPE, headers={
+            "Content-Disposition": f"attachment; filename=analytics_{group_by}.parquet"
+        })
+
+    return jsonify({"group_by": group_by, "groups": groups}), 200
+
+# -------------------
+# Background jobs
+# -------------------
+jobs = JobManager(context=app.app_context)
 
-            # Step 3: Sentiment analysis
-            confidence = 0.5
-            label = "neutral"
-            model_used = "fallback"
-            
-            # Try multilingual model first
-            if multilingual_sentiment_model:
-                try:
-                    pred = multilingual_sentiment_model(comment)[0]
-                    confidence = float(pred["score"])
-                    label = normalize_sentiment_label(pred["label"], confidence)
-                    model_used = "multilingual-bert"
-                except Exception as e:
-                    logger.warning(f"Multilingual model failed: {e}")
-            
-            # If multilingual failed or confidence low, try English model for English text
-            if (confidence < 0.7 and detected_language == "en" and english_sentiment_model):
-                try:
-                    pred = english_sentiment_model(comment)[0]
-                    eng_confidence = float(pred["score"])
-                    eng_label = normalize_sentiment_label(pred["label"], eng_confidence)
-                    
-                    if eng_confidence > confidence:
-                        confidence = eng_confidence
-                        label = eng_label
-                        model_used = "english-roberta"
-                except Exception as e:
-                    logger.warning(f"English model failed: {e}")
-            
-            # Apply confidence threshold
-            if confidence < 0.6:
-                final_label = "neutral"
-            else:
-                final_label = label
-
-            results.append({
-                "comment": comment,
-                "label": final_label,
-                "confidence": confidence,
-                "detected_language": detected_language,
-                "model_used": model_used
-            })
-            
+def run_filter_job(job, post_id, refresh=False):
+    summary = post_sentiment(post_id, refresh, progress=job.progress)
+    if summary is None:
+        raise ValueError("no post found")
+    return summary
+
+def run_scrape_job(job, post_id, refresh=False):
+    job.progress("scrape")
+    insta_scraper(post_id, force=refresh)
+    post = find_post(post_id)
+    return {"post_id": post_id, "comment_count": post.comment_count if post else 0}
+
+def run_batch_job(job, urls, account=None, limit=12, campaign=None, refresh=False):
+    """Scrape many posts on the scheduler, recording each post that fails"""
+    scheduler = get_scheduler()
+    # an account's recent posts can be queued instead of (or as well as) explicit links
+    if account:
+        job.progress("account")
+        urls = urls + scheduler.recent_posts(account, limit)
+
+    if campaign:
+        tag_campaign(urls, campaign)
+
+    if not refresh:
+        urls = [url for url in urls if not is_fresh(url)]
+
+    futures = {future: url for url, future in scheduler.submit(urls).items()}
+    scraped, failed = {}, {}
+    job.progress("scrape", 0, len(futures))
+    for done, future in enumerate(as_completed(futures), start=1):
+        url = futures[future]
+        try:
+            scraped[url] = len(future.result())
         except Exception as e:
-            logger.error(f"Error analyzing comment '{comment}': {e}")
-            # Fallback result
-            results.append({
-                "comment": comment,
-                "label": "neutral",
-                "confidence": 0.5,
-                "detected_language": "unknown",
-                "model_used": "error_fallback"
-            })
-
-    for result in results:
-        label = result['label']
-        if label == "negative":
-            negative += 1
-        elif label == "neutral":
-            neutral += 1
-        elif label == "positive":
-            positive += 1
-
-    if (positive > negative) and (neutral > negative):
-        print(f"positive: {positive}")
-        print(f"neutral: {neutral}")
-        print(f"negative: {negative}")
-        general_sentiment = "positive"
-    elif (negative > positive):
-        general_sentiment = "negative"
-    
-    return jsonify({"general_sentiment": general_sentiment}), 200
+            failed[url] = str(e)
+        job.progress("scrape", done, len(futures))
+    return {"scraped": scraped, "failed": failed}
 
+job_types = {
+    "filter": run_filter_job,
+    "scrape": run_scrape_job
+}
 
-if __name__ == '__main__':
+def submit_job(kind, post_id, refresh=False):
+    if not post_id:
+        return jsonify({"error": "post id is required"}), 400
+    return job_response(jobs.submit(kind, job_types[kind], post_id=post_id, refresh=refresh))
+
+def job_response(job):
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events"
+    }), 202
+
+@app.route("/api/jobs", methods = ["POST"])
+def create_job():
+    data = request.get_json()
+    kind = data.get("kind", "filter")
+    if kind not in job_types:
+        return jsonify({"error": f"unknown job kind, expected one of {sorted(job_types)}"}), 400
+    return submit_job(kind, data.get("url") or data.get("post_id"), data.get("force", False))
+
+@app.route("/api/jobs/<job_id>", methods = ["GET"])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route("/api/jobs/<job_id>/events", methods = ["GET"])
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+
+    # server-sent events: one message per progress change, the last one when the job finishes
+    def generate():
+        version = -1
+        while True:
+            current = job.wait_for_change(version)
+            if current == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = current
+            yield f"data: {json.dumps(job.to_dict(), ensure_ascii=False)}\n\n"
+            if job.finished:
+                return
+
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+def init_database():
+    """Create and upgrade the tables, then open the result cache on the same database"""
     with app.app_context():
         db.create_all()
+        upgrade_schema()
+        backfill_posts()
+        open_result_cache(database_path(str(db.engine.url)), analyzer)
+
+if __name__ == '__main__':
+    init_database()
+    start_warm_up(ANALYSIS_MODELS)
     app.run(debug=True, host='0.0.0.0', port=5000)
 
     
\ No newline at end of file
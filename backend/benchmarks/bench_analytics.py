@@ -0,0 +1,147 @@
+"""
+Benchmark /api/analytics queries at warehouse scale
+
+Fills a temporary database with the per-post rollups (postSentiment,
+postSentimentTrend, postSentimentFacet) that --posts posts with --comments
+analyzed comments in total would produce, and times each group_by of
+analytics.run_analytics. For comparison, the same language breakdown is
+also computed with a GROUP BY over --raw-comments per-comment rows, which is
+what the query would cost without the rollups.
+
+Run from the backend directory:
+    python -m benchmarks.bench_analytics --posts 5000 --comments 10000000
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import date, timedelta
+from flask import Flask
+from sqlalchemy import insert, text
+from models import db, Post, postComment, postSentiment, postSentimentTrend, postSentimentFacet
+from analytics import GROUP_BY, run_analytics, analytics_parquet
+
+LANGUAGES = ["en", "es", "fr", "de", "ja", "ko", "zh", "ru", "tr", "vi", "af", "unknown"]
+LABELS = ["positive", "neutral", "negative", "spam"]
+INSERT_CHUNK = 50000
+FIRST_DAY = date(2025, 1, 1)
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    db.init_app(app)
+    return app
+
+
+def split(total, parts):
+    """`total` split into `parts` near-equal counts"""
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def tally(count):
+    counts = dict(zip(random.sample(LABELS, len(LABELS)), split(count, len(LABELS))))
+    confidence_sum = (count - counts["spam"]) * random.uniform(0.6, 0.9)
+    score_sum = confidence_sum * random.uniform(-0.5, 0.5)
+    return {**counts, "confidence_sum": confidence_sum, "score_sum": score_sum}
+
+
+def insert_chunked(model, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(insert(model), rows[start:start + INSERT_CHUNK])
+
+
+def fill_rollups(posts, comments, days, campaigns, hashtags, hashtags_per_post):
+    """Rollup rows for `posts` posts holding `comments` analyzed comments between them"""
+    per_post = comments // posts
+    insert_chunked(Post, [
+        {"id": pk, "shortcode": f"bench{pk}", "post_id": f"https://www.instagram.com/p/bench{pk}/",
+         "comment_count": per_post, "campaign": f"campaign-{pk % campaigns}"}
+        for pk in range(1, posts + 1)
+    ])
+    aggregates, trend, facets = [], [], []
+    for pk in range(1, posts + 1):
+        aggregates.append({"post_id": f"https://www.instagram.com/p/bench{pk}/", "post_pk": pk, "label": "neutral",
+                           "analyzed": per_post, "analyzed_until": pk, **tally(per_post)})
+        first_day = FIRST_DAY + timedelta(days=random.randrange(365))
+        for day, count in enumerate(split(per_post, days)):
+            trend.append({"post_pk": pk, "bucket": (first_day + timedelta(days=day)).isoformat(), **tally(count)})
+        for language, count in zip(LANGUAGES, split(per_post, len(LANGUAGES))):
+            facets.append({"post_pk": pk, "dimension": "language", "value": language, **tally(count)})
+        for hashtag in random.sample(range(hashtags), hashtags_per_post):
+            facets.append({"post_pk": pk, "dimension": "hashtag", "value": f"tag{hashtag}", **tally(random.randint(1, 50))})
+    insert_chunked(postSentiment, aggregates)
+    insert_chunked(postSentimentTrend, trend)
+    insert_chunked(postSentimentFacet, facets)
+    db.session.commit()
+    return len(aggregates) + len(trend) + len(facets)
+
+
+def fill_comments(count, posts):
+    """Analyzed per-comment rows, for the GROUP BY over the comment table"""
+    for start in range(0, count, INSERT_CHUNK):
+        db.session.execute(insert(postComment), [
+            {"post_id": "", "post_pk": random.randint(1, posts), "comment": "",
+             "label": random.choice(LABELS), "confidence": random.random(),
+             "detected_language": random.choice(LANGUAGES), "created_at": "2025-01-01T00:00:00"}
+            for _ in range(min(INSERT_CHUNK, count - start))
+        ])
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    """Median seconds of `repeat` calls, and the last result"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=5000, help="posts in the rollups")
+    parser.add_argument("--comments", type=int, default=10_000_000, help="analyzed comments the rollups stand for")
+    parser.add_argument("--days", type=int, default=30, help="days each post has comments on")
+    parser.add_argument("--campaigns", type=int, default=50, help="campaigns the posts are spread over")
+    parser.add_argument("--hashtags", type=int, default=2000, help="distinct hashtags")
+    parser.add_argument("--hashtags-per-post", type=int, default=40, help="hashtags used in each post's comments")
+    parser.add_argument("--raw-comments", type=int, default=1_000_000, help="per-comment rows for the comparison GROUP BY (0 skips it)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each query, the median is reported")
+    args = parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "bench.db"))
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            rows = fill_rollups(args.posts, args.comments, args.days, args.campaigns, args.hashtags, args.hashtags_per_post)
+            print(f"rollups for {args.posts} posts / {args.comments} comments: {rows} rows in {time.perf_counter() - start:.1f}s")
+
+            for group_by in GROUP_BY:
+                elapsed, groups = timed(lambda: run_analytics(group_by, limit=100), args.repeat)
+                print(f"group_by={group_by:<9}: {len(groups):>5} groups in {elapsed * 1000:8.2f} ms")
+            elapsed, groups = timed(lambda: run_analytics("language", campaign="campaign-1", limit=100), args.repeat)
+            print(f"group_by=language, one campaign: {len(groups)} groups in {elapsed * 1000:8.2f} ms")
+            elapsed, body = timed(lambda: analytics_parquet("hashtag", run_analytics("hashtag", limit=1000)), args.repeat)
+            print(f"group_by=hashtag as parquet: {len(body)} bytes in {elapsed * 1000:8.2f} ms")
+
+            if args.raw_comments:
+                fill_comments(args.raw_comments, args.posts)
+                query = text(
+                    "SELECT detected_language, COUNT(*), SUM(label = 'positive'), SUM(label = 'negative'), "
+                    "SUM(label = 'spam'), SUM(confidence) FROM post_comment GROUP BY detected_language"
+                )
+                elapsed, _ = timed(lambda: db.session.execute(query).all(), args.repeat)
+                estimate = elapsed * args.comments / args.raw_comments
+                print(f"per-comment GROUP BY over {args.raw_comments} rows: {elapsed * 1000:8.2f} ms "
+                      f"(~{estimate:.1f}s for {args.comments})")
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare per-element WebDriver extraction with the single execute_script call
+
+Loads the offline post fixture with every comment already rendered, then
+reads the comment spans both ways. Needs Chrome, but no Instagram account.
+
+Run from the backend directory:
+    python -m benchmarks.bench_dom_extraction --comments 3000
+"""
+import time
+import argparse
+from selenium.webdriver.common.by import By
+from scraper.instabot import InstagramCommentScraper, COMMENT_SELECTOR, ui_skip_reason
+from benchmarks.bench_scraper import fixture_url
+
+
+def extract_per_element(scraper):
+    """Old path: one find_elements, then .text and outerHTML per element"""
+    comments = []
+    for element in scraper.driver.find_elements(By.XPATH, COMMENT_SELECTOR):
+        text = element.text.strip()
+        if ui_skip_reason(text):
+            continue
+        comments.append({"comment": text, "raw_html": element.get_attribute("outerHTML")})
+    return comments
+
+
+def extract_single_pass(scraper, include_html):
+    """New path: one execute_script returning every span"""
+    comments = []
+    for element in scraper.extract_comment_elements(include_html):
+        text = (element.get("text") or "").strip()
+        if ui_skip_reason(text):
+            continue
+        comments.append({"comment": text, "author": element.get("author"), "timestamp": element.get("timestamp")})
+    return comments
+
+
+def timed(label, fn, *args):
+    start = time.perf_counter()
+    comments = fn(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {len(comments):>6} comments in {elapsed:8.3f}s")
+    return comments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=3000, help="comments rendered on the fixture page")
+    parser.add_argument("--show", action="store_true", help="show the browser window")
+    args = parser.parse_args()
+
+    scraper = InstagramCommentScraper(headless=not args.show)
+    try:
+        # render every comment up front so only extraction is measured
+        scraper.navigate_to_post(fixture_url(args.comments, page=args.comments, delay=0))
+        print(f"{scraper.count_comment_elements()} spans on the page")
+
+        single = timed("single execute_script", extract_single_pass, scraper, False)
+        timed("single execute_script+html", extract_single_pass, scraper, True)
+        legacy = timed("per-element round trips", extract_per_element, scraper)
+
+        same = [c["comment"] for c in single] == [c["comment"] for c in legacy]
+        print(f"same comment texts: {same}")
+    finally:
+        scraper.close()
+
+
+if __name__ == "__main__":
+    main()
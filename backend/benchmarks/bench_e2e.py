@@ -0,0 +1,475 @@
+"""
+End-to-end benchmark of the scrape -> ingest -> analyze path, fully offline
+
+Drives the Flask routes (POST /api/comment, GET /api/filter) and the FastAPI
+POST /analyze route in-process, on a temporary database, with:
+  - a synthetic multilingual comment corpus standing in for Instagram
+    (or, with --browser, Chrome scraping the offline post fixture)
+  - tiny stand-in models with the transformers pipeline interface, so no
+    weights are downloaded and model time does not drown out everything else
+
+For every corpus size it reports throughput, p50/p99 latency and peak RSS of
+each route and of each step inside it (scrape, ingest and every analysis
+stage), and compares them with a stored baseline. The exit status is 1 when
+a stage got slower or bigger than the baseline allows.
+
+Each size first runs one untimed round, so every stage (models, language
+memo, SQLite pages) is warm when timing starts, then --requests timed
+rounds; p99 is only compared with at least MIN_P99_CALLS calls. After every
+round a small fixed reference workload is timed, and the baseline's numbers
+are scaled by how much slower or faster it ran (median per size) than when
+the baseline was made, so a different or busier machine does not read as a
+regression.
+
+Run from the backend directory:
+    python -m benchmarks.bench_e2e --sizes 100 1000 10000
+    python -m benchmarks.bench_e2e --sizes 100 1000 10000 --update-baseline
+"""
+import gc
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import sqlite3
+import statistics
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+from types import SimpleNamespace
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "e2e_baseline.json")
+
+# fewer calls than this make p99 the slowest call, which is too noisy to compare
+MIN_P99_CALLS = 100
+
+AUTHORS = ["beauty.by.ana", "min_jiwoo", "claire.makeup", "dailyglow", "skinnerd_22", "lucia.mx"]
+
+
+# -------------------
+# Stand-in models
+# -------------------
+class StubPipeline:
+    # labels in the format each real model returns them
+    LABELS = {
+        "nlptown/bert-base-multilingual-uncased-sentiment": ["1 star", "2 stars", "3 stars", "4 stars", "5 stars"],
+        "cardiffnlp/twitter-roberta-base-sentiment": ["LABEL_0", "LABEL_1", "LABEL_2"],
+        "martin-ha/toxic-comment-model": ["non-toxic", "non-toxic", "non-toxic", "toxic"],
+        "unitary/toxic-bert": ["toxic"],
+    }
+
+    def __init__(self, task, model_id):
+        """
+        Deterministic stand-in for a transformers text-classification pipeline
+
+        Called the same way (a list of texts plus pipeline kwargs) and returns
+        the same shape ({"label", "score"} per text), with the label and score
+        derived from a checksum of the text.
+        """
+        self.task = task
+        self.labels = self.LABELS.get(model_id, ["LABEL_0", "LABEL_1"])
+        self.model = SimpleNamespace(name_or_path=model_id, config=SimpleNamespace(_commit_hash="stub"))
+
+    def predict(self, text):
+        checksum = zlib.crc32(text.encode("utf-8"))
+        return {"label": self.labels[checksum % len(self.labels)], "score": 0.5 + (checksum >> 8) % 500 / 1000}
+
+    def __call__(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return [self.predict(texts)]
+        return [self.predict(text) for text in texts]
+
+
+# -------------------
+# Measurement
+# -------------------
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+CALIBRATION_TEXTS = [f"comment {i} with some text #tag{i % 7} follow free 🔥" for i in range(5000)]
+CALIBRATION_PATTERN = re.compile(r"#\w+|follow|free")
+
+
+def calibrate():
+    """
+    Seconds a fixed mix of Python, regex, JSON and SQLite work takes now
+
+    Run between the timed rounds, so its median follows the same machine
+    load the rounds saw. The collector is off so the benchmark's heap does
+    not slow it down.
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, body TEXT)")
+        conn.executemany("INSERT INTO t (body) VALUES (?)", (
+            (json.dumps({"text": text, "tags": CALIBRATION_PATTERN.findall(text.lower())}),) for text in CALIBRATION_TEXTS
+        ))
+        conn.execute("SELECT COUNT(*), SUM(LENGTH(body)) FROM t").fetchone()
+        conn.close()
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+class StageRecorder:
+    def __init__(self, rss, sample_interval=0.005):
+        """
+        Collect timings, item counts and peak RSS of named stages
+
+        A sampler thread reads the RSS every `sample_interval` seconds while
+        any stage is running and raises the peak of every running stage, so
+        memory that is allocated and freed inside a stage is still seen.
+
+        Args:
+            rss (callable): Returns the current RSS in MB
+            sample_interval (float): Seconds between RSS samples
+        """
+        self.rss = rss
+        self.sample_interval = sample_interval
+        self.samples = {}  # stage -> {"seconds": [...], "items": int, "peak_rss_mb": float}
+        self.running = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, daemon=True)
+        self.sampler.start()
+
+    def sample(self):
+        while not self.stopped.wait(self.sample_interval):
+            if self.running:
+                self.raise_peaks(self.rss())
+
+    def raise_peaks(self, rss):
+        with self.lock:
+            for record in self.running:
+                record["peak_rss_mb"] = max(record["peak_rss_mb"], rss)
+
+    @contextmanager
+    def stage(self, name, items):
+        with self.lock:
+            record = self.samples.setdefault(name, {"seconds": [], "items": 0, "peak_rss_mb": 0.0})
+            self.running.append(record)
+        self.raise_peaks(self.rss())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.raise_peaks(self.rss())
+            with self.lock:
+                # records are dicts, so remove by identity rather than equality
+                self.running = [running for running in self.running if running is not record]
+                record["seconds"].append(elapsed)
+                record["items"] += items
+
+    def wrap(self, name, fn, items):
+        """fn, recorded as stage `name` with items(*args) items per call"""
+        def timed(*args, **kwargs):
+            with self.stage(name, items(*args)):
+                return fn(*args, **kwargs)
+        return timed
+
+    def report(self):
+        """Throughput, latency and peak RSS of every stage"""
+        report = {}
+        for name, record in self.samples.items():
+            seconds = record["seconds"]
+            total = sum(seconds)
+            report[name] = {
+                "calls": len(seconds),
+                "items": record["items"],
+                "throughput": round(record["items"] / total, 1) if total else 0.0,
+                "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+                "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+                "peak_rss_mb": round(record["peak_rss_mb"], 1),
+            }
+        return report
+
+    def reset(self):
+        with self.lock:
+            self.samples = {}
+
+    def close(self):
+        self.stopped.set()
+        self.sampler.join()
+
+
+# -------------------
+# Offline scraping
+# -------------------
+def corpus_comments(corpus):
+    """Corpus texts in the shape the scraper returns them"""
+    newest = datetime(2025, 9, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "comment": text,
+            "author": AUTHORS[i % len(AUTHORS)],
+            "timestamp": (newest - timedelta(hours=i)).isoformat(),
+        }
+        for i, (text, _) in enumerate(corpus)
+    ]
+
+
+def corpus_scraper(comments):
+    """Replacement for scraper.browser_pool.scrape_post that returns the corpus"""
+    def scrape_post(username, password, url, max_comments=None):
+        return list(comments)
+    return scrape_post
+
+
+def fixture_scraper(total, headless=True):
+    """Replacement for scrape_post that scrapes the offline post fixture in Chrome"""
+    from scraper.instabot import InstagramCommentScraper
+    from benchmarks.bench_scraper import fixture_url
+
+    scraper = InstagramCommentScraper(headless=headless)
+
+    def scrape_post(username, password, url, max_comments=None):
+        return scraper.scrape_comments(fixture_url(total, page=50, delay=0), max_comments=total)
+    scrape_post.close = scraper.close
+    return scrape_post
+
+
+# -------------------
+# Benchmark
+# -------------------
+def setup_environment(tmp, cache):
+    """Point the services at a temporary database before they are imported"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'e2e.db')}"
+    os.environ["RESULT_CACHE_ENABLED"] = "1" if cache else "0"
+    os.environ["MODEL_WARMUP"] = "lazy"
+
+
+def instrument_analyzer(recorder, analyzer, prefix):
+    """Record each analysis stage of an analyzer as `<prefix> <stage>`"""
+    analyzer.stages = [
+        recorder.wrap(f"{prefix} {stage.__name__.removesuffix('_stage')}", stage, items=lambda batch: len(batch.pending))
+        for stage in analyzer.stages
+    ]
+
+
+def run_size(recorder, flask_client, fastapi_client, size, requests, scraper_for, clear_caches, tag="e2e", calibration=None):
+    """
+    Send `requests` rounds of the three routes over a corpus of `size` comments
+
+    When a `calibration` list is given, a calibrate() sample is appended to
+    it after every round.
+    """
+    import app as flask_app
+    # imported here because the services read their settings at import
+    from benchmarks.bench_spam_patterns import make_corpus
+
+    corpus = make_corpus(size, seed=size)
+    comments = corpus_comments(corpus)
+    texts = [text for text, _ in corpus]
+    flask_app.scrape_post = recorder.wrap("scrape", scraper_for(size, comments), items=lambda *args: size)
+
+    for n in range(requests):
+        url = f"https://www.instagram.com/p/{tag}{size}n{n}/"
+
+        clear_caches()
+        with recorder.stage("flask POST /api/comment", size):
+            response = flask_client.post("/api/comment", json={"url": url})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+        clear_caches()
+        with recorder.stage("flask GET /api/filter", size):
+            response = flask_client.get("/api/filter", query_string={"post_id": url})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+        clear_caches()
+        with recorder.stage("fastapi POST /analyze", size):
+            response = fastapi_client.post("/analyze", json={"post_id": url, "comments": texts})
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == size
+
+        if calibration is not None:
+            calibration.append(calibrate())
+
+
+def check_health_after_eviction(fastapi_client, registry):
+    """Evict every idle model under a tiny memory budget and check /health still answers"""
+    budget = registry.memory_budget_mb
+    sizes = {entry: entry.size_mb for entry in registry.entries.values()}
+    try:
+        for entry in sizes:
+            entry.size_mb = entry.size_mb or 1.0  # the stand-ins have no weights to measure
+        registry.memory_budget_mb = 0.5
+        registry.enforce_budget()
+        assert registry.status()["multilingual_spam"]["state"] == "evicted"
+        response = fastapi_client.get("/health")
+        assert response.status_code == 200, response.text
+        assert "(using heuristics)" in response.json()["models_loaded"]["multilingual_spam"]
+    finally:
+        registry.memory_budget_mb = budget
+        for entry, size_mb in sizes.items():
+            entry.size_mb = size_mb
+    print("\n/health answers with evicted models")
+
+
+def print_report(size, report):
+    print(f"\n{size} comments")
+    print(f"  {'stage':<34} {'calls':>5} {'items/sec':>11} {'p50 ms':>10} {'p99 ms':>10} {'peak RSS MB':>12}")
+    for name, stats in report.items():
+        print(f"  {name:<34} {stats['calls']:>5} {stats['throughput']:>11.0f} {stats['p50_ms']:>10.2f} {stats['p99_ms']:>10.2f} {stats['peak_rss_mb']:>12.1f}")
+
+
+def regressions(results, baseline, calibration, baseline_calibration, tolerance, latency_tolerance, latency_slack_ms, rss_tolerance, min_stage_ms):
+    """
+    Stages that are worse than the baseline by more than the tolerances
+
+    The baseline's throughput and latency are first scaled by the ratio of
+    this run's calibration to the baseline's, per size. Throughput may then
+    drop by `tolerance` and peak RSS may rise by `rss_tolerance` (fractions).
+    p99 latency may rise by `latency_tolerance` plus `latency_slack_ms`, and
+    is only compared when both runs made MIN_P99_CALLS calls. Stages that
+    took under `min_stage_ms` in total in the baseline are too short for
+    their throughput to be compared.
+    """
+    found = []
+    for size, stages in results.items():
+        # > 1 when this machine ran the reference workload slower than the baseline's
+        slowdown = calibration[size] / baseline_calibration[size] if size in baseline_calibration else 1.0
+        for name, stats in stages.items():
+            expected = baseline.get(size, {}).get(name)
+            if not expected:
+                continue
+            measured_ms = expected["items"] / expected["throughput"] * 1000 if expected["throughput"] else 0.0
+            expected_throughput = expected["throughput"] / slowdown
+            if measured_ms >= min_stage_ms and stats["throughput"] < expected_throughput * (1 - tolerance):
+                found.append(f"{size} {name}: throughput {stats['throughput']:.0f}/s vs baseline {expected_throughput:.0f}/s (calibrated)")
+            expected_p99 = expected["p99_ms"] * slowdown
+            if (min(stats["calls"], expected["calls"]) >= MIN_P99_CALLS
+                    and stats["p99_ms"] > expected_p99 * (1 + latency_tolerance) + latency_slack_ms):
+                found.append(f"{size} {name}: p99 {stats['p99_ms']:.1f} ms vs baseline {expected_p99:.1f} ms (calibrated)")
+            if stats["peak_rss_mb"] > expected["peak_rss_mb"] * (1 + rss_tolerance):
+                found.append(f"{size} {name}: peak RSS {stats['peak_rss_mb']:.0f} MB vs baseline {expected['peak_rss_mb']:.0f} MB")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="corpus sizes, up to 100000")
+    parser.add_argument("--requests", type=int, default=MIN_P99_CALLS, help=f"timed rounds of the three routes per size (p99 is compared from {MIN_P99_CALLS})")
+    parser.add_argument("--browser", action="store_true", help="scrape the offline post fixture with Chrome instead of returning the corpus")
+    parser.add_argument("--cold", action="store_true", help="clear the language memo before every request (slow: every round runs langdetect)")
+    parser.add_argument("--result-cache", action="store_true", help="serve repeated comments from the result cache")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="write this run as the new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed throughput drop, as a fraction")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5, help="allowed p99 rise, as a fraction")
+    parser.add_argument("--latency-slack-ms", type=float, default=10, help="allowed p99 rise on top of --latency-tolerance")
+    parser.add_argument("--min-stage-ms", type=float, default=50, help="only compare the throughput of stages that took at least this long in the baseline")
+    parser.add_argument("--rss-tolerance", type=float, default=0.2, help="allowed peak RSS rise, as a fraction")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_environment(tmp, args.result_cache)
+
+        from fastapi.testclient import TestClient
+        import app as flask_app
+        from model_registry import registry, process_rss_mb
+        from sentinel_analysis_ai import fastapi_ai_service
+        from sentinel_analysis_ai.analyzer import analyzer
+        from sentinel_analysis_ai.language_id import identify_language, init_detector
+
+        # keep the per-comment log calls (they are part of the cost) but not their output
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(logging.FileHandler(os.devnull))
+        root.setLevel(logging.INFO)
+
+        registry.load = lambda entry: StubPipeline(entry.task, entry.model_id)
+
+        # both services share the one result cache on the temporary database, as at startup
+        flask_app.init_database()
+        fastapi_ai_service.analyzer.cache = analyzer.cache
+
+        recorder = StageRecorder(process_rss_mb)
+        flask_app.ingest_comments = recorder.wrap("ingest", flask_app.ingest_comments, items=lambda post_id, comments: len(comments))
+        instrument_analyzer(recorder, analyzer, "flask")
+        instrument_analyzer(recorder, fastapi_ai_service.analyzer, "fastapi")
+
+        def clear_caches():
+            if args.cold:
+                identify_language.cache_clear()
+
+        browsers = []
+        def scraper_for(size, comments):
+            if not args.browser:
+                return corpus_scraper(comments)
+            browsers.append(fixture_scraper(size))
+            return browsers[-1]
+
+        flask_client = flask_app.app.test_client()
+        fastapi_client = TestClient(fastapi_ai_service.app)
+        results = {}
+        calibration = {}
+        try:
+            init_detector()
+            for size in args.sizes:
+                # one untimed round of this size warms every stage: stand-in models, the
+                # language memo for this corpus, SQLite's page cache and the Python allocator
+                identify_language.cache_clear()
+                run_size(recorder, flask_client, fastapi_client, size, 1, scraper_for, clear_caches, tag="warmup")
+                recorder.reset()
+                samples = []
+                run_size(recorder, flask_client, fastapi_client, size, args.requests, scraper_for, clear_caches, calibration=samples)
+                calibration[str(size)] = statistics.median(samples)
+                report = recorder.report()
+                results[str(size)] = report
+                print_report(size, report)
+            check_health_after_eviction(fastapi_client, registry)
+        finally:
+            recorder.close()
+            for browser in browsers:
+                browser.close()
+            with flask_app.app.app_context():
+                flask_app.db.engine.dispose()
+
+    document = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "requests": args.requests,
+        "calibration_seconds": {size: round(seconds, 4) for size, seconds in calibration.items()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nno baseline at {args.baseline}, run with --update-baseline to create one")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    found = regressions(results, baseline["results"], document["calibration_seconds"], baseline.get("calibration_seconds", {}), args.tolerance, args.latency_tolerance, args.latency_slack_ms, args.rss_tolerance, args.min_stage_ms)
+    if found:
+        print(f"\n{len(found)} regression(s) against {args.baseline}:")
+        for line in found:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nno regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
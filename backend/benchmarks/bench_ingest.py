@@ -0,0 +1,79 @@
+"""
+Benchmark comment ingestion into SQLite
+
+Compares the old one-commit-per-comment loop with ingest_comments, which
+writes every new comment in a single transaction.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ingest --comments 10000
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+from flask import Flask
+from models import db, postComment
+from ingest import ingest_comments
+
+
+def make_comments(count):
+    """Synthetic scraped comments, including some repeated texts"""
+    words = ["love", "this", "so", "much", "amazing", "product", "where", "buy", "color", "😍", "🔥", "need", "it"]
+    return [
+        {"comment": " ".join(random.choice(words) for _ in range(random.randint(2, 12)))}
+        for _ in range(count)
+    ]
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    db.init_app(app)
+    return app
+
+
+def bench_row_by_row(comments, post_id):
+    """Old path: add + commit per comment"""
+    start = time.perf_counter()
+    for entry in comments:
+        db.session.add(postComment(post_id=post_id, comment=entry["comment"]))
+        db.session.commit()
+    return time.perf_counter() - start
+
+
+def bench_bulk(comments, post_id):
+    """New path: one executemany transaction"""
+    start = time.perf_counter()
+    ingest_comments(post_id, comments)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=10000, help="comments inserted by the bulk path")
+    parser.add_argument("--row-sample", type=int, default=1000, help="comments inserted by the row-by-row path")
+    args = parser.parse_args()
+
+    random.seed(0)
+    comments = make_comments(args.comments)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "bench.db"))
+        with app.app_context():
+            db.create_all()
+
+            sample = comments[:args.row_sample]
+            elapsed = bench_row_by_row(sample, "https://www.instagram.com/p/row_by_row/")
+            print(f"row-by-row : {len(sample):>7} comments in {elapsed:8.3f}s -> {len(sample) / elapsed:>10.0f} inserts/sec")
+
+            elapsed = bench_bulk(comments, "https://www.instagram.com/p/bulk/")
+            print(f"bulk       : {len(comments):>7} comments in {elapsed:8.3f}s -> {len(comments) / elapsed:>10.0f} inserts/sec")
+
+            elapsed = bench_bulk(comments, "https://www.instagram.com/p/bulk/")
+            print(f"re-ingest  : {len(comments):>7} comments in {elapsed:8.3f}s (all duplicates, nothing inserted)")
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compare per-comment langdetect with the batched, memoized language ID stage
+
+Runs the original unseeded langdetect.detect call and identify_languages over
+a synthetic multilingual corpus, reports comments/sec for a cold and a warm
+memo, how often the two agree, and how often unseeded langdetect changes its
+answer between two runs over the same comments.
+
+Run from the backend directory:
+    python -m benchmarks.bench_language_id --comments 3000
+"""
+import time
+import random
+import argparse
+import langdetect
+from langdetect import DetectorFactory
+from langdetect.lang_detect_exception import LangDetectException
+from benchmarks.compare_backends import load_fixture
+from sentinel_analysis_ai.language_id import identify_language, identify_languages
+
+
+def legacy_detect_language(text):
+    """detect_language before the language ID stage"""
+    try:
+        return langdetect.detect(text)
+    except LangDetectException:
+        return "unknown"
+
+
+def make_corpus(count, distinct, seed=0):
+    """Comments drawn from the labeled fixture, with some variants so not every comment repeats"""
+    rng = random.Random(seed)
+    texts = [row["text"] for row in load_fixture()]
+    pool = [rng.choice(texts) + ("" if i < len(texts) else f" {rng.choice(texts)}") for i in range(distinct)]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def timed(label, fn, corpus):
+    start = time.perf_counter()
+    languages = fn(corpus)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<30} {len(corpus) / elapsed:>12,.0f} comments/sec")
+    return languages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=3_000)
+    parser.add_argument("--distinct", type=int, default=500, help="distinct comment texts in the corpus")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.comments, args.distinct)
+    print(f"{len(corpus)} comments, {len(set(corpus))} distinct\n")
+
+    seed = DetectorFactory.seed
+    DetectorFactory.seed = None  # the original code never seeded langdetect
+    legacy = timed("langdetect per comment", lambda texts: [legacy_detect_language(t) for t in texts], corpus)
+    rerun = [legacy_detect_language(t) for t in corpus]
+    DetectorFactory.seed = seed
+
+    identify_language.cache_clear()
+    new = timed("identify_languages (cold)", identify_languages, corpus)
+    timed("identify_languages (warm)", identify_languages, corpus)
+
+    unstable = sum(a != b for a, b in zip(legacy, rerun))
+    aliases = {"zh-cn": "zh", "zh-tw": "zh"}
+    agree = sum(aliases.get(a, a) == b for a, b in zip(legacy, new))
+    print(f"\nunseeded langdetect changed its answer on {unstable / len(corpus):.1%} of comments between runs")
+    print(f"agreement with langdetect (zh-cn/zh-tw read as zh): {agree / len(corpus):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Run the scraper against the offline post fixture and report step timings
+
+Needs Chrome, but no Instagram account or network access.
+
+Run from the backend directory:
+    python -m benchmarks.bench_scraper --total 500 --delay 300
+"""
+import os
+import time
+import argparse
+from pathlib import Path
+from scraper.instabot import InstagramCommentScraper
+
+FIXTURE = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) / "scraper" / "fixtures" / "comments.html"
+
+
+def fixture_url(total, page=15, delay=300):
+    """file:// URL of the post fixture with the given size"""
+    return f"{FIXTURE.as_uri()}?total={total}&page={page}&delay={delay}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--total", type=int, default=500, help="comments on the fixture post")
+    parser.add_argument("--page", type=int, default=15, help="comments loaded per 'Load more comments' click")
+    parser.add_argument("--delay", type=int, default=300, help="simulated network delay per page in ms")
+    parser.add_argument("--max-comments", type=int, default=None, help="comments to scrape, defaults to --total")
+    parser.add_argument("--show", action="store_true", help="show the browser window")
+    args = parser.parse_args()
+
+    scraper = InstagramCommentScraper(headless=not args.show)
+    try:
+        start = time.perf_counter()
+        comments = scraper.scrape_comments(
+            fixture_url(args.total, args.page, args.delay),
+            max_comments=args.max_comments or args.total
+        )
+        elapsed = time.perf_counter() - start
+
+        print(f"scraped {len(comments)} comments in {elapsed:.2f}s")
+        for step, timing in scraper.timing_report().items():
+            print(f"  {step:<20} count={timing['count']:<4} total={timing['total']:>8.3f}s mean={timing['mean']:>7.3f}s max={timing['max']:>7.3f}s")
+    finally:
+        scraper.close()
+
+
+if __name__ == "__main__":
+    main()
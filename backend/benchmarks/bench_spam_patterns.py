@@ -0,0 +1,229 @@
+"""
+Compare the compiled spam pattern matcher with the original substring scans
+
+Builds a synthetic multilingual corpus, runs the heuristic part of is_spam
+and is_multilingual_spam both ways, checks that every verdict and confidence
+is identical and reports comments/sec. No models are loaded.
+
+Run from the backend directory:
+    python -m benchmarks.bench_spam_patterns --comments 100000
+"""
+import time
+import random
+import argparse
+from spam_filtering.spam_filter import heuristic_spam
+from spam_filtering.patterns import HIGH_CONFIDENCE_PATTERNS, MEDIUM_CONFIDENCE_PATTERNS, UNIVERSAL_SPAM_PATTERNS
+from sentinel_analysis_ai.analyzer import multilingual_spam_score
+
+CLEAN_SAMPLES = [
+    ("Love this shade so much, where can I buy it?", "en"),
+    ("The packaging is gorgeous but the formula dried out fast", "en"),
+    ("Tried it yesterday and honestly it is just okay", "en"),
+    ("Does this work on oily skin? Asking for a friend", "en"),
+    ("Este labial es increíble, lo uso todos los días 😍", "es"),
+    ("C'est magnifique, j'adore cette couleur", "fr"),
+    ("Ich liebe diese Farbe, einfach perfekt", "de"),
+    ("이 제품 정말 좋아요 강력 추천합니다", "ko"),
+    ("このリップの色がとても好きです", "ja"),
+    ("这个颜色太好看了，已经回购三次", "zh"),
+    ("Очень понравился этот крем", "ru"),
+    ("😍😍😍😍", "unknown"),
+]
+
+SPAM_SAMPLES = [
+    ("Follow me for a free giveaway!! 🎁🎉🔥💸 #giveaway #free #win", "en"),
+    ("CHECK OUT MY PAGE FOR AMAZING DEALS", "en"),
+    ("keep it up, amazing content! follow me #followme #beauty", "en"),
+    ("subscribe to my channel www.example.com", "en"),
+    ("Sígueme y participa en el sorteo gratis dm", "es"),
+    ("Suivez-moi pour le concours, prix gratuit", "fr"),
+    ("팔로우하고 무료 이벤트 참여하세요 팔로백", "ko"),
+    ("フォローしてプレゼントに応募してね", "ja"),
+    ("关注我参加免费抽奖", "zh"),
+    ("Takip et, çekiliş ücretsiz", "tr"),
+    ("Подписаться и выиграть приз", "ru"),
+]
+
+
+# -------------------
+# Original implementations (reference)
+# -------------------
+def legacy_heuristic_spam(comment):
+    """spam_filter.is_spam before the compiled matcher, up to the toxicity model"""
+    comment_lower = comment.lower()
+    
+    # High-confidence spam patterns (immediate spam classification)
+    high_confidence_patterns = [
+        "giveaway", "win free", "free prizes", "dm for details", "dm me for",
+        "follow for follow", "f4f", "follow back", "follow me back",
+        "follow train", "followtrain", "follow4follow",
+        "like for like", "l4l", "like4like", "comment for comment", 
+        "c4c", "comment4comment", "tag friends", "tag 3 friends",
+        "tag someone", "double tap if", "drop a comment if",
+        "check out my profile", "check out my page", "visit my profile",
+        "boost your followers", "gain followers", "followers fast",
+        "collaboration opportunities", "collab", "dm for collab",
+        "shop now", "great deals", "amazing deals", "#dmfordeals"
+    ]
+    
+    # Medium-confidence patterns (need multiple matches or context)
+    medium_confidence_patterns = [
+        "follow me", "support each other", "let's support",
+        "keep it up", "amazing content", "#followme", 
+        "like this if", "tag a friend", "don't miss out"
+    ]
+    
+    # Check high-confidence patterns first
+    high_matches = sum(1 for pattern in high_confidence_patterns if pattern in comment_lower)
+    if high_matches >= 1:
+        confidence = min(0.95, 0.75 + (high_matches * 0.1))
+        return True, confidence
+    
+    # Check medium-confidence patterns (need multiple or with hashtags)
+    medium_matches = sum(1 for pattern in medium_confidence_patterns if pattern in comment_lower)
+    hashtag_count = comment.count('#')
+    
+    # Spam indicators scoring
+    spam_score = 0
+    
+    # Multiple medium patterns
+    if medium_matches >= 2:
+        spam_score += 2
+        
+    # Excessive hashtags
+    if hashtag_count >= 2:
+        spam_score += 1
+        
+    # Excessive emojis (better emoji detection)
+    emoji_patterns = ['🎉', '🚨', '🔥', '💸', '💥', '🎁', '💎', '📈', '🔄', '✨', '🛍️', '💯', '👍', '🙌', '💖', '💬']
+    emoji_count = sum(comment.count(emoji) for emoji in emoji_patterns)
+    total_emojis = sum(1 for char in comment if ord(char) > 127)  # Better emoji detection
+    
+    if total_emojis >= 4 or (len(comment) > 0 and total_emojis / len(comment) > 0.15):
+        spam_score += 1
+        
+    # ALL CAPS detection
+    if len([c for c in comment if c.isupper()]) > len(comment) * 0.3 and len(comment) > 10:
+        spam_score += 1
+        
+    # Check for promotional language
+    promo_words = ['win', 'free', 'prize', 'contest', 'deals', 'sale', 'discount']
+    if sum(1 for word in promo_words if word in comment_lower) >= 1 and (hashtag_count >= 1 or total_emojis >= 2):
+        spam_score += 2
+        
+    # Final spam determination
+    if spam_score >= 2:
+        confidence = min(0.9, 0.6 + (spam_score * 0.1))
+        return True, confidence
+    return None
+
+
+def legacy_multilingual_spam_score(comment, language):
+    """is_multilingual_spam before the compiled matcher, without the model"""
+    comment_lower = comment.lower()
+    
+    # Universal spam patterns (work across languages with Latin script)
+    universal_spam_patterns = [
+        "http", "www.", ".com", ".net", ".org", "bit.ly", "tinyurl",
+        "follow", "subscribe", "sub", "dm", "pm", "inbox",
+        "win", "free", "prize", "giveaway", "contest", "lottery"
+    ]
+    
+    # Language-specific spam patterns
+    language_specific_patterns = {
+        "es": ["sígueme", "sorteo", "gratis", "premio", "concurso", "dm", "mp", "seguir"],  # Spanish
+        "fr": ["suivez", "concours", "gratuit", "prix", "gagnant", "mp", "suivre"],       # French  
+        "pt": ["siga", "sorteio", "grátis", "prêmio", "concurso", "dm", "seguir"],        # Portuguese
+        "it": ["segui", "concorso", "gratis", "premio", "vincere", "dm", "seguire"],       # Italian
+        "de": ["folgen", "gewinnspiel", "kostenlos", "preis", "gewinnen", "folgt"],       # German
+        "ar": ["متابعة", "مسابقة", "مجاني", "جائزة", "ربح", "تابع"],                      # Arabic
+        "ja": ["フォロー", "プレゼント", "無料", "賞品", "当選", "フォロバ"],                         # Japanese
+        "ko": ["팔로우", "이벤트", "무료", "상품", "당첨", "팔로백"],                          # Korean
+        "zh": ["关注", "抽奖", "免费", "奖品", "获奖", "回关"],                            # Chinese
+        "hi": ["फॉलो", "गिवअवे", "मुफ्त", "पुरस्कार", "जीत", "फॉलो बैक"],                   # Hindi
+        "ru": ["подписка", "розыгрыш", "бесплатно", "приз", "выиграть", "подписаться"],        # Russian
+        "tr": ["takip", "çekiliş", "ücretsiz", "ödül", "kazan", "takip et"],               # Turkish
+        "nl": ["volgen", "wedstrijd", "gratis", "prijs", "winnen", "volg terug"],            # Dutch
+        "sv": ["följa", "tävling", "gratis", "pris", "vinna", "följa tillbaka"],                 # Swedish
+        "da": ["følg", "konkurrence", "gratis", "præmie", "vind", "følg tilbage"],             # Danish
+        "no": ["følg", "konkurranse", "gratis", "premie", "vinn", "følg tilbake"],             # Norwegian
+    }
+    
+    # Check universal patterns
+    universal_matches = sum(1 for pattern in universal_spam_patterns if pattern in comment_lower)
+    
+    # Check language-specific patterns
+    language_matches = 0
+    if language in language_specific_patterns:
+        patterns = language_specific_patterns[language]
+        language_matches = sum(1 for pattern in patterns if pattern in comment_lower)
+    
+    # Calculate spam score
+    total_matches = universal_matches + language_matches * 1.5
+
+    # Enhanced emoji spam detection
+    spam_emojis = ['🎉', '🚨', '🔥', '💸', '💥', '🎁', '💎', '📈', '🔄', '✨', '🛍️', '💯', '👍', '🙌', '💖', '💬', '🚀', '💰', '🎊', '🏆']
+    emoji_count = sum(comment.count(emoji) for emoji in spam_emojis)
+    total_emojis = sum(1 for char in comment if ord(char) > 127)
+    
+    emoji_spam_score = 0
+    if total_emojis >= 4 or (len(comment) > 0 and total_emojis / len(comment) > 0.15):
+        emoji_spam_score = 1
+    
+    # Check for excessive hashtags
+    hashtag_count = comment.count('#')
+    hashtag_score = 1 if hashtag_count >= 3 else 0
+    return total_matches + emoji_spam_score + hashtag_score
+
+
+def make_corpus(count, spam_share=0.2, seed=0):
+    """Comments built from one to three samples, with random casing and extra pattern words"""
+    rng = random.Random(seed)
+    words = HIGH_CONFIDENCE_PATTERNS + MEDIUM_CONFIDENCE_PATTERNS + UNIVERSAL_SPAM_PATTERNS
+    corpus = []
+    for _ in range(count):
+        spam = rng.random() < spam_share
+        parts = [rng.choice(SPAM_SAMPLES if spam else CLEAN_SAMPLES)]
+        parts += [rng.choice(CLEAN_SAMPLES) for _ in range(rng.randint(0, 2))]
+        text = " ".join(part for part, _ in parts)
+        if spam and rng.random() < 0.5:
+            text += " " + rng.choice(words)
+        if rng.random() < 0.05:
+            text = text.upper()
+        corpus.append((text, parts[0][1]))
+    return corpus
+
+
+def timed(label, fn, corpus):
+    start = time.perf_counter()
+    results = [fn(text, language) for text, language in corpus]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {len(corpus) / elapsed:>12,.0f} comments/sec")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=100_000)
+    parser.add_argument("--spam-share", type=float, default=0.2, help="fraction of comments built from spam samples")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.comments, args.spam_share)
+    print(f"{len(corpus)} comments, {args.spam_share:.0%} spam samples\n")
+
+    old = timed("is_spam heuristics (substring)", lambda text, _: legacy_heuristic_spam(text), corpus)
+    new = timed("is_spam heuristics (compiled)", lambda text, _: heuristic_spam(text), corpus)
+    mismatches = sum(a != b for a, b in zip(old, new))
+    print(f"{'verdict mismatches':<32} {mismatches:>12}\n")
+
+    old = timed("multilingual score (substring)", legacy_multilingual_spam_score, corpus)
+    new = timed("multilingual score (compiled)", multilingual_spam_score, corpus)
+    mismatches += (score_mismatches := sum(a != b for a, b in zip(old, new)))
+    print(f"{'score mismatches':<32} {score_mismatches:>12}")
+
+    if mismatches:
+        raise SystemExit("compiled matcher disagrees with the original heuristics")
+
+
+if __name__ == "__main__":
+    main()
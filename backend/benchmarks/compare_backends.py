@@ -0,0 +1,96 @@
+"""
+Compare inference backends for accuracy and speed
+
+Runs each model on the pt, int8 and onnx backends over a small labeled
+multilingual set and reports accuracy, agreement with the fp32 PyTorch
+output and latency. Use it before switching MODEL_BACKEND in production.
+
+Run from the backend directory:
+    python -m benchmarks.compare_backends --models multilingual_sentiment multilingual_spam
+"""
+import os
+import json
+import time
+import argparse
+from collections import Counter
+from model_registry import MODEL_SPECS
+from sentinel_analysis_ai.inference_backends import SUPPORTED_BACKENDS, build_pipeline
+from sentinel_analysis_ai.batch_inference import run_batched
+from sentinel_analysis_ai.analyzer import normalize_sentiment_label
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "labeled_comments.jsonl")
+
+SPAM_MODELS = {"multilingual_spam", "toxic_bert"}
+
+
+def load_fixture(path=FIXTURE):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def predicted_label(name, result):
+    """Map a raw model prediction onto the fixture labels"""
+    if result is None:
+        return "error"
+    if name in SPAM_MODELS:
+        return "spam" if "toxic" in result["label"].lower() and "non" not in result["label"].lower() else "not_spam"
+    return normalize_sentiment_label(result["label"], result["score"])
+
+
+def expected_label(name, row):
+    if name in SPAM_MODELS:
+        return "spam" if row["label"] == "spam" else "not_spam"
+    return row["label"]
+
+
+def run_backend(name, backend, texts, batch_size, repeats):
+    """Load one model on one backend and time batched inference over the texts"""
+    task, model_id = MODEL_SPECS[name]
+    start = time.perf_counter()
+    model = build_pipeline(task, model_id, backend)
+    load_seconds = time.perf_counter() - start
+
+    run_batched(model, texts, batch_size)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        results = run_batched(model, texts, batch_size)
+    elapsed = (time.perf_counter() - start) / repeats
+    return results, load_seconds, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=["multilingual_sentiment", "multilingual_spam"], choices=sorted(MODEL_SPECS))
+    parser.add_argument("--backends", nargs="+", default=list(SUPPORTED_BACKENDS), choices=SUPPORTED_BACKENDS)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=5, help="timed passes over the fixture")
+    args = parser.parse_args()
+
+    rows = load_fixture()
+    texts = [row["text"] for row in rows]
+    print(f"{len(rows)} labeled comments, batch size {args.batch_size}\n")
+
+    for name in args.models:
+        print(f"== {name}")
+        print(f"{'backend':<8} {'load s':>8} {'ms/comment':>11} {'accuracy':>9} {'vs pt':>7}  labels")
+        expected = [expected_label(name, row) for row in rows]
+        reference = None
+        for backend in args.backends:
+            try:
+                results, load_seconds, elapsed = run_backend(name, backend, texts, args.batch_size, args.repeats)
+            except Exception as e:
+                print(f"{backend:<8} skipped: {e}")
+                continue
+
+            labels = [predicted_label(name, result) for result in results]
+            if backend == "pt":
+                reference = labels
+            accuracy = sum(a == b for a, b in zip(labels, expected)) / len(rows)
+            agreement = f"{sum(a == b for a, b in zip(labels, reference)) / len(rows):7.1%}" if reference else f"{'-':>7}"
+            distribution = ", ".join(f"{label}={count}" for label, count in Counter(labels).most_common())
+            print(f"{backend:<8} {load_seconds:8.1f} {elapsed * 1000 / len(rows):11.2f} {accuracy:9.1%} {agreement}  {distribution}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Bulk export and import of posts, comments and their analysis results
+
+Tables are streamed in chunks of BULK_CHUNK_SIZE rows, read with keyset
+pagination and written with executemany, so memory stays bounded however
+large the database or file is. The format follows the file extension:
+.parquet and .arrow (Arrow IPC) need pyarrow, .ndjson/.jsonl is compact
+newline-delimited JSON.
+
+Run from the backend directory:
+    python -m bulk_io export exports/ --format parquet
+    python -m bulk_io import exports/posts.parquet exports/comments.parquet
+"""
+import os
+import json
+import argparse
+from functools import partial
+from itertools import islice
+from sqlalchemy import bindparam, select, insert, update
+from models import db, Post, postComment, canonical_shortcode, upgrade_schema
+from ingest import comment_hashes
+
+# Bulk export/import settings
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "50000"))  # rows per read, write and transaction
+
+# stored posts and comment hashes are looked up this many at a time, below SQLite's bound-parameter limit
+LOOKUP_BATCH = 500
+
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# exported columns and their types ("int", "float", "str"), in file order
+POST_COLUMNS = {
+    "id": "int",
+    "shortcode": "str",
+    "post_id": "str",
+    "campaign": "str",
+    "comment_count": "int",
+    "last_scraped_at": "str",
+}
+COMMENT_COLUMNS = {
+    "id": "int",
+    "post_pk": "int",
+    "post_id": "str",
+    "comment": "str",
+    "comment_hash": "str",
+    "created_at": "str",
+    "label": "str",
+    "confidence": "float",
+    "detected_language": "str",
+    "model_used": "str",
+}
+# ids are the exporting database's, comments get new ones and are linked to their post by URL
+IMPORTED_COMMENT_COLUMNS = [name for name in COMMENT_COLUMNS if name not in ("id", "post_pk")]
+TABLES = {"posts": (Post, POST_COLUMNS), "comments": (postComment, COMMENT_COLUMNS)}
+
+
+def file_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"unknown bulk file type {extension!r}, expected one of {sorted(FORMATS)}")
+    return FORMATS[extension]
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("parquet and arrow files need `pip install pyarrow`") from e
+    return pyarrow
+
+
+def arrow_schema(pa, columns: dict):
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in columns.items()])
+
+
+# -------------------
+# Files
+# -------------------
+def write_chunks(path: str, columns: dict, chunks) -> int:
+    """
+    Write chunks of row dicts to a file, one chunk at a time
+
+    Args:
+        path (str): Output file, its extension picks the format
+        columns (dict): Column name -> type, in file order
+        chunks (iterable): Lists of row dicts
+
+    Returns:
+        int: Rows written
+    """
+    fmt = file_format(path)
+    written = 0
+    if fmt == "ndjson":
+        with open(path, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.writelines(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n" for row in chunk)
+                written += len(chunk)
+        return written
+
+    pa = import_pyarrow()
+    schema = arrow_schema(pa, columns)
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(path, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(path, schema)
+    # every chunk becomes its own row group / record batch, nothing else is held in memory
+    with writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            written += len(chunk)
+    return written
+
+
+def read_chunks(path: str, chunk_size: int = BULK_CHUNK_SIZE):
+    """Yield a file's rows as lists of at most chunk_size dicts"""
+    fmt = file_format(path)
+    if fmt == "ndjson":
+        with open(path, encoding="utf-8") as f:
+            while True:
+                lines = list(islice(f, chunk_size))
+                if not lines:
+                    return
+                # a run of blank lines is skipped, it does not end the file
+                chunk = [json.loads(line) for line in lines if line.strip()]
+                if chunk:
+                    yield chunk
+
+    pa = import_pyarrow()
+    if fmt == "parquet":
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size).to_pylist()
+
+
+# -------------------
+# Export
+# -------------------
+def table_chunks(table: str, chunk_size: int = BULK_CHUNK_SIZE, after_id: int = 0):
+    """
+    Yield a table's rows as lists of dicts, ordered by id
+
+    Core selects of the table's columns with keyset pagination (id > last
+    id), so no ORM rows are built and every chunk is an index range scan.
+    """
+    model, columns = TABLES[table]
+    names = list(columns)
+    source = model.__table__
+    query = select(*(source.c[name] for name in names)).order_by(source.c.id).limit(chunk_size)
+    connection = db.session.connection()
+    while True:
+        rows = connection.execute(query.where(source.c.id > after_id)).all()
+        if not rows:
+            return
+        chunk = [dict(zip(names, row)) for row in rows]
+        if table == "posts":
+            for row in chunk:
+                row["last_scraped_at"] = row["last_scraped_at"].isoformat() if row["last_scraped_at"] else None
+        yield chunk
+        if len(rows) < chunk_size:
+            return
+        after_id = chunk[-1]["id"]
+
+
+def export_table(table: str, path: str, chunk_size: int = BULK_CHUNK_SIZE, after_id: int = 0) -> int:
+    """
+    Export "posts" or "comments" (with their analysis results) to a file
+
+    Args:
+        table (str): "posts" or "comments"
+        path (str): Output file, .parquet, .arrow, .ndjson or .jsonl
+        chunk_size (int): Rows read and written at a time
+        after_id (int): Only export rows with a larger id, for incremental exports
+
+    Returns:
+        int: Rows exported
+    """
+    return write_chunks(path, TABLES[table][1], table_chunks(table, chunk_size, after_id))
+
+
+def export_all(directory: str, fmt: str = "parquet", chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """Export every table to <directory>/<table>.<fmt>, returning table -> rows exported"""
+    os.makedirs(directory, exist_ok=True)
+    return {
+        table: export_table(table, os.path.join(directory, f"{table}.{fmt}"), chunk_size)
+        for table in TABLES
+    }
+
+
+# -------------------
+# Import
+# -------------------
+def lookup(query, column, values) -> list:
+    """Rows of `query` whose `column` is one of `values`, LOOKUP_BATCH values per statement"""
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), LOOKUP_BATCH):
+        rows.extend(db.session.execute(query.where(column.in_(values[start:start + LOOKUP_BATCH]))).all())
+    return rows
+
+
+def post_pks(shortcodes: set, urls: dict) -> dict:
+    """shortcode -> Post.id for a chunk's posts, creating the ones not stored yet"""
+    query = select(Post.shortcode, Post.id)
+    found = dict(lookup(query, Post.shortcode, shortcodes))
+    missing = shortcodes - found.keys()
+    if missing:
+        db.session.execute(insert(Post), [
+            {"shortcode": shortcode, "post_id": urls[shortcode], "comment_count": 0} for shortcode in missing
+        ])
+        found.update(lookup(query, Post.shortcode, missing))
+    return found
+
+
+def stored_hashes(post_pk: int, hashes: list) -> set:
+    """Which of these comment hashes the post already has"""
+    query = select(postComment.comment_hash).where(postComment.post_pk == post_pk)
+    return {row.comment_hash for row in lookup(query, postComment.comment_hash, hashes)}
+
+
+def import_posts(chunk: list) -> int:
+    """
+    Create the chunk's posts that are missing and copy campaigns onto existing ones
+
+    last_scraped_at is not imported: a post is only fresh for the scraper
+    that stored it, so imported posts are scraped again when first used.
+    """
+    urls = {canonical_shortcode(row.get("shortcode") or row["post_id"]): row["post_id"] for row in chunk}
+    existing = {row.shortcode for row in lookup(select(Post.shortcode), Post.shortcode, urls)}
+    pks = post_pks(set(urls), urls)
+    updates = [
+        {
+            "id": pks[canonical_shortcode(row.get("shortcode") or row["post_id"])],
+            "campaign": row.get("campaign"),
+        }
+        for row in chunk if row.get("campaign")
+    ]
+    if updates:
+        db.session.execute(update(Post), updates)
+    return len(set(urls) - existing)
+
+
+def import_comments(chunk: list, occurrences: dict | None = None) -> int:
+    """
+    Insert the chunk's comments that are not stored yet, with their analysis results
+
+    Posts are matched by the shortcode of the comment's post URL, not by
+    id. Rows without a comment_hash get one computed like freshly scraped
+    comments, numbering repeated texts across the whole import when the
+    same `occurrences` dict (shortcode -> texts seen) is passed for every
+    chunk.
+    """
+    occurrences = {} if occurrences is None else occurrences
+    shortcodes = {}
+    urls = {}
+    by_post = {}
+    for row in chunk:
+        shortcode = shortcodes.get(row["post_id"])
+        if shortcode is None:
+            shortcode = shortcodes[row["post_id"]] = canonical_shortcode(row["post_id"])
+            urls.setdefault(shortcode, row["post_id"])
+        by_post.setdefault(shortcode, []).append(row)
+    pks = post_pks(set(by_post), urls)
+
+    rows = []
+    counts = []
+    for shortcode, post_rows in by_post.items():
+        missing = [row for row in post_rows if not row.get("comment_hash")]
+        for row, comment_hash in zip(missing, comment_hashes([row.get("comment") or "" for row in missing], occurrences.setdefault(shortcode, {}))):
+            row["comment_hash"] = comment_hash
+        post_pk = pks[shortcode]
+        stored = stored_hashes(post_pk, [row["comment_hash"] for row in post_rows])
+        inserted = 0
+        for row in post_rows:
+            if row["comment_hash"] in stored:
+                continue
+            stored.add(row["comment_hash"])
+            rows.append({**{name: row.get(name) for name in IMPORTED_COMMENT_COLUMNS}, "post_pk": post_pk})
+            inserted += 1
+        if inserted:
+            counts.append({"post_pk": post_pk, "added": inserted})
+
+    if rows:
+        # Core insert of the table: plain executemany, without the ORM's per-row bookkeeping
+        db.session.execute(postComment.__table__.insert(), rows)
+    if counts:
+        # the table (not the ORM entity) so the counts are added in one executemany
+        post_table = Post.__table__
+        db.session.execute(
+            post_table.update()
+            .where(post_table.c.id == bindparam("post_pk"))
+            .values(comment_count=post_table.c.comment_count + bindparam("added")),
+            counts
+        )
+    return len(rows)
+
+
+def import_file(path: str, table: str | None = None, chunk_size: int = BULK_CHUNK_SIZE) -> int:
+    """
+    Import posts or comments from a file, one committed chunk at a time
+
+    Rows that are already stored are skipped, so an interrupted import can
+    be run again. Imported comments keep their stored results, and are
+    analyzed and added to their post's aggregates the next time the post
+    is analyzed (/api/filter or a filter job), as newly scraped ones are.
+
+    Args:
+        path (str): .parquet, .arrow, .ndjson or .jsonl file
+        table (str): "posts" or "comments", taken from the file name by default
+        chunk_size (int): Rows read, inserted and committed at a time
+
+    Returns:
+        int: Rows inserted
+    """
+    table = table or os.path.splitext(os.path.basename(path))[0]
+    if table not in TABLES:
+        raise ValueError(f"cannot tell which table {path} holds, pass table='posts' or 'comments'")
+    # a post's comments can span chunks, so repeated texts are numbered across all of them
+    import_chunk = import_posts if table == "posts" else partial(import_comments, occurrences={})
+    inserted = 0
+    for chunk in read_chunks(path, chunk_size):
+        inserted += import_chunk(chunk)
+        db.session.commit()
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # options both commands take after their name, e.g. `export exports/ --chunk-size 10000`
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE, help="rows per chunk")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", parents=[common], help="write posts.<format> and comments.<format> to a directory")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--format", choices=["parquet", "arrow", "ndjson"], default="parquet")
+    import_parser = commands.add_parser("import", parents=[common], help="import posts and/or comments files (posts first)")
+    import_parser.add_argument("paths", nargs="+")
+    import_parser.add_argument("--table", choices=sorted(TABLES), help="table of every file, by default taken from its name")
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        if args.command == "export":
+            for table, rows in export_all(args.directory, args.format, args.chunk_size).items():
+                print(f"Exported {rows} {table} to {args.directory}")
+        else:
+            for path in args.paths:
+                print(f"Imported {import_file(path, args.table, args.chunk_size)} new rows from {path}")
+
+
+if __name__ == "__main__":
+    main()
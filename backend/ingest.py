@@ -0,0 +1,245 @@
+import os
+import time
+import hashlib
+from datetime import datetime, timedelta, timezone
+from collections import Counter
+from sqlalchemy import bindparam, func, select, update
+from metrics import metrics, DB_READ_SECONDS
+from models import db, Post, postComment, utcnow, canonical_shortcode, find_post, insert_ignore
+from sentinel_analysis_ai.result_cache import normalize_comment
+
+# How long scraped comments for a post are served from the database before re-scraping
+SCRAPE_TTL_SECONDS = int(os.getenv("SCRAPE_TTL_SECONDS", "3600"))
+
+INGEST_SECONDS = metrics.histogram("sentinel_ingest_seconds", "Duration of storing one scrape of a post")
+COMMENTS_INGESTED = metrics.counter("sentinel_comments_ingested_total", "Scraped comments by whether they were new", ["result"])
+
+
+def comment_hashes(comments: list[str], seen: dict | None = None) -> list[str]:
+    """
+    Stable identity for each comment of a post
+
+    Identical texts are told apart by how often the text has already appeared,
+    so two people posting the same emoji are both kept while a re-scrape of
+    the same comments maps onto the rows already stored. Pass the same `seen`
+    dict for every part of a post's comments that are hashed separately.
+    """
+    seen = {} if seen is None else seen
+    hashes = []
+    for comment in comments:
+        normalized = normalize_comment(comment)
+        occurrence = seen.get(normalized, 0)
+        seen[normalized] = occurrence + 1
+        hashes.append(hashlib.sha256(f"{normalized}\x00{occurrence}".encode("utf-8")).hexdigest())
+    return hashes
+
+
+UTC_SUFFIXES = ("Z", "+00:00")
+
+# ids per DELETE of duplicate rows in backfill_posts, under SQLite's bound parameter limit
+BACKFILL_DELETE_BATCH = 500
+
+
+def comment_time(entry: dict, default: str) -> str:
+    """UTC time of a scraped comment as "YYYY-MM-DDTHH:MM:SS", from its ISO timestamp if it has one"""
+    timestamp = entry.get("timestamp")
+    if not timestamp:
+        return default
+    # Instagram's <time datetime> is already UTC ("...Z"), only other offsets need parsing
+    if timestamp.endswith(UTC_SUFFIXES) and len(timestamp) >= 19:
+        return timestamp[:19]
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return default
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def get_or_create_post(url: str) -> Post:
+    """The post a URL points at, created if needed even when another request creates it at the same time"""
+    post = find_post(url)
+    if not post:
+        db.session.execute(insert_ignore(Post).values(shortcode=canonical_shortcode(url), post_id=url, comment_count=0))
+        post = find_post(url)
+    return post
+
+
+def is_fresh(post_id: str, ttl: int = SCRAPE_TTL_SECONDS) -> bool:
+    """True when the post was scraped within the last `ttl` seconds"""
+    post = find_post(post_id)
+    if not post or not post.last_scraped_at:
+        return False
+    return utcnow() - post.last_scraped_at < timedelta(seconds=ttl)
+
+
+def ingest_comments(post_id: str, comments: list[dict]) -> int:
+    """
+    Store newly scraped comments for a post, skipping ones already stored
+
+    All new rows are written with a single executemany in one transaction.
+    Concurrent ingests of the same post are safe: rows another request
+    stored first are skipped by the (post, comment hash) unique index
+    instead of failing, and comment_count is recounted from the table.
+
+    Args:
+        post_id (str): Instagram post URL
+        comments (list): Comment dicts as returned by the scraper
+
+    Returns:
+        int: Number of comments inserted
+    """
+    started = time.perf_counter()
+    texts = [entry["comment"] for entry in comments]
+    hashes = comment_hashes(texts)
+
+    post = get_or_create_post(post_id)
+
+    with DB_READ_SECONDS.time(query="comment_hashes"):
+        stored = {
+            row.comment_hash
+            for row in db.session.query(postComment.comment_hash).filter_by(post_pk=post.id)
+        }
+
+    now = utcnow()
+    ingested_at = now.strftime("%Y-%m-%dT%H:%M:%S")
+    rows = []
+    for entry, comment, comment_hash in zip(comments, texts, hashes):
+        if comment_hash in stored:
+            continue
+        stored.add(comment_hash)
+        rows.append({
+            "post_id": post_id, "post_pk": post.id, "comment": comment, "comment_hash": comment_hash,
+            "created_at": comment_time(entry, ingested_at),
+        })
+    inserted = 0
+    if rows:
+        inserted = db.session.execute(insert_ignore(postComment), rows).rowcount
+
+    post.last_scraped_at = now
+    if inserted:
+        post.comment_count = db.session.scalar(select(func.count()).where(postComment.post_pk == post.id))
+
+    db.session.commit()
+    INGEST_SECONDS.observe(time.perf_counter() - started)
+    COMMENTS_INGESTED.inc(inserted, result="inserted")
+    COMMENTS_INGESTED.inc(len(texts) - inserted, result="duplicate")
+    return inserted
+
+
+def tag_campaign(urls: list[str], campaign: str | None) -> int:
+    """
+    Put posts in a marketing campaign (None takes them out of any)
+
+    Posts that were never scraped are created, so they can be tagged before
+    their comments are queued. /api/analytics joins the campaign at query
+    time, so a post's results move with it when it is re-tagged.
+
+    Returns:
+        int: Number of posts tagged
+    """
+    posts = {}
+    for url in urls:
+        post = get_or_create_post(url)
+        post.campaign = campaign
+        posts[post.shortcode] = post
+    db.session.commit()
+    return len(posts)
+
+
+def rescrape_duplicates(rows: list) -> list[int]:
+    """
+    Ids of stored comments that repeat an earlier scrape of the same post
+
+    Before comments were deduplicated every scrape stored the post's whole
+    comment list again. Each scrape starts with the post's header (its
+    author), so every repeat of the post's first row starts a new one. A
+    text is kept as many times as it appears in a single scrape, one row per
+    occurrence as comment_hashes numbers them; the other copies are returned.
+
+    Args:
+        rows (list): (id, comment) of the post's comments, in id order
+    """
+    if not rows:
+        return []
+    header = normalize_comment(rows[0].comment or "")
+    kept = Counter()
+    scrape = Counter()
+    duplicates = []
+    for i, row in enumerate(rows):
+        text = normalize_comment(row.comment or "")
+        if i and text == header:
+            scrape = Counter()
+        scrape[text] += 1
+        if scrape[text] > kept[text]:
+            kept[text] = scrape[text]
+        else:
+            duplicates.append(row.id)
+    return duplicates
+
+
+def backfill_posts():
+    """
+    Link comments stored before the post table existed to their post
+
+    Comments of URL variants of the same post are merged under one post,
+    copies stored by repeated scrapes are dropped (see rescrape_duplicates),
+    and the rest are re-hashed together so the (post, comment hash)
+    uniqueness holds.
+    """
+    # posts created before shortcodes existed
+    for post in Post.query.filter(Post.shortcode.is_(None)).all():
+        shortcode = canonical_shortcode(post.post_id)
+        if Post.query.filter_by(shortcode=shortcode).first():
+            db.session.delete(post)
+        else:
+            post.shortcode = shortcode
+        db.session.flush()
+
+    legacy_urls = [
+        row.post_id
+        for row in db.session.query(postComment.post_id).filter(postComment.post_pk.is_(None)).distinct()
+    ]
+    if not legacy_urls:
+        db.session.commit()
+        return
+
+    touched = set()
+    for url in legacy_urls:
+        post = get_or_create_post(url)
+        postComment.query.filter(postComment.post_id == url, postComment.post_pk.is_(None)).update(
+            {"post_pk": post.id}, synchronize_session=False
+        )
+        touched.add(post.id)
+
+    dropped = 0
+    set_hash = (
+        update(postComment.__table__)
+        .where(postComment.__table__.c.id == bindparam("row_id"))
+        .values(comment_hash=bindparam("new_hash"))
+    )
+    for post_pk in touched:
+        rows = (
+            db.session.query(postComment.id, postComment.comment)
+            .filter_by(post_pk=post_pk).order_by(postComment.id).all()
+        )
+        duplicates = rescrape_duplicates(rows)
+        for start in range(0, len(duplicates), BACKFILL_DELETE_BATCH):
+            batch = duplicates[start:start + BACKFILL_DELETE_BATCH]
+            postComment.query.filter(postComment.id.in_(batch)).delete(synchronize_session=False)
+        dropped_ids = set(duplicates)
+        rows = [row for row in rows if row.id not in dropped_ids]
+        dropped += len(duplicates)
+
+        # clear first so intermediate updates cannot collide on the unique index
+        postComment.query.filter_by(post_pk=post_pk).update({"comment_hash": None}, synchronize_session=False)
+        if rows:
+            db.session.execute(set_hash, [
+                {"row_id": row.id, "new_hash": comment_hash}
+                for row, comment_hash in zip(rows, comment_hashes([row.comment or "" for row in rows]))
+            ])
+        Post.query.filter_by(id=post_pk).update({"comment_count": len(rows)}, synchronize_session=False)
+    db.session.commit()
+    if dropped:
+        print(f"Backfill dropped {dropped} comments stored again by repeated scrapes")
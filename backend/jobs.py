@@ -0,0 +1,173 @@
+import os
+import time
+import uuid
+import queue
+import logging
+import threading
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Job settings
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))  # finished jobs are forgotten after this
+
+
+class Job:
+    def __init__(self, kind, params):
+        """
+        A unit of background work and its progress
+
+        Args:
+            kind (str): Job type, e.g. "filter" or "scrape"
+            params (dict): Arguments the job was submitted with
+        """
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def update(self, status=None, stage=None, done=None, total=None, result=None, error=None):
+        """Record progress and wake up anyone waiting on this job"""
+        with self.changed:
+            if status is not None:
+                self.status = status
+            if stage is not None:
+                self.stage = stage
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+            if result is not None:
+                self.result = result
+            if error is not None:
+                self.error = error
+            self.updated_at = time.time()
+            self.version += 1
+            self.changed.notify_all()
+
+    def progress(self, stage, done=0, total=0):
+        """Progress callback handed to the job function"""
+        self.update(stage=stage, done=done, total=total)
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def wait_for_change(self, version, timeout=15):
+        """
+        Block until the job changes past `version`
+
+        Returns:
+            int: Current version (unchanged if the wait timed out)
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version or self.finished, timeout)
+            return self.version
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": {"stage": self.stage, "done": self.done, "total": self.total},
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+
+class JobManager:
+    def __init__(self, workers=JOB_WORKERS, retention=JOB_RETENTION_SECONDS, context=None):
+        """
+        In-process job queue with a pool of worker threads, no broker needed
+
+        Args:
+            workers (int): Jobs run at the same time
+            retention (int): Seconds finished jobs stay queryable
+            context (callable): Returns a context manager entered around each
+                                job, e.g. Flask's app.app_context
+        """
+        self.workers = max(1, workers)
+        self.retention = retention
+        self.context = context or nullcontext
+        self.queue = queue.Queue()
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        """Start the worker threads (done lazily so forked processes start their own)"""
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self.work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, kind, fn, **params):
+        """
+        Queue a job and return immediately
+
+        Args:
+            kind (str): Job type
+            fn (callable): Called as fn(job, **params), its return value is the job result
+
+        Returns:
+            Job: The queued job
+        """
+        self.start()
+        self.prune()
+        job = Job(kind, params)
+        with self.lock:
+            self.jobs[job.id] = job
+        self.queue.put((job, fn))
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def work(self):
+        while True:
+            job, fn = self.queue.get()
+            job.update(status="running")
+            try:
+                with self.context():
+                    result = fn(job, **job.params)
+                job.update(status="done", result=result)
+            except Exception as e:
+                logger.exception(f"Job {job.id} ({job.kind}) failed")
+                job.update(status="failed", error=str(e))
+            finally:
+                self.queue.task_done()
+
+    def prune(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention
+        with self.lock:
+            for job_id in [j.id for j in self.jobs.values() if j.finished and j.updated_at < cutoff]:
+                del self.jobs[job_id]
+
+    def stats(self):
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {
+            "workers": self.workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "done": statuses.count("done"),
+            "failed": statuses.count("failed")
+        }
@@ -0,0 +1,201 @@
+import os
+import time
+import random
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Metrics settings
+COMMENT_LOG_SAMPLE_RATE = float(os.getenv("COMMENT_LOG_SAMPLE_RATE", "0.01"))  # share of per-comment debug lines written
+
+# seconds; covers a single regex check up to a full scrape
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# -------------------
+# Metric types
+# -------------------
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        """
+        A named family of values, one per combination of label values
+
+        Args:
+            name (str): Metric name
+            help (str): One-line description
+            labelnames (tuple): Label names, in the order values are keyed
+            fn (callable): Reads the values at render time instead of them being
+                           recorded: returns a number, or a dict of
+                           label values tuple -> number
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def label_text(self, key, extra=""):
+        pairs = [f'{name}="{escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def current(self):
+        """label values tuple -> value"""
+        if self.fn is None:
+            with self.lock:
+                return dict(self.values)
+        values = self.fn()
+        return values if isinstance(values, dict) else {(): values}
+
+    def samples(self):
+        """Lines of the Prometheus text format for this metric's values"""
+        return [f"{self.name}{self.label_text(key)} {format_value(value)}" for key, value in sorted(self.current().items())]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Distribution of observed values in cumulative buckets
+
+        Args:
+            buckets (tuple): Upper bounds, ascending; +Inf is added
+        """
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            states = {key: (list(counts), total, count) for key, (counts, total, count) in self.values.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(states.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{self.label_text(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self.label_text(key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{self.label_text(key)} {count}")
+        return lines
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+# -------------------
+# Registry
+# -------------------
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Every metric of this process, rendered for Prometheus by /metrics
+
+        Modules create their metrics at import time through counter(),
+        gauge() and histogram(); asking for an existing name returns the
+        metric already registered under it.
+        """
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, cls, name, *args, **kwargs):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, *args, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, help, labelnames=(), fn=None) -> Counter:
+        return self.register(Counter, name, help, labelnames, fn)
+
+    def gauge(self, name, help, labelnames=(), fn=None) -> Gauge:
+        return self.register(Gauge, name, help, labelnames, fn)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram, name, help, labelnames, buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# shared by the Flask models and the result cache's own SQLite connection
+DB_READ_SECONDS = metrics.histogram("sentinel_db_read_seconds", "Duration of a database read", ["query"])
+
+
+# -------------------
+# Sampled logging
+# -------------------
+def log_sampled(logger: logging.Logger, message: str, *args, rate: float = COMMENT_LOG_SAMPLE_RATE):
+    """
+    Write a per-comment debug line for a random `rate` share of calls
+
+    Callers in hot loops should check logger.isEnabledFor(logging.DEBUG)
+    first, so nothing is formatted when debug logging is off.
+    """
+    if random.random() < rate:
+        logger.debug(message, *args)
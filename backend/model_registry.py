@@ -0,0 +1,282 @@
+import os
+import gc
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from sentinel_analysis_ai.inference_backends import backend_for, build_pipeline
+
+logger = logging.getLogger(__name__)
+
+# When models are loaded: "lazy" (first use), "background" (warm-up thread at startup) or "eager" (before serving)
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "background")
+
+# Idle models are evicted, least recently used first, once loaded models exceed this many MB (0 = no limit)
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+
+# name -> (pipeline task, Hugging Face model id); names pointing at the same model share one instance
+MODEL_SPECS = {
+    "multilingual_sentiment": ("sentiment-analysis", "nlptown/bert-base-multilingual-uncased-sentiment"),
+    "english_sentiment": ("sentiment-analysis", "cardiffnlp/twitter-roberta-base-sentiment"),
+    "multilingual_spam": ("text-classification", "martin-ha/toxic-comment-model"),
+    "toxic_bert": ("text-classification", "unitary/toxic-bert"),
+}
+
+# Pinned Hugging Face revisions (branch, tag or commit), e.g. MODEL_REVISIONS="multilingual_sentiment=f5c6bd1"
+MODEL_REVISIONS = dict(
+    item.strip().split("=", 1) for item in os.getenv("MODEL_REVISIONS", "").split(",") if "=" in item
+)
+
+
+def process_rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        # not Linux: peak RSS is the closest thing available without psutil
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def process_pss_mb():
+    """
+    Proportional set size of this process in MB, or None if unavailable
+
+    Pages shared with other processes (e.g. model weights inherited from a
+    pre-fork parent) are divided between them, so summing PSS over worker
+    processes gives their real combined memory use.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def parameter_mb(model):
+    """Size of a pipeline's weights in MB, or None if it has no torch parameters"""
+    try:
+        return sum(p.numel() * p.element_size() for p in model.model.parameters()) / 2**20
+    except Exception:
+        return None
+
+
+class ModelEntry:
+    def __init__(self, task, model_id, backend="pt", revision="main"):
+        self.task = task
+        self.model_id = model_id
+        self.backend = backend
+        self.revision = revision
+        self.state = "not_loaded"  # not_loaded, loading, loaded, failed, evicted
+        self.model = None
+        self.error = None
+        self.load_seconds = None
+        self.rss_mb = None
+        self.size_mb = 0.0
+        self.refs = 0
+        self.last_used = 0.0
+        self.loads = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self, specs=MODEL_SPECS, memory_budget_mb=MODEL_MEMORY_BUDGET_MB, backends=None, revisions=MODEL_REVISIONS):
+        """
+        Reference-counted store that loads each pipeline once and shares it
+
+        Models load on first use. When the loaded models exceed the memory
+        budget, models nobody is using are evicted least recently used first
+        and reloaded the next time they are needed.
+
+        Args:
+            specs (dict): name -> (task, model id)
+            memory_budget_mb (float): Budget for loaded model weights, 0 for no limit
+            backends (dict): name -> inference backend, defaults to MODEL_BACKENDS
+            revisions (dict): name -> model revision, "main" when not pinned
+        """
+        self.memory_budget_mb = memory_budget_mb
+        self.entries = {}
+        self.names = {}
+        for name, (task, model_id) in specs.items():
+            backend = (backends or {}).get(name) or backend_for(name)
+            revision = revisions.get(name, "main")
+            key = (task, model_id, backend, revision)
+            if key not in self.entries:
+                self.entries[key] = ModelEntry(task, model_id, backend, revision)
+            self.names[name] = self.entries[key]
+        self.lock = threading.Lock()
+        # loads are serialized so the RSS growth of each one can be attributed to it
+        self.load_lock = threading.Lock()
+
+    def load(self, entry):
+        """Build the pipeline for an entry on its configured backend"""
+        return build_pipeline(entry.task, entry.model_id, entry.backend, entry.revision)
+
+    def load_entry(self, entry):
+        """Load an entry's pipeline and record its load time and memory"""
+        entry.state = "loading"
+        with self.load_lock:
+            rss_before = process_rss_mb()
+            start = time.perf_counter()
+            try:
+                entry.model = self.load(entry)
+                entry.state = "loaded"
+                entry.error = None
+                entry.loads += 1
+                logger.info(f"✅ {entry.model_id} ({entry.backend}) loaded successfully")
+            except Exception as e:
+                entry.state = "failed"
+                entry.error = str(e)
+                logger.error(f"❌ Failed to load {entry.model_id} ({entry.backend}): {e}")
+            entry.load_seconds = round(time.perf_counter() - start, 3)
+            entry.rss_mb = round(max(0.0, process_rss_mb() - rss_before), 1)
+        if entry.model is not None:
+            entry.size_mb = parameter_mb(entry.model) or entry.rss_mb
+
+    def get(self, name, pin=False):
+        """
+        Return the shared pipeline, loading it if needed
+
+        Args:
+            name (str): Model name, see MODEL_SPECS
+            pin (bool): Take a reference so the model cannot be evicted until release()
+
+        Returns:
+            The pipeline, or None if it failed to load (callers fall back to heuristics)
+        """
+        entry = self.names[name]
+        loaded_now = False
+        while True:
+            with entry.lock:
+                if entry.state in ("not_loaded", "evicted"):
+                    self.load_entry(entry)
+                    loaded_now = True
+                with self.lock:
+                    if entry.state == "evicted":
+                        continue  # evicted between loading and pinning, load again
+                    entry.last_used = time.monotonic()
+                    if pin and entry.model is not None:
+                        entry.refs += 1
+                    model = entry.model
+            break
+
+        if loaded_now:
+            self.enforce_budget(keep=entry)
+        return model
+
+    def release(self, name):
+        """Drop a reference taken with get(pin=True)"""
+        entry = self.names[name]
+        with self.lock:
+            entry.refs = max(0, entry.refs - 1)
+
+    @contextmanager
+    def acquire(self, name):
+        """Use a model for the duration of a block without it being evicted"""
+        model = self.get(name, pin=True)
+        try:
+            yield model
+        finally:
+            if model is not None:
+                self.release(name)
+
+    def enforce_budget(self, keep=None):
+        """Evict idle models, least recently used first, until loaded models fit the budget"""
+        if not self.memory_budget_mb:
+            return
+        evicted = []
+        with self.lock:
+            loaded = [e for e in self.entries.values() if e.state == "loaded"]
+            total = sum(e.size_mb for e in loaded)
+            for entry in sorted(loaded, key=lambda e: e.last_used):
+                if total <= self.memory_budget_mb:
+                    break
+                if entry is keep or entry.refs > 0:
+                    continue
+                entry.model = None
+                entry.state = "evicted"
+                entry.evictions += 1
+                total -= entry.size_mb
+                evicted.append(entry.model_id)
+        if evicted:
+            gc.collect()
+            logger.info(f"Evicted idle models to stay within {self.memory_budget_mb}MB: {evicted}")
+
+    def is_loaded(self, name):
+        return self.names[name].state == "loaded"
+
+    def warm_up(self, names=None, background=True):
+        """
+        Load models ahead of the first request
+
+        Args:
+            names (list): Models to load, defaults to all
+            background (bool): Load in a daemon thread and return immediately
+        """
+        names = list(names or self.names)
+
+        def run():
+            for name in names:
+                self.get(name)
+
+        if background:
+            threading.Thread(target=run, name="model-warmup", daemon=True).start()
+        else:
+            run()
+
+    def status(self):
+        """Load state, load time, memory and references of every model, without triggering loads"""
+        return {
+            name: {
+                "model": entry.model_id,
+                "revision": entry.revision,
+                "backend": entry.backend,
+                "state": entry.state,
+                "load_seconds": entry.load_seconds,
+                "rss_mb": entry.rss_mb,
+                "weights_mb": round(entry.size_mb, 1) if entry.size_mb else None,
+                "refs": entry.refs,
+                "loads": entry.loads,
+                "evictions": entry.evictions,
+                **({"error": entry.error} if entry.error else {})
+            }
+            for name, entry in self.names.items()
+        }
+
+    def memory_report(self):
+        """Process RSS next to the memory attributed to loaded models"""
+        loaded = {e.model_id: e for e in self.entries.values() if e.state == "loaded"}
+        return {
+            "process_rss_mb": round(process_rss_mb(), 1),
+            "process_pss_mb": round(pss, 1) if (pss := process_pss_mb()) is not None else None,
+            "models_mb": round(sum(e.size_mb for e in loaded.values()), 1),
+            "budget_mb": self.memory_budget_mb or None,
+            "per_model_rss_mb": {model_id: e.rss_mb for model_id, e in loaded.items()}
+        }
+
+
+# one registry per process, shared by the Flask and FastAPI code paths
+registry = ModelRegistry()
+
+
+def get_model(name):
+    """Shared pipeline by name, see MODEL_SPECS"""
+    return registry.get(name)
+
+
+def acquire_model(name):
+    """Context manager pinning a shared pipeline while it is used"""
+    return registry.acquire(name)
+
+
+def start_warm_up(names=None):
+    """Apply MODEL_WARMUP at service startup"""
+    if MODEL_WARMUP == "eager":
+        registry.warm_up(names, background=False)
+    elif MODEL_WARMUP == "background":
+        registry.warm_up(names, background=True)
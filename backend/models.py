@@ -0,0 +1,238 @@
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from metrics import DB_READ_SECONDS
+
+db = SQLAlchemy()
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///app.db")
+
+# Write-ahead logging lets readers continue while comments are being ingested
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") == "1"
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for bulk writes"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    if SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # with WAL, NORMAL only syncs at checkpoints and is still crash safe
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.close()
+
+def utcnow():
+    """Naive UTC timestamp, as stored by SQLite"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# Number of comments returned per page by /api/getcomment
+COMMENT_PAGE_SIZE = int(os.getenv("COMMENT_PAGE_SIZE", "200"))
+
+SHORTCODE_PATTERN = re.compile(r"instagram\.com/(?:[^/?#]+/)?(?:p|reels?|tv)/([A-Za-z0-9_-]+)")
+
+def canonical_shortcode(url: str) -> str:
+    """
+    Canonical key of a post, so URL variants (tracking params, /reel/ vs /p/,
+    username prefix, trailing slash) all map to the same post
+    """
+    match = SHORTCODE_PATTERN.search(url)
+    if match:
+        return match.group(1)
+    return url.split("?")[0].split("#")[0].rstrip("/")
+
+# define models
+class Post(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    shortcode = db.Column(db.String(64), unique = True, index = True)
+    post_id = db.Column(db.String(120), nullable = False) # URL the post was first requested with
+    last_scraped_at = db.Column(db.DateTime)
+    comment_count = db.Column(db.Integer, nullable = False, default = 0)
+    campaign = db.Column(db.String(100), index = True) # marketing campaign the post belongs to, set by the API
+
+class postComment(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    post_id = db.Column(db.String(120), nullable = False) # post URL, kept for databases created before the post table
+    post_pk = db.Column(db.Integer, db.ForeignKey("post.id"))
+    comment = db.Column(db.String(255))
+    comment_hash = db.Column(db.String(64))
+    # comment time from the scraper (or when it was ingested) as UTC "YYYY-MM-DDTHH:MM:SS";
+    # a string so bulk ingest does not parse and convert a datetime per row, and day/hour
+    # buckets are prefixes of it
+    created_at = db.Column(db.String(19))
+    # analysis result, filled in when the post's aggregates are refreshed (NULL for filtered UI text)
+    label = db.Column(db.String(100))
+    confidence = db.Column(db.Float)
+    detected_language = db.Column(db.String(20))
+    model_used = db.Column(db.String(100))
+
+    __table_args__ = (
+        # covers the foreign key and keyset pagination (WHERE post_pk = ? AND id > ? ORDER BY id)
+        db.Index("ix_post_comment_post_pk_id", "post_pk", "id"),
+        db.Index("uq_post_comment_post_pk_hash", "post_pk", "comment_hash", unique = True),
+    )
+
+# per-comment result cache, filled by sentinel_analysis_ai.result_cache
+class Sentiment(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    comment = db.Column(db.String(255))
+    label = db.Column(db.String(100))
+    confidence = db.Column(db.Float, nullable = False)
+    comment_hash = db.Column(db.String(64), unique = True, index = True)
+    detected_language = db.Column(db.String(20))
+    model_used = db.Column(db.String(100))
+    last_used = db.Column(db.Float, index = True)
+
+# per-post rollup of the analyzed comments, updated incrementally by aggregates.refresh_post_aggregate
+class postSentiment(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    post_id = db.Column(db.String(120), nullable = False)
+    label = db.Column(db.String(100)) # general sentiment
+    post_pk = db.Column(db.Integer, db.ForeignKey("post.id"))
+    analysis_version = db.Column(db.String(20))
+    analyzed_until = db.Column(db.Integer, nullable = False, default = 0) # last postComment.id rolled in
+    analyzed = db.Column(db.Integer, nullable = False, default = 0)
+    positive = db.Column(db.Integer, nullable = False, default = 0)
+    neutral = db.Column(db.Integer, nullable = False, default = 0)
+    negative = db.Column(db.Integer, nullable = False, default = 0)
+    spam = db.Column(db.Integer, nullable = False, default = 0)
+    confidence_sum = db.Column(db.Float, nullable = False, default = 0.0) # over non-spam comments
+    score_sum = db.Column(db.Float, nullable = False, default = 0.0) # +confidence if positive, -confidence if negative
+    languages = db.Column(db.JSON) # language -> comment count
+    updated_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("uq_post_sentiment_post_pk", "post_pk", unique = True),
+    )
+
+# per-post, per-time-bucket counts behind the sentiment trend
+class postSentimentTrend(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    post_pk = db.Column(db.Integer, db.ForeignKey("post.id"), nullable = False)
+    bucket = db.Column(db.String(13), nullable = False) # "YYYY-MM-DD" (or "YYYY-MM-DDTHH" for hourly buckets)
+    positive = db.Column(db.Integer, nullable = False, default = 0)
+    neutral = db.Column(db.Integer, nullable = False, default = 0)
+    negative = db.Column(db.Integer, nullable = False, default = 0)
+    spam = db.Column(db.Integer, nullable = False, default = 0)
+    confidence_sum = db.Column(db.Float, nullable = False, default = 0.0)
+    score_sum = db.Column(db.Float, nullable = False, default = 0.0)
+
+    __table_args__ = (
+        # one row per bucket, read in order for a post's trend
+        db.Index("uq_post_sentiment_trend_post_pk_bucket", "post_pk", "bucket", unique = True),
+        # covers /api/analytics by day: the counts are read from the index in bucket order
+        db.Index(
+            "ix_post_sentiment_trend_bucket_counts",
+            "bucket", "post_pk", "positive", "neutral", "negative", "spam", "confidence_sum", "score_sum"
+        ),
+    )
+
+# per-post counts by language and by hashtag, the other /api/analytics dimensions
+class postSentimentFacet(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    post_pk = db.Column(db.Integer, db.ForeignKey("post.id"), nullable = False)
+    dimension = db.Column(db.String(20), nullable = False) # "language" or "hashtag"
+    value = db.Column(db.String(100), nullable = False) # language code, or hashtag without "#" in lower case
+    positive = db.Column(db.Integer, nullable = False, default = 0)
+    neutral = db.Column(db.Integer, nullable = False, default = 0)
+    negative = db.Column(db.Integer, nullable = False, default = 0)
+    spam = db.Column(db.Integer, nullable = False, default = 0)
+    confidence_sum = db.Column(db.Float, nullable = False, default = 0.0)
+    score_sum = db.Column(db.Float, nullable = False, default = 0.0)
+
+    __table_args__ = (
+        db.Index("uq_post_sentiment_facet_post_pk_value", "post_pk", "dimension", "value", unique = True),
+        # covers /api/analytics by language or hashtag, so no table row is read
+        db.Index(
+            "ix_post_sentiment_facet_value_counts",
+            "dimension", "value", "post_pk", "positive", "neutral", "negative", "spam", "confidence_sum", "score_sum"
+        ),
+    )
+
+
+def insert_ignore(model):
+    """
+    INSERT ... ON CONFLICT DO NOTHING into a model's table, so concurrent
+    writers racing on a unique key both succeed; select the row afterwards
+    """
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(model.__table__).on_conflict_do_nothing()
+
+def find_post(url: str):
+    """Look up a post by any URL pointing at it"""
+    with DB_READ_SECONDS.time(query="find_post"):
+        return Post.query.filter_by(shortcode=canonical_shortcode(url)).first()
+
+def comment_page(post_pk: int, after_id: int = 0, limit: int = COMMENT_PAGE_SIZE) -> list:
+    """
+    One page of a post's comments, ordered by id
+
+    Keyset pagination: the next page starts after the last id of this one,
+    so every page is an index range scan no matter how deep it is.
+    """
+    with DB_READ_SECONDS.time(query="comment_page"):
+        return (
+            db.session.query(postComment.id, postComment.comment)
+            .filter(postComment.post_pk == post_pk, postComment.id > after_id)
+            .order_by(postComment.id)
+            .limit(limit)
+            .all()
+        )
+
+def iter_comments(post_pk: int, page_size: int = COMMENT_PAGE_SIZE):
+    """Yield every comment row of a post, reading one page at a time"""
+    after_id = 0
+    while True:
+        page = comment_page(post_pk, after_id, page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        after_id = page[-1].id
+
+def upgrade_schema(engine=None, tables=None):
+    """
+    Bring a database created by an older version up to date
+
+    db.create_all() only creates missing tables, so columns and indexes
+    added to existing models are created here.
+
+    Args:
+        engine (Engine): Database to upgrade, the app's by default
+        tables (list): Tables to create or upgrade, all of them by default
+    """
+    engine = engine or db.engine
+    tables = tables or db.metadata.sorted_tables
+    db.metadata.create_all(engine, tables=tables)
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        for table in tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def database_path(url: str = DATABASE_URL) -> str | None:
+    """
+    File of an SQLite DATABASE_URL, resolved like Flask-SQLAlchemy does
+    (relative paths are in backend/instance), or None for other databases
+    """
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    if os.path.isabs(url.database):
+        return url.database
+    return os.path.join(BACKEND_DIR, "instance", url.database)
@@ -0,0 +1,192 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from metrics import metrics
+from scraper.instabot import InstagramCommentScraper
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pool settings
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "0") == "1"
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "50"))  # recycle Chrome after this many scrapes
+BROWSER_CHECKOUT_TIMEOUT = float(os.getenv("BROWSER_CHECKOUT_TIMEOUT", "120"))
+BROWSER_SESSION_DIR = os.getenv("BROWSER_SESSION_DIR", os.path.join(BACKEND_DIR, "instance", "browser_sessions"))
+
+SCRAPE_SECONDS = metrics.histogram("sentinel_scrape_seconds", "Duration of scraping one post, including waiting for a browser")
+COMMENTS_SCRAPED = metrics.counter("sentinel_comments_scraped_total", "Comments returned by the scraper")
+
+
+class BrowserPool:
+    def __init__(self, username, password, size=BROWSER_POOL_SIZE, headless=BROWSER_HEADLESS,
+                 max_uses=BROWSER_MAX_USES, session_dir=BROWSER_SESSION_DIR):
+        """
+        Pool of logged-in scrapers that are reused between requests
+
+        Browsers are started on demand up to `size`. A new browser first tries
+        the cookies saved by an earlier session and only logs in when they
+        have expired, so restarts skip the login flow.
+
+        Args:
+            username (str): Instagram username
+            password (str): Instagram password
+            size (int): Maximum number of browsers
+            headless (bool): Run browsers in headless mode
+            max_uses (int): Scrapes before a browser is replaced
+            session_dir (str): Directory holding saved session cookies
+        """
+        self.username = username
+        self.password = password
+        self.size = max(1, size)
+        self.headless = headless
+        self.max_uses = max_uses
+        self.cookie_path = os.path.join(session_dir, f"{username}.json")
+
+        # LIFO so the most recently used (warmest) browser is handed out first
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.uses = {}
+        self.closed = False
+
+    def start_scraper(self):
+        """Start a browser and make sure it is logged in"""
+        scraper = InstagramCommentScraper(headless=self.headless)
+        try:
+            if not scraper.load_cookies(self.cookie_path):
+                scraper.login(self.username, self.password)
+                scraper.save_cookies(self.cookie_path)
+        except Exception:
+            scraper.close()
+            raise
+        return scraper
+
+    def acquire(self, timeout=BROWSER_CHECKOUT_TIMEOUT):
+        """
+        Check out a healthy, logged-in scraper
+
+        Args:
+            timeout (float): Seconds to wait for a browser when all are busy
+
+        Returns:
+            InstagramCommentScraper: Scraper to return with release()
+        """
+        if self.closed:
+            raise RuntimeError("Browser pool is closed")
+
+        while True:
+            try:
+                scraper = self.idle.get_nowait()
+            except queue.Empty:
+                scraper = None
+                with self.lock:
+                    can_create = self.created < self.size
+                    if can_create:
+                        self.created += 1
+                if can_create:
+                    try:
+                        scraper = self.start_scraper()
+                    except Exception:
+                        with self.lock:
+                            self.created -= 1
+                        raise
+                    self.uses[id(scraper)] = 0
+                    return scraper
+                try:
+                    scraper = self.idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No browser available after {timeout}s")
+
+            if scraper.is_alive():
+                return scraper
+            logger.warning("Discarding unresponsive browser")
+            self.discard(scraper)
+
+    def release(self, scraper, healthy=True):
+        """
+        Return a scraper to the pool
+
+        Args:
+            scraper (InstagramCommentScraper): Scraper from acquire()
+            healthy (bool): False if the scrape failed in a way that may have broken the browser
+        """
+        self.uses[id(scraper)] = self.uses.get(id(scraper), 0) + 1
+        if self.closed or not healthy or self.uses[id(scraper)] >= self.max_uses or not scraper.is_alive():
+            self.discard(scraper)
+        else:
+            self.idle.put(scraper)
+
+    def discard(self, scraper):
+        """Quit a browser and free its slot"""
+        self.uses.pop(id(scraper), None)
+        with self.lock:
+            self.created -= 1
+        try:
+            scraper.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser: {str(e)}")
+
+    @contextmanager
+    def session(self, timeout=BROWSER_CHECKOUT_TIMEOUT):
+        """Context manager around acquire() / release()"""
+        scraper = self.acquire(timeout)
+        healthy = True
+        try:
+            yield scraper
+        except Exception:
+            healthy = scraper.is_alive()
+            raise
+        finally:
+            self.release(scraper, healthy)
+
+    def close(self):
+        """Quit every idle browser; busy ones are quit when released"""
+        self.closed = True
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self):
+        """Browsers started and currently idle"""
+        return {"size": self.size, "started": self.created, "idle": self.idle.qsize()}
+
+
+# one pool per account, shared by every request in the process
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(username, password):
+    """Shared pool for an account, created on first use"""
+    with pools_lock:
+        if username not in pools:
+            pools[username] = BrowserPool(username, password)
+            atexit.register(pools[username].close)
+        return pools[username]
+
+
+def scrape_post(username, password, url, max_comments=50):
+    """
+    Scrape one post with a browser from the shared pool
+
+    Args:
+        username (str): Instagram username
+        password (str): Instagram password
+        url (str): URL of the Instagram post
+        max_comments (int): Maximum number of comments to scrape
+
+    Returns:
+        list: List of comment dictionaries
+    """
+    with SCRAPE_SECONDS.time():
+        with get_pool(username, password).session() as scraper:
+            comments = scraper.scrape_comments(url, max_comments=max_comments)
+    COMMENTS_SCRAPED.inc(len(comments))
+    return comments
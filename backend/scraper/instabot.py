@@ -1,5 +1,8 @@
+import os
 import time
 import json
+from collections import defaultdict
+from contextlib import contextmanager
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -7,17 +10,102 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import logging
+from metrics import metrics
+
+COMMENT_SELECTOR = "//span[contains(@class, 'x1lliihq')]"
+
+SCRAPE_STEP_SECONDS = metrics.histogram("sentinel_scrape_step_seconds", "Duration of a scraper step (navigate, load_more, extract, ...)", ["step"])
+
+# Collects every comment-like span with its author and timestamp in one WebDriver call
+EXTRACT_COMMENTS_SCRIPT = """
+const snapshot = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const includeHtml = arguments[1];
+const items = [];
+for (let i = 0; i < snapshot.snapshotLength; i++) {
+    const el = snapshot.snapshotItem(i);
+    const container = el.closest("li") || el.parentElement;
+    const link = container ? container.querySelector("a[href^='/']") : null;
+    const time = container ? container.querySelector("time[datetime]") : null;
+    const item = {
+        text: el.innerText,
+        author: link ? link.getAttribute("href").split("/").filter(Boolean)[0] || null : null,
+        timestamp: time ? time.getAttribute("datetime") : null
+    };
+    if (includeHtml) {
+        item.html = el.outerHTML;
+    }
+    items.push(item);
+}
+return items;
+"""
+
+COUNT_COMMENTS_SCRIPT = """
+return document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null).snapshotLength;
+"""
+
+# Filter out non-comment texts
+UI_ELEMENTS = {
+    "reply", "see translation", "translate", "view replies", 
+    "view all replies", "hide replies", "like", "liked",
+    "show more", "show less", "view more comments",
+    "load more comments", "heart", "follow", "following",
+    "ago", "min", "hour", "day", "week", "month", "year",
+    "h", "m", "d", "w", "y"  # Time abbreviations
+}
+
+def ui_skip_reason(comment_text):
+    """
+    Decide whether a span's text is Instagram UI rather than a comment
+    
+    Args:
+        comment_text (str): Stripped text of the span
+        
+    Returns:
+        str: Why the text was skipped, or None if it looks like a real comment
+    """
+    # Skip if text is empty or too short
+    if not comment_text or len(comment_text) <= 2:
+        return "too short or empty"
+    
+    # Convert to lowercase for checking
+    comment_lower = comment_text.lower()
+    
+    # Skip UI elements and common non-comment text patterns
+    if comment_lower in UI_ELEMENTS:
+        return "UI element"
+    
+    # Skip single words that are likely UI elements
+    word_count = len(comment_text.split())
+    if word_count == 1 and len(comment_text) < 10:
+        return "single word"
+    
+    # Skip if it's just a time indicator (like "2h", "3 days ago", etc.)
+    if word_count <= 3 and any(time_word in comment_lower for time_word in ["ago", "hour", "min", "day", "week", "month", "year"]):
+        return "time indicator"
+    
+    # Skip if it matches common button patterns
+    if word_count <= 4 and comment_lower.startswith(("view", "show", "hide", "load", "see")):
+        return "UI command"
+    
+    return None
 
 class InstagramCommentScraper:
-    def __init__(self, headless=True, wait_time=10):
+    def __init__(self, headless=True, wait_time=10, prompt_wait_time=3, load_more_timeout=5, network_idle_time=0.5):
         """
         Initialize the Instagram Comment Scraper
         
         Args:
             headless (bool): Run browser in headless mode
             wait_time (int): Maximum wait time for elements
+            prompt_wait_time (int): Maximum wait for optional prompts (cookie banner, "Not Now")
+            load_more_timeout (int): Maximum wait for new comments after clicking "Load more comments"
+            network_idle_time (float): Seconds without new network requests that count as idle
         """
         self.wait_time = wait_time
+        self.prompt_wait_time = prompt_wait_time
+        self.load_more_timeout = load_more_timeout
+        self.network_idle_time = network_idle_time
+        self.timings = defaultdict(list)
         self.setup_driver(headless)
         self.setup_logging()
     
@@ -50,6 +138,96 @@ class InstagramCommentScraper:
         self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         self.wait = WebDriverWait(self.driver, self.wait_time)
     
+    @contextmanager
+    def timed(self, step):
+        """Record how long a scraping step takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[step].append(elapsed)
+            SCRAPE_STEP_SECONDS.observe(elapsed, step=step)
+    
+    def timing_report(self):
+        """
+        Summarize recorded step timings
+        
+        Returns:
+            dict: step -> count, total, mean and max seconds
+        """
+        return {
+            step: {
+                "count": len(samples),
+                "total": round(sum(samples), 3),
+                "mean": round(sum(samples) / len(samples), 3),
+                "max": round(max(samples), 3)
+            }
+            for step, samples in self.timings.items()
+        }
+    
+    def wait_until(self, condition, timeout=None):
+        """WebDriverWait on a condition with a custom timeout"""
+        return WebDriverWait(self.driver, timeout or self.wait_time, poll_frequency=0.1).until(condition)
+    
+    def wait_for_page_load(self, timeout=None):
+        """Wait until the document has finished loading"""
+        self.wait_until(lambda d: d.execute_script("return document.readyState") == "complete", timeout)
+    
+    def wait_for_network_idle(self, timeout=None):
+        """
+        Wait until the page stops issuing network requests
+        
+        Idle means the number of resource timing entries has not changed for
+        network_idle_time seconds.
+        """
+        state = {"count": -1, "since": time.monotonic()}
+        
+        def idle(driver):
+            count = driver.execute_script("return performance.getEntriesByType('resource').length")
+            now = time.monotonic()
+            if count != state["count"]:
+                state["count"] = count
+                state["since"] = now
+                return False
+            return now - state["since"] >= self.network_idle_time
+        
+        try:
+            self.wait_until(idle, timeout)
+        except TimeoutException:
+            self.logger.debug("Network did not go idle, continuing")
+    
+    def dismiss_prompt(self, xpath, description):
+        """
+        Click an optional prompt button if it shows up, and wait for it to go away
+        
+        Args:
+            xpath (str): XPath of the button
+            description (str): Prompt name for logging
+        """
+        try:
+            button = self.wait_until(EC.element_to_be_clickable((By.XPATH, xpath)), self.prompt_wait_time)
+            button.click()
+            self.wait_until(EC.staleness_of(button), self.prompt_wait_time)
+        except TimeoutException:
+            self.logger.info(f"No {description} found")
+    
+    def count_comment_elements(self):
+        """Number of comment-like spans currently on the page, counted in the browser"""
+        return self.driver.execute_script(COUNT_COMMENTS_SCRIPT, COMMENT_SELECTOR)
+    
+    def extract_comment_elements(self, include_html=False):
+        """
+        Read every comment-like span in a single execute_script call
+        
+        Args:
+            include_html (bool): Also return each span's outerHTML
+            
+        Returns:
+            list: Dicts with text, author, timestamp (and html)
+        """
+        return self.driver.execute_script(EXTRACT_COMMENTS_SCRIPT, COMMENT_SELECTOR, include_html) or []
+    
     def login(self, username, password):
         """
         Login to Instagram
@@ -60,57 +238,37 @@ class InstagramCommentScraper:
         """
         try:
             self.logger.info("Navigating to Instagram login page...")
-            self.driver.get("https://www.instagram.com/accounts/login/")
-            time.sleep(3)
+            with self.timed("login.open_page"):
+                self.driver.get("https://www.instagram.com/accounts/login/")
+                self.wait_for_page_load()
             
             # Accept cookies if present
-            try:
-                accept_cookies = self.wait.until(
-                    EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Accept All')]"))
-                )
-                accept_cookies.click()
-                time.sleep(2)
-            except TimeoutException:
-                self.logger.info("No cookies banner found")
+            with self.timed("login.cookie_banner"):
+                self.dismiss_prompt("//button[contains(text(), 'Accept All')]", "cookies banner")
             
             # Find username and password fields
-            username_field = self.wait.until(
-                EC.presence_of_element_located((By.NAME, "username"))
-            )
-            password_field = self.driver.find_element(By.NAME, "password")
-            
-            # Enter credentials
-            username_field.send_keys(username)
-            time.sleep(1)
-            password_field.send_keys(password)
-            time.sleep(1)
-            
-            # Click login button
-            login_button = self.driver.find_element(By.XPATH, "//button[@type='submit']")
-            login_button.click()
-            
-            # Wait for login to complete
-            time.sleep(5)
-            
-            # Handle "Save Your Login Info" prompt
-            try:
-                not_now_button = self.wait.until(
-                    EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Not Now')]"))
+            with self.timed("login.form"):
+                username_field = self.wait_until(
+                    EC.element_to_be_clickable((By.NAME, "username"))
                 )
-                not_now_button.click()
-                time.sleep(2)
-            except TimeoutException:
-                self.logger.info("No 'Save Login Info' prompt found")
+                password_field = self.driver.find_element(By.NAME, "password")
+                
+                # Enter credentials
+                username_field.send_keys(username)
+                password_field.send_keys(password)
             
-            # Handle notification prompt
-            try:
-                not_now_button = self.wait.until(
-                    EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Not Now')]"))
+            # Click login button and wait until the session cookie is set or we leave the login page
+            with self.timed("login.submit"):
+                login_button = self.driver.find_element(By.XPATH, "//button[@type='submit']")
+                login_button.click()
+                self.wait_until(
+                    lambda d: d.get_cookie("sessionid") is not None or "/accounts/login" not in d.current_url
                 )
-                not_now_button.click()
-                time.sleep(2)
-            except TimeoutException:
-                self.logger.info("No notification prompt found")
+            
+            # Handle "Save Your Login Info" and notification prompts
+            with self.timed("login.prompts"):
+                self.dismiss_prompt("//button[contains(text(), 'Not Now')]", "'Save Login Info' prompt")
+                self.dismiss_prompt("//button[contains(text(), 'Not Now')]", "notification prompt")
             
             self.logger.info("Login successful!")
             
@@ -118,6 +276,62 @@ class InstagramCommentScraper:
             self.logger.error(f"Login failed: {str(e)}")
             raise
     
+    def save_cookies(self, path):
+        """
+        Save the current session cookies so a later browser can skip login
+
+        Args:
+            path (str): Cookie file, written with owner-only permissions
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.driver.get_cookies(), f)
+        self.logger.info(f"Session cookies saved to {path}")
+    
+    def load_cookies(self, path):
+        """
+        Restore session cookies saved by save_cookies
+        
+        Args:
+            path (str): Cookie file
+            
+        Returns:
+            bool: True if the restored session is logged in
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cookies = json.load(f)
+            # cookies can only be set for the domain currently open
+            self.driver.get("https://www.instagram.com/")
+            for cookie in cookies:
+                cookie.pop("sameSite", None)
+                self.driver.add_cookie(cookie)
+            self.driver.refresh()
+        except Exception as e:
+            self.logger.warning(f"Could not restore session cookies: {str(e)}")
+            return False
+        
+        logged_in = self.is_logged_in()
+        self.logger.info("Restored saved session" if logged_in else "Saved session has expired")
+        return logged_in
+    
+    def is_logged_in(self):
+        """Check for a session cookie and the absence of the login form"""
+        return (
+            self.driver.get_cookie("sessionid") is not None
+            and not self.driver.find_elements(By.NAME, "username")
+        )
+    
+    def is_alive(self):
+        """Check that the browser still responds"""
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+    
     def navigate_to_post(self, post_url):
         """
         Navigate to a specific Instagram post
@@ -127,8 +341,14 @@ class InstagramCommentScraper:
         """
         try:
             self.logger.info(f"Navigating to post: {post_url}")
-            self.driver.get(post_url)
-            time.sleep(3)
+            with self.timed("navigate"):
+                self.driver.get(post_url)
+                self.wait_for_page_load()
+                try:
+                    self.wait_until(EC.presence_of_element_located((By.XPATH, COMMENT_SELECTOR)))
+                except TimeoutException:
+                    self.logger.warning("No comments appeared on the post page")
+                self.wait_for_network_idle(self.load_more_timeout)
         except Exception as e:
             self.logger.error(f"Failed to navigate to post: {str(e)}")
             raise
@@ -140,7 +360,7 @@ class InstagramCommentScraper:
         Args:
             max_comments (int): Maximum number of comments to load
         """
-        comments_loaded = 0
+        comments_loaded = self.count_comment_elements()
         
         while comments_loaded < max_comments:
             try:
@@ -149,22 +369,23 @@ class InstagramCommentScraper:
                     By.XPATH, "//button[contains(text(), 'Load more comments')]"
                 )
                 
-                # Scroll to the button and click
-                self.driver.execute_script("arguments[0].scrollIntoView();", load_more_button)
-                time.sleep(1)
-                load_more_button.click()
-                time.sleep(2)
-                
-                # Count current comments using the same selector as scraping
-                current_comments = len(self.driver.find_elements(
-                    By.XPATH, "//span[contains(@class, 'x1lliihq')]"
-                ))
+                # Scroll to the button and click, then wait for the comment count to grow
+                with self.timed("load_more"):
+                    self.driver.execute_script("arguments[0].scrollIntoView();", load_more_button)
+                    load_more_button.click()
+                    previous = comments_loaded
+                    
+                    def more_comments(driver):
+                        count = self.count_comment_elements()
+                        return count if count > previous else False
+                    
+                    try:
+                        comments_loaded = self.wait_until(more_comments, self.load_more_timeout)
+                    except TimeoutException:
+                        self.logger.info("No new comments appeared after loading more")
+                        break
                 
-                if current_comments > comments_loaded:
-                    comments_loaded = current_comments
-                    self.logger.info(f"Loaded {comments_loaded} potential comment elements")
-                else:
-                    break
+                self.logger.info(f"Loaded {comments_loaded} potential comment elements")
                     
             except NoSuchElementException:
                 self.logger.info("No more 'Load more comments' button found")
@@ -173,16 +394,17 @@ class InstagramCommentScraper:
                 self.logger.warning(f"Error loading more comments: {str(e)}")
                 break
     
-    def scrape_comments(self, post_url, max_comments=100):
+    def scrape_comments(self, post_url, max_comments=100, include_html=False):
         """
         Scrape comments from an Instagram post with UI element filtering
         
         Args:
             post_url (str): URL of the Instagram post
             max_comments (int): Maximum number of comments to scrape
+            include_html (bool): Keep each comment's outerHTML as raw_html
             
         Returns:
-            list: List of comment dictionaries
+            list: List of comment dictionaries with comment, author and timestamp
         """
         try:
             self.navigate_to_post(post_url)
@@ -190,68 +412,30 @@ class InstagramCommentScraper:
             # Load more comments if needed
             self.load_more_comments(max_comments)
             
-            # Use the selector you specified
-            comment_selector = "//span[contains(@class, 'x1lliihq')]"
-            
-            comment_elements = []
+            # All texts come back from the browser at once, filtering happens here in Python
             try:
-                comment_elements = self.driver.find_elements(By.XPATH, comment_selector)
-                self.logger.info(f"Found {len(comment_elements)} potential comment elements")
+                with self.timed("extract"):
+                    elements = self.extract_comment_elements(include_html)
+                self.logger.info(f"Found {len(elements)} potential comment elements")
             except Exception as e:
                 self.logger.error(f"Failed to find comment elements: {str(e)}")
                 return []
             
-            if not comment_elements:
+            if not elements:
                 self.logger.warning("No comment elements found")
                 return []
             
-            # Filter out non-comment texts
-            ui_elements = {
-                "reply", "see translation", "translate", "view replies", 
-                "view all replies", "hide replies", "like", "liked",
-                "show more", "show less", "view more comments",
-                "load more comments", "heart", "follow", "following",
-                "ago", "min", "hour", "day", "week", "month", "year",
-                "h", "m", "d", "w", "y"  # Time abbreviations
-            }
-            
             comments = []
             
-            for i, comment_element in enumerate(comment_elements):
-                try:
-                    # Extract comment text directly from the span element
-                    comment_text = comment_element.text.strip()
-                    
-                    # Skip if text is empty or too short
-                    if not comment_text or len(comment_text) <= 2:
-                        self.logger.debug(f"Skipped element {i+1}: too short or empty")
-                        continue
+            with self.timed("filter"):
+                for i, element in enumerate(elements):
+                    comment_text = (element.get("text") or "").strip()
                     
-                    # Convert to lowercase for checking
-                    comment_lower = comment_text.lower()
-                    
-                    # Skip UI elements and common non-comment text patterns
-                    if comment_lower in ui_elements:
-                        self.logger.debug(f"Skipped UI element {i+1}: '{comment_text}'")
-                        continue
-                    
-                    # Skip single words that are likely UI elements
-                    if len(comment_text.split()) == 1 and len(comment_text) < 10:
-                        self.logger.debug(f"Skipped single word {i+1}: '{comment_text}'")
+                    reason = ui_skip_reason(comment_text)
+                    if reason:
+                        self.logger.debug(f"Skipped element {i+1} ({reason}): '{comment_text}'")
                         continue
                     
-                    # Skip if it's just a time indicator (like "2h", "3 days ago", etc.)
-                    if any(time_word in comment_lower for time_word in ["ago", "hour", "min", "day", "week", "month", "year"]):
-                        if len(comment_text.split()) <= 3:  # Short time phrases
-                            self.logger.debug(f"Skipped time indicator {i+1}: '{comment_text}'")
-                            continue
-                    
-                    # Skip if it matches common button patterns
-                    if comment_lower.startswith(("view", "show", "hide", "load", "see")):
-                        if len(comment_text.split()) <= 4:  # Short UI commands
-                            self.logger.debug(f"Skipped UI command {i+1}: '{comment_text}'")
-                            continue
-                    
                     # If we've reached max_comments, stop
                     if len(comments) >= max_comments:
                         break
@@ -259,34 +443,63 @@ class InstagramCommentScraper:
                     # This looks like a real comment - add it
                     comment_data = {
                         "comment": comment_text,
-                        "raw_html": comment_element.get_attribute("outerHTML")
+                        "author": element.get("author"),
+                        "timestamp": element.get("timestamp")
                     }
+                    if include_html:
+                        comment_data["raw_html"] = element.get("html")
                     
                     comments.append(comment_data)
                     self.logger.debug(f"Extracted comment {len(comments)}: {comment_text[:50]}...")
-                    
-                except Exception as e:
-                    self.logger.warning(f"Error extracting element {i+1}: {str(e)}")
-                    continue
             
             self.logger.info(f"Successfully scraped {len(comments)} actual comments (filtered out UI elements)")
+            self.logger.info(f"Step timings: {self.timing_report()}")
             return comments
             
         except Exception as e:
             self.logger.error(f"Error scraping comments: {str(e)}")
             raise
     
-    def save_comments_to_json(self, comments, filename="instagram_comments.json"):
+    def get_recent_post_urls(self, profile, limit=12):
         """
-        Save comments to a JSON file
+        Collect the URLs of an account's most recent posts
+        
+        Args:
+            profile (str): Instagram username whose posts to list
+            limit (int): Maximum number of post URLs
+            
+        Returns:
+            list: Post URLs, newest first
+        """
+        with self.timed("list_posts"):
+            self.driver.get(f"https://www.instagram.com/{profile.strip('@/')}/")
+            self.wait_for_page_load()
+            try:
+                self.wait_until(EC.presence_of_element_located((By.XPATH, "//a[contains(@href, '/p/') or contains(@href, '/reel/')]")))
+            except TimeoutException:
+                self.logger.warning(f"No posts found for {profile}")
+                return []
+            hrefs = self.driver.execute_script(
+                "return Array.from(document.querySelectorAll(\"a[href*='/p/'], a[href*='/reel/']\"), a => a.href);"
+            )
+        
+        urls = list(dict.fromkeys(href.split("?")[0] for href in hrefs))
+        return urls[:limit]
+    
+    def save_comments_to_json(self, comments, filename="instagram_comments.json", include_html=False):
+        """
+        Save comments to a compact JSON file
         
         Args:
             comments (list): List of comment dictionaries
             filename (str): Output filename
+            include_html (bool): Keep each comment's raw_html (large, only useful for debugging selectors)
         """
+        if not include_html:
+            comments = [{k: v for k, v in comment.items() if k != "raw_html"} for comment in comments]
         try:
             with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(comments, f, ensure_ascii=False, indent=2)
+                json.dump(comments, f, ensure_ascii=False, separators=(",", ":"))
             self.logger.info(f"Comments saved to {filename}")
         except Exception as e:
             self.logger.error(f"Error saving comments to file: {str(e)}")
@@ -326,8 +539,19 @@ class InstagramCommentScraper:
         self.driver.quit()
         self.logger.info("Browser closed")
 
-def main(username, password, url):
-    """Example usage of the Instagram Comment Scraper"""
+def main(username, password, url, save_json=True):
+    """
+    Example usage of the Instagram Comment Scraper
+
+    Args:
+        username (str): Instagram username
+        password (str): Instagram password
+        url (str): URL of the Instagram post
+        save_json (bool): Also write the comments to instagram_comments.json
+
+    Returns:
+        list: List of comment dictionaries
+    """
     scraper = InstagramCommentScraper(headless=False)  # Set to True for headless mode
     comments = []  # Initialize comments list
     
@@ -344,8 +568,9 @@ def main(username, password, url):
         comments = scraper.scrape_comments(POST_URL, max_comments=50)
         
         # Save to JSON file first (most important - this handles Unicode perfectly)
-        scraper.save_comments_to_json(comments)
-        print(f"\nSuccessfully saved {len(comments)} comments to instagram_comments.json!")
+        if save_json:
+            scraper.save_comments_to_json(comments)
+            print(f"\nSuccessfully saved {len(comments)} comments to instagram_comments.json!")
         
         # Create a summary report
         print(f"\n=== SCRAPING SUMMARY ===")
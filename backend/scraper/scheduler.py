@@ -0,0 +1,142 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_FAILURES = metrics.counter("sentinel_scrape_failures_total", "Posts the scheduler gave up on after every retry")
+
+# Scheduler settings
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "2"))
+SCRAPE_RATE_PER_MINUTE = float(os.getenv("SCRAPE_RATE_PER_MINUTE", "6"))  # posts per minute per account
+SCRAPE_MAX_RETRIES = int(os.getenv("SCRAPE_MAX_RETRIES", "3"))
+SCRAPE_BACKOFF_SECONDS = float(os.getenv("SCRAPE_BACKOFF_SECONDS", "10"))
+SCRAPE_MAX_COMMENTS = int(os.getenv("SCRAPE_MAX_COMMENTS", "50"))
+
+
+class RateLimiter:
+    def __init__(self, rate_per_minute, burst=1):
+        """
+        Token bucket limiting how often an account opens a post
+
+        Args:
+            rate_per_minute (float): Sustained requests per minute
+            burst (int): Requests allowed back to back before throttling
+        """
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request is allowed"""
+        if not self.interval:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+
+class ScrapeScheduler:
+    def __init__(self, pool, workers=SCRAPE_WORKERS, rate_per_minute=SCRAPE_RATE_PER_MINUTE,
+                 max_retries=SCRAPE_MAX_RETRIES, backoff=SCRAPE_BACKOFF_SECONDS,
+                 max_comments=SCRAPE_MAX_COMMENTS, on_result=None, on_error=None):
+        """
+        Scrape many posts in parallel with browsers from a BrowserPool
+
+        Args:
+            pool (BrowserPool): Logged-in browsers for one account
+            workers (int): Posts scraped at the same time
+            rate_per_minute (float): Posts opened per minute by this account
+            max_retries (int): Retries per post after the first attempt
+            backoff (float): Base delay before a retry, doubled on each attempt
+            max_comments (int): Maximum comments scraped per post
+            on_result (callable): Called as on_result(url, comments) when a post finishes
+            on_error (callable): Called as on_error(url, exception) when a post gives up
+        """
+        self.pool = pool
+        self.limiter = RateLimiter(rate_per_minute)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_comments = max_comments
+        self.on_result = on_result
+        self.on_error = on_error
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="scrape")
+
+    def scrape_one(self, url):
+        """Scrape a post, retrying with exponential backoff and jitter"""
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                with self.pool.session() as scraper:
+                    comments = scraper.scrape_comments(url, max_comments=self.max_comments)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"Giving up on {url} after {attempt + 1} attempts: {str(e)}")
+                    SCRAPE_FAILURES.inc()
+                    if self.on_error:
+                        self.on_error(url, e)
+                    raise
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.8, 1.2)
+                attempt += 1
+                logger.warning(f"Scrape of {url} failed ({str(e)}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+        if self.on_result:
+            self.on_result(url, comments)
+        return comments
+
+    def submit(self, urls):
+        """
+        Queue posts for scraping without waiting for them
+
+        Args:
+            urls (list): Post URLs
+
+        Returns:
+            dict: url -> Future resolving to the scraped comments
+        """
+        return {url: self.executor.submit(self.scrape_one, url) for url in dict.fromkeys(urls)}
+
+    def scrape_all(self, urls):
+        """
+        Scrape posts and wait for all of them
+
+        Returns:
+            dict: url -> comments, or the exception for posts that failed
+        """
+        results = {}
+        for url, future in self.submit(urls).items():
+            try:
+                results[url] = future.result()
+            except Exception as e:
+                results[url] = e
+        return results
+
+    def recent_posts(self, profile, limit=12):
+        """URLs of an account's most recent posts, listed with a pooled browser"""
+        self.limiter.acquire()
+        with self.pool.session() as scraper:
+            return scraper.get_recent_post_urls(profile, limit)
+
+    def submit_account(self, profile, limit=12):
+        """Queue the most recent posts of an account"""
+        return self.submit(self.recent_posts(profile, limit))
+
+    def shutdown(self, wait=True):
+        """Stop accepting posts and optionally wait for queued ones"""
+        self.executor.shutdown(wait=wait)
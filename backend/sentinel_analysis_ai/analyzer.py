@@ -0,0 +1,510 @@
+import os
+import time
+import logging
+from collections import Counter
+from importlib.metadata import PackageNotFoundError, version
+from typing import Callable, Iterable, Iterator, List, Optional
+from model_registry import acquire_model, get_model, registry
+from metrics import metrics, log_sampled
+from sentinel_analysis_ai.batch_inference import run_batched
+from sentinel_analysis_ai.language_id import identify_language, identify_languages
+from sentinel_analysis_ai.result_cache import cache_key, create_result_cache, RESULT_CACHE_DB, RESULT_CACHE_ENABLED
+from sentinel_analysis_ai.schemas import CommentResult
+from spam_filtering.patterns import multilingual_spam_features, MULTILINGUAL_FALLBACK_KEYWORDS
+from spam_filtering.cascade import SPAM_CASCADE, SPAM_CASCADE_MIN_SCORE, SPAM_CASCADE_SKIP_NO_TEXT, CascadeCounters, has_letters
+
+logger = logging.getLogger(__name__)
+
+# Comments analyzed together when streaming through iter_analyze
+ANALYSIS_CHUNK_SIZE = int(os.getenv("ANALYSIS_CHUNK_SIZE", "200"))
+
+# -------------------
+# Models and rules
+# -------------------
+# Bump when the spam heuristics or thresholds change so cached results are not reused
+ANALYSIS_VERSION = "1"
+
+# Models are loaded on first use (or by the warm-up thread) through the shared registry:
+#   multilingual_sentiment - primary multilingual sentiment model
+#   english_sentiment      - backup English model (very reliable)
+#   multilingual_spam      - multilingual spam/toxic detection model
+ANALYSIS_MODELS = ["multilingual_sentiment", "english_sentiment", "multilingual_spam"]
+
+# where each analyzed comment is decided, cheapest stage first
+analysis_cascade = CascadeCounters([
+    "cache", "heuristic_spam", "toxicity_model_spam",
+    "multilingual_sentiment", "english_sentiment", "error_fallback",
+])
+
+ANALYSIS_STAGE_SECONDS = metrics.histogram("sentinel_analysis_stage_seconds", "Duration of an analysis stage over one batch of comments", ["stage"])
+SPAM_HEURISTICS_SECONDS = metrics.histogram("sentinel_spam_heuristics_seconds", "Duration of the spam pattern heuristics over one batch of comments")
+COMMENTS_ANALYZED = metrics.counter("sentinel_comments_analyzed_total", "Comments analyzed, including result cache hits")
+COMMENT_RESULTS = metrics.counter("sentinel_comment_results_total", "Analyzed comments by result label and deciding model", ["label", "model_used"])
+RESULT_CACHE_LOOKUPS = metrics.counter("sentinel_result_cache_lookups_total", "Result cache lookups of distinct comments", ["result"])
+
+try:
+    TRANSFORMERS_VERSION = version("transformers")
+except PackageNotFoundError:
+    TRANSFORMERS_VERSION = "none"
+
+def model_fingerprint() -> str:
+    """
+    Identify the models and analysis settings that produce a result
+
+    Built from the registry's specs (model id, revision, backend) and the
+    spam cascade settings, so it never loads a model. A model that failed to
+    load counts as missing, since the other stages decide its comments.
+    """
+    parts = [
+        f"analysis={ANALYSIS_VERSION}", f"transformers={TRANSFORMERS_VERSION}",
+        f"cascade={int(SPAM_CASCADE)}/{SPAM_CASCADE_MIN_SCORE}/{int(SPAM_CASCADE_SKIP_NO_TEXT)}",
+    ]
+    for name in ANALYSIS_MODELS:
+        entry = registry.names[name]
+        if entry.state == "failed":
+            parts.append(f"{name}=none")
+        else:
+            parts.append(f"{name}={entry.model_id}@{entry.revision}/{entry.backend}")
+    return "|".join(parts)
+
+# Language detection
+def detect_language(text: str) -> str:
+    """Detect the language of the text"""
+    return identify_language(text)
+
+# Map different model outputs to consistent labels
+def normalize_sentiment_label(label: str, confidence: float) -> str:
+    """Normalize different model outputs to consistent labels"""
+    label = label.lower()
+    
+    # Handle star ratings from multilingual BERT
+    if "1 star" in label or "2 stars" in label:
+        return "negative"
+    elif "3 stars" in label:
+        return "neutral" 
+    elif "4 stars" in label or "5 stars" in label:
+        return "positive"
+    
+    # Handle Cardiff NLP labels (LABEL_0, LABEL_1, LABEL_2)
+    if label == "label_0":
+        return "negative"
+    elif label == "label_1":
+        return "neutral"
+    elif label == "label_2":
+        return "positive"
+    
+    # Handle standard labels
+    if "neg" in label:
+        return "negative"
+    elif "pos" in label:
+        return "positive"
+    elif "neutral" in label:
+        return "neutral"
+    else:
+        # If confidence is low, default to neutral
+        return "neutral" if confidence < 0.7 else "positive"
+
+# Spam score at which a comment is spam; the heuristics alone can reach it
+SPAM_SCORE_THRESHOLD = 2
+
+# Enhanced multilingual spam detection
+def multilingual_spam_score(comment: str, language: str = "unknown") -> float:
+    """Pattern, emoji and hashtag part of the multilingual spam score"""
+    features = multilingual_spam_features(comment, language)
+
+    # Calculate spam score
+    total_matches = features["universal"] + features["language"] * 1.5
+
+    # Enhanced emoji spam detection
+    total_emojis = features["non_ascii"]
+    emoji_spam_score = 0
+    if total_emojis >= 4 or (features["length"] > 0 and total_emojis / features["length"] > 0.15):
+        emoji_spam_score = 1
+
+    # Check for excessive hashtags
+    hashtag_score = 1 if features["hashtags"] >= 3 else 0
+
+    return total_matches + emoji_spam_score + hashtag_score
+
+
+def is_multilingual_spam(comment: str, language: str = "unknown", ml_result: dict | None = None, heuristic_score: float | None = None) -> tuple[bool, float]:
+    """
+    Enhanced spam detection for multiple languages
+
+    ml_result can carry a toxicity prediction that was already computed in a
+    batch, so the spam model is not run again for this comment, and
+    heuristic_score a multilingual_spam_score already computed for it.
+    """
+    try:
+        if heuristic_score is None:
+            heuristic_score = multilingual_spam_score(comment, language)
+
+        # Use ML model for additional validation if available
+        ml_confidence = 0.0
+        multilingual_spam_model = get_model("multilingual_spam") if ml_result is None else None
+        if ml_result is None and multilingual_spam_model:
+            try:
+                ml_result = multilingual_spam_model(comment)[0]
+            except:
+                ml_result = None
+        if ml_result:
+            is_toxic_ml = ml_result["label"] == "TOXIC" and ml_result["score"] > 0.7
+            ml_confidence = ml_result["score"] if is_toxic_ml else 0.0
+        else:
+            is_toxic_ml = False
+        
+        # Final determination
+        final_score = heuristic_score + (2 if is_toxic_ml else 0)
+        
+        if final_score >= SPAM_SCORE_THRESHOLD or is_toxic_ml:
+            confidence = min(0.95, 0.6 + (final_score * 0.1) + ml_confidence * 0.2)
+            return True, confidence
+        
+        return False, 0.1
+        
+    except Exception as e:
+        logger.error(f"Error in multilingual spam detection: {e}")
+        # Simple fallback
+        is_spam_simple = any(keyword in comment.lower() for keyword in MULTILINGUAL_FALLBACK_KEYWORDS)
+        return is_spam_simple, 0.6 if is_spam_simple else 0.1
+
+def direct_inference(model_name: str, texts: List[str], batch_size: Optional[int] = None) -> List[Optional[dict]]:
+    """Run a registry model over texts in the calling thread"""
+    with acquire_model(model_name) as model:
+        return run_batched(model, texts, batch_size, model_name)
+
+def error_fallback_result(comment: str) -> dict:
+    """Result used when a comment could not be analyzed"""
+    return {
+        "comment": comment,
+        "label": "neutral",
+        "confidence": 0.5,
+        "detected_language": "unknown",
+        "model_used": "error_fallback"
+    }
+
+# -------------------
+# Pipeline stages
+# -------------------
+class AnalysisBatch:
+    def __init__(self, comments: List[str], batch_size: Optional[int] = None, counters: Optional[CascadeCounters] = None, infer=direct_inference):
+        """
+        Comments moving through the analysis stages together
+
+        Stages read and fill in the shared per-comment state. A stage that
+        settles a comment calls decide(); after the stage it is dropped from
+        `pending`, so later (more expensive) stages never see it.
+
+        Args:
+            comments (list): Comment texts, in output order
+            batch_size (int): Comments per model forward pass
+            counters (CascadeCounters): Where decided comments are counted
+            infer (callable): infer(model_name, texts, batch_size) -> predictions
+        """
+        self.comments = comments
+        self.batch_size = batch_size
+        self.counters = counters
+        self.infer = infer
+        self.languages = ["unknown"] * len(comments)
+        self.results: List[Optional[dict]] = [None] * len(comments)
+        self.pending = list(range(len(comments)))
+        self.scores = {}           # index -> (confidence, label, model_used)
+
+    def decide(self, i: int, result: dict, stage: str):
+        """Settle comment i with its final result"""
+        self.results[i] = result
+        if self.counters:
+            self.counters.exit(stage)
+
+
+def language_stage(batch: AnalysisBatch):
+    """Step 1: Detect language"""
+    batch.languages = identify_languages(batch.comments)
+    if logger.isEnabledFor(logging.DEBUG):
+        for comment, detected_language in zip(batch.comments, batch.languages):
+            log_sampled(logger, "Detected language for '%s...': %s", comment[:30], detected_language)
+
+
+def spam_stage(batch: AnalysisBatch):
+    """
+    Step 2: Multilingual spam filter
+
+    Comments the heuristics already call spam, and comments without any
+    letters, skip the toxicity model; the rest run through it in batches.
+    A spam comment counts as decided by the model only when its heuristic
+    score alone would not have made it spam.
+    """
+    comments, languages = batch.comments, batch.languages
+    ambiguous = []
+    ml_results = {}
+    # None when the heuristics failed; is_multilingual_spam then falls back to keywords
+    heuristic_scores = {}
+    heuristics_started = time.perf_counter()
+    for i in batch.pending:
+        try:
+            heuristic_scores[i] = multilingual_spam_score(comments[i], languages[i])
+        except Exception:
+            heuristic_scores[i] = None
+        if SPAM_CASCADE:
+            if (heuristic_scores[i] or 0) >= SPAM_CASCADE_MIN_SCORE:
+                ml_results[i] = {}
+                continue
+            if SPAM_CASCADE_SKIP_NO_TEXT and not has_letters(comments[i]):
+                ml_results[i] = {}
+                if batch.counters:
+                    batch.counters.skip("toxicity_model_no_text")
+                continue
+        ambiguous.append(i)
+    SPAM_HEURISTICS_SECONDS.observe(time.perf_counter() - heuristics_started)
+
+    toxicity_preds = batch.infer("multilingual_spam", [comments[i] for i in ambiguous], batch.batch_size)
+    for i, pred in zip(ambiguous, toxicity_preds):
+        ml_results[i] = pred or {}
+
+    for i in batch.pending:
+        comment = comments[i]
+        try:
+            heuristic_score = heuristic_scores[i]
+            spam_detected, spam_confidence = is_multilingual_spam(comment, languages[i], ml_result=ml_results[i], heuristic_score=heuristic_score)
+            if spam_detected:
+                heuristics_decided = heuristic_score is None or heuristic_score >= SPAM_SCORE_THRESHOLD
+                batch.decide(i, {
+                    "comment": comment,
+                    "label": "spam",
+                    "confidence": spam_confidence,
+                    "detected_language": languages[i],
+                    "model_used": "multilingual_spam_detector"
+                }, "heuristic_spam" if heuristics_decided else "toxicity_model_spam")
+        except Exception as e:
+            logger.error(f"Error analyzing comment '{comment}': {e}")
+            batch.decide(i, error_fallback_result(comment), "error_fallback")
+
+
+def sentiment_stage(batch: AnalysisBatch):
+    """Step 3: Sentiment analysis, multilingual model first"""
+    candidates = batch.pending
+    for i in candidates:
+        batch.scores[i] = (0.5, "neutral", "fallback")
+    multilingual_preds = batch.infer("multilingual_sentiment", [batch.comments[i] for i in candidates], batch.batch_size)
+    for i, pred in zip(candidates, multilingual_preds):
+        if pred:
+            confidence = float(pred["score"])
+            batch.scores[i] = (confidence, normalize_sentiment_label(pred["label"], confidence), "multilingual-bert")
+
+
+def english_fallback_stage(batch: AnalysisBatch):
+    """If multilingual failed or confidence low, try English model for English text"""
+    english_candidates = [
+        i for i in batch.pending
+        if batch.scores.get(i, (0.0,))[0] < 0.7 and batch.languages[i] == "en"
+    ]
+    english_preds = batch.infer("english_sentiment", [batch.comments[i] for i in english_candidates], batch.batch_size)
+    for i, pred in zip(english_candidates, english_preds):
+        if pred:
+            eng_confidence = float(pred["score"])
+            if eng_confidence > batch.scores.get(i, (0.0,))[0]:
+                batch.scores[i] = (eng_confidence, normalize_sentiment_label(pred["label"], eng_confidence), "english-roberta")
+
+
+def threshold_stage(batch: AnalysisBatch):
+    """Apply confidence threshold and settle every remaining comment, credited to the model whose score was kept"""
+    for i in batch.pending:
+        confidence, label, model_used = batch.scores.get(i, (0.5, "neutral", "fallback"))
+        batch.decide(i, {
+            "comment": batch.comments[i],
+            "label": label if confidence >= 0.6 else "neutral",
+            "confidence": confidence,
+            "detected_language": batch.languages[i],
+            "model_used": model_used
+        }, "english_sentiment" if model_used == "english-roberta" else "multilingual_sentiment")
+
+
+DEFAULT_STAGES = [language_stage, spam_stage, sentiment_stage, english_fallback_stage, threshold_stage]
+
+
+# -------------------
+# Analyzer
+# -------------------
+class CommentAnalyzer:
+    def __init__(self, stages: Optional[List[Callable[[AnalysisBatch], None]]] = None, cache=None, counters: Optional[CascadeCounters] = None, fingerprint: Callable[[], str] = model_fingerprint, inference: Callable = direct_inference):
+        """
+        Detect language, filter spam and score sentiment for comments
+
+        The one analysis pipeline behind the FastAPI service and the Flask
+        backend. Each stage is a function that takes an AnalysisBatch; stages
+        run in order over the comments that earlier stages left undecided.
+
+        Args:
+            stages (list): Stage functions, defaults to DEFAULT_STAGES
+            cache (ResultCache): Per-comment result cache, or None
+            counters (CascadeCounters): Counts where comments are decided
+            fingerprint (callable): Returns the cache fingerprint of the current models
+            inference (callable): How stages run a model, defaults to direct_inference
+                                  in the calling thread
+        """
+        self.stages = list(stages or DEFAULT_STAGES)
+        self.cache = cache
+        self.counters = counters
+        self.fingerprint = fingerprint
+        self.inference = inference
+
+    def run_stages(self, comments: List[str], batch_size: Optional[int] = None) -> List[dict]:
+        """Run every stage over the comments, without the cache"""
+        batch = AnalysisBatch(comments, batch_size, self.counters, self.inference)
+        for stage in self.stages:
+            if not batch.pending:
+                break
+            with ANALYSIS_STAGE_SECONDS.time(stage=getattr(stage, "__name__", "custom").removesuffix("_stage")):
+                stage(batch)
+            batch.pending = [i for i in batch.pending if batch.results[i] is None]
+        # a custom pipeline may end without deciding everything
+        for i in batch.pending:
+            batch.decide(i, error_fallback_result(comments[i]), "error_fallback")
+        return batch.results
+
+    def analyze_dicts(self, comments: List[str], batch_size: Optional[int] = None) -> List[dict]:
+        """
+        Analyze a list of comments and return plain result dicts
+
+        Comments already in the result cache, and repeats within the list,
+        are only analyzed once. Returns one dict per comment, in input order,
+        with the same fields as CommentResult.
+        """
+        if self.counters:
+            self.counters.enter(len(comments))
+        if not self.cache:
+            return self.record(self.run_stages(comments, batch_size))
+
+        fingerprint = self.fingerprint()
+        keys = [cache_key(comment, fingerprint) for comment in comments]
+        cached = self.cache.get_many(keys)
+
+        # analyze each missing key once, even if the comment repeats
+        pending = {}
+        for i, key in enumerate(keys):
+            if key not in cached and key not in pending:
+                pending[key] = comments[i]
+        if self.counters:
+            self.counters.exit("cache", len(comments) - len(pending))
+        distinct = len(set(keys))
+        RESULT_CACHE_LOOKUPS.inc(distinct - len(pending), result="hit")
+        RESULT_CACHE_LOOKUPS.inc(len(pending), result="miss")
+        fresh = dict(zip(pending, self.run_stages(list(pending.values()), batch_size)))
+        self.cache.put_many({
+            key: result for key, result in fresh.items() if result["model_used"] != "error_fallback"
+        })
+
+        results = []
+        for comment, key in zip(comments, keys):
+            result = cached.get(key) or fresh[key]
+            results.append({"comment": comment, **{k: v for k, v in result.items() if k != "comment"}})
+        return self.record(results)
+
+    def record(self, results: List[dict]) -> List[dict]:
+        """Count analyzed comments by label and model for /metrics"""
+        COMMENTS_ANALYZED.inc(len(results))
+        for (label, model_used), count in Counter((r["label"], r["model_used"]) for r in results).items():
+            COMMENT_RESULTS.inc(count, label=label, model_used=model_used)
+        return results
+
+    def analyze(self, comments: List[str], batch_size: Optional[int] = None) -> List[CommentResult]:
+        """Analyze a list of comments"""
+        return [CommentResult(**result) for result in self.analyze_dicts(comments, batch_size)]
+
+    def iter_analyze(self, comments: Iterable[str], chunk_size: int = ANALYSIS_CHUNK_SIZE, batch_size: Optional[int] = None) -> Iterator[CommentResult]:
+        """
+        Analyze comments from any iterable, yielding results as each chunk finishes
+
+        Only one chunk of comments is held in memory, so this can stream over
+        a database cursor or a request body.
+        """
+        chunk = []
+        for comment in comments:
+            chunk.append(comment)
+            if len(chunk) >= chunk_size:
+                yield from self.analyze(chunk, batch_size)
+                chunk = []
+        if chunk:
+            yield from self.analyze(chunk, batch_size)
+
+
+# -------------------
+# Aggregates
+# -------------------
+def general_sentiment(positive: int, neutral: int, negative: int) -> str:
+    """Overall sentiment of a post from its label counts, empty when undecided"""
+    if (positive > negative) and (neutral > negative):
+        return "positive"
+    elif (negative > positive):
+        return "negative"
+    return ""
+
+
+class SentimentTally:
+    def __init__(self, total: Optional[int] = None):
+        """
+        Running label counts over a stream of results
+
+        Args:
+            total (int): Number of comments expected, if known
+        """
+        self.total = total
+        self.done = 0
+        self.counts = {"positive": 0, "neutral": 0, "negative": 0, "spam": 0}
+        # over non-spam results only, as in aggregates.rates, so streams and post summaries agree
+        self.confidence_sum = 0.0
+
+    def add(self, result: CommentResult):
+        self.done += 1
+        self.counts[result.label] = self.counts.get(result.label, 0) + 1
+        if result.label != "spam":
+            self.confidence_sum += result.confidence
+
+    @property
+    def general_sentiment(self) -> str:
+        return general_sentiment(self.counts["positive"], self.counts["neutral"], self.counts["negative"])
+
+    def to_dict(self) -> dict:
+        opinions = self.done - self.counts["spam"]
+        return {
+            "done": self.done,
+            "total": self.total,
+            "counts": dict(self.counts),
+            "average_confidence": round(self.confidence_sum / opinions, 4) if opinions else 0.0,
+            "general_sentiment": self.general_sentiment,
+            "final": self.total is not None and self.done >= self.total,
+        }
+
+
+# Shared analyzer used by both services, given its result cache at startup by open_result_cache
+analyzer = CommentAnalyzer(counters=analysis_cascade)
+
+
+def open_result_cache(db_path: str | None, *analyzers):
+    """
+    Open the per-comment result cache and share it between `analyzers`
+
+    Called by each service at startup, never at import: the `sentiment`
+    table is created or upgraded by models.upgrade_schema first.
+
+    Args:
+        db_path (str): The service's SQLite database (RESULT_CACHE_DB overrides it)
+
+    Returns:
+        ResultCache: The cache, or None when it is disabled or unavailable
+    """
+    db_path = RESULT_CACHE_DB or db_path
+    if RESULT_CACHE_ENABLED and db_path:
+        from sqlalchemy import create_engine
+        from models import Sentiment, upgrade_schema
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        engine = create_engine(f"sqlite:///{db_path}")
+        try:
+            upgrade_schema(engine, [Sentiment.__table__])
+        finally:
+            engine.dispose()
+    cache = create_result_cache(db_path)
+    for each in analyzers:
+        each.cache = cache
+    return cache
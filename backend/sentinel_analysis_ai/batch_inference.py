@@ -0,0 +1,69 @@
+import os
+import logging
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Number of comments sent through a pipeline in one forward pass
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "32"))
+
+MODEL_FORWARD_SECONDS = metrics.histogram("sentinel_model_forward_seconds", "Duration of one batched model forward pass", ["model"])
+MODEL_FORWARD_COMMENTS = metrics.counter("sentinel_model_forward_comments_total", "Comments run through each model", ["model"])
+
+
+def length_buckets(texts: list[str], batch_size: int) -> list[list[int]]:
+    """
+    Group text indices into batches of similar length
+
+    Sorting by length before batching means each batch is padded to the
+    length of its own longest comment instead of the longest comment overall.
+
+    Args:
+        texts (list): Texts to batch
+        batch_size (int): Maximum number of texts per batch
+
+    Returns:
+        list: Batches of indices into ``texts``
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def run_batched(model, texts: list[str], batch_size: int | None = None, model_name: str = "unknown") -> list[dict | None]:
+    """
+    Run a Hugging Face pipeline over many texts with length-bucketed batches
+
+    Args:
+        model: A text-classification / sentiment-analysis pipeline
+        texts (list): Texts to classify
+        batch_size (int): Batch size, defaults to INFERENCE_BATCH_SIZE
+        model_name (str): Registry name the forward passes are recorded under
+
+    Returns:
+        list: One top prediction dict per input text, in input order.
+              Entries are None where the model failed on that text.
+    """
+    predictions: list[dict | None] = [None] * len(texts)
+    if not model or not texts:
+        return predictions
+
+    batch_size = max(1, batch_size or INFERENCE_BATCH_SIZE)
+
+    for batch in length_buckets(texts, batch_size):
+        batch_texts = [texts[i] for i in batch]
+        try:
+            with MODEL_FORWARD_SECONDS.time(model=model_name):
+                outputs = model(batch_texts, batch_size=len(batch_texts), truncation=True)
+            MODEL_FORWARD_COMMENTS.inc(len(batch_texts), model=model_name)
+            for i, output in zip(batch, outputs):
+                predictions[i] = output[0] if isinstance(output, list) else output
+        except Exception as e:
+            # One bad input should not cost the whole batch, retry one by one
+            logger.warning(f"Batched inference failed, retrying batch per comment: {e}")
+            for i in batch:
+                try:
+                    predictions[i] = model(texts[i])[0]
+                except Exception as item_error:
+                    logger.warning(f"Inference failed for comment: {item_error}")
+
+    return predictions
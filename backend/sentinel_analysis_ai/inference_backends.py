@@ -0,0 +1,122 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "pt" runs the fp32 PyTorch model, "int8" applies dynamic int8 quantization to its
+# Linear layers, "onnx" runs an exported ONNX Runtime graph (needs optimum[onnxruntime])
+SUPPORTED_BACKENDS = ("pt", "int8", "onnx")
+DEFAULT_MODEL_BACKEND = os.getenv("MODEL_BACKEND", "pt")
+
+# Per-model override, e.g. MODEL_BACKENDS="multilingual_sentiment=int8,multilingual_spam=onnx"
+MODEL_BACKENDS = dict(
+    item.strip().split("=", 1) for item in os.getenv("MODEL_BACKENDS", "").split(",") if "=" in item
+)
+
+# Exported ONNX graphs are kept here so the export only happens once
+ONNX_EXPORT_DIR = os.getenv("ONNX_EXPORT_DIR", os.path.join(BACKEND_DIR, "instance", "onnx"))
+
+# Threads running model forward passes at once (see inference_executor), 0 runs them in the request threads
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+
+# PyTorch intra-op / inter-op threads, 0 splits the cores between the inference workers
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+
+torch_configured = False
+
+
+def backend_for(name: str) -> str:
+    """Inference backend configured for a model name"""
+    backend = MODEL_BACKENDS.get(name, DEFAULT_MODEL_BACKEND)
+    if backend not in SUPPORTED_BACKENDS:
+        logger.warning(f"⚠️ Unknown backend '{backend}' for {name}, using pt")
+        return "pt"
+    return backend
+
+
+def torch_thread_split(processes: int = 1) -> tuple[int, int]:
+    """
+    Intra-op and inter-op torch threads per forward pass, so the
+    INFERENCE_WORKERS passes of each of `processes` processes use every
+    core once; TORCH_NUM_THREADS / TORCH_INTEROP_THREADS override them
+    """
+    num_threads = max(1, (os.cpu_count() or 1) // (max(1, processes) * max(1, INFERENCE_WORKERS)))
+    return TORCH_NUM_THREADS or num_threads, TORCH_INTEROP_THREADS or 1
+
+
+def configure_torch_threads(processes: int = 1, force: bool = False):
+    """
+    Apply torch_thread_split once, before the first model is built
+
+    Args:
+        processes (int): Worker processes sharing the cores
+        force (bool): Re-apply, e.g. in a forked worker process that should
+                      use fewer threads than its parent
+    """
+    global torch_configured
+    if torch_configured and not force:
+        return
+    torch_configured = True
+    num_threads, interop_threads = torch_thread_split(processes)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(num_threads)
+    if interop_threads != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # only allowed before torch has started any parallel work
+            logger.warning(f"⚠️ Could not set torch inter-op threads: {e}")
+    logger.info(f"Torch threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}")
+
+
+def build_pipeline(task: str, model_id: str, backend: str = "pt", revision: str = "main"):
+    """
+    Build a text-classification pipeline on the requested backend
+
+    All backends return a regular transformers pipeline, so callers and
+    batching code do not change.
+
+    Args:
+        task (str): Pipeline task, e.g. "sentiment-analysis"
+        model_id (str): Hugging Face model id
+        backend (str): One of SUPPORTED_BACKENDS
+        revision (str): Hugging Face branch, tag or commit of the model
+    """
+    from transformers import pipeline
+    configure_torch_threads()
+
+    if backend == "pt":
+        return pipeline(task, model=model_id, revision=revision, framework="pt")
+
+    if backend == "int8":
+        import torch
+        classifier = pipeline(task, model=model_id, revision=revision, framework="pt")
+        classifier.model = torch.quantization.quantize_dynamic(classifier.model, {torch.nn.Linear}, dtype=torch.qint8)
+        return classifier
+
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+        except ImportError as e:
+            raise RuntimeError("the onnx backend needs `pip install optimum[onnxruntime]`") from e
+        from transformers import AutoTokenizer
+
+        export_dir = os.path.join(ONNX_EXPORT_DIR, model_id.replace("/", "--") + ("" if revision == "main" else f"@{revision}"))
+        if os.path.isdir(export_dir):
+            model = ORTModelForSequenceClassification.from_pretrained(export_dir)
+            tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        else:
+            logger.info(f"Exporting {model_id} to ONNX in {export_dir}")
+            model = ORTModelForSequenceClassification.from_pretrained(model_id, revision=revision, export=True)
+            tokenizer = AutoTokenizer.from_pretrained(model_id, revision=revision)
+            model.save_pretrained(export_dir)
+            tokenizer.save_pretrained(export_dir)
+        return pipeline(task, model=model, tokenizer=tokenizer)
+
+    raise ValueError(f"Unknown inference backend '{backend}', expected one of {SUPPORTED_BACKENDS}")
@@ -0,0 +1,191 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import List, Optional
+from model_registry import acquire_model
+from metrics import metrics
+from sentinel_analysis_ai.batch_inference import run_batched, INFERENCE_BATCH_SIZE
+from sentinel_analysis_ai.inference_backends import INFERENCE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Inference executor settings (INFERENCE_WORKERS, the number of threads, is shared with the torch thread split)
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "64"))  # model calls waiting before requests get 429
+INFERENCE_QUEUE_TIMEOUT_MS = int(os.getenv("INFERENCE_QUEUE_TIMEOUT_MS", "0"))  # wait for a free slot before giving up
+INFERENCE_BATCH_WINDOW_MS = int(os.getenv("INFERENCE_BATCH_WINDOW_MS", "5"))  # how long to wait for other requests' comments
+INFERENCE_MAX_COALESCED = int(os.getenv("INFERENCE_MAX_COALESCED", str(INFERENCE_BATCH_SIZE * 4)))  # comments per coalesced call
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue has no room for another model call"""
+
+
+class InferenceRequest:
+    def __init__(self, model_name, texts, batch_size):
+        self.model_name = model_name
+        self.texts = texts
+        self.batch_size = batch_size
+        self.future = Future()
+        self.queued_at = time.perf_counter()
+
+
+class InferenceExecutor:
+    def __init__(self, workers=INFERENCE_WORKERS, queue_size=INFERENCE_QUEUE_SIZE, batch_window_ms=INFERENCE_BATCH_WINDOW_MS,
+                 max_coalesced=INFERENCE_MAX_COALESCED, queue_timeout_ms=INFERENCE_QUEUE_TIMEOUT_MS):
+        """
+        Run model calls on a fixed set of threads, coalescing concurrent requests
+
+        Request threads submit (model, texts) and wait for the predictions.
+        Calls wait in one FIFO per model. A worker takes the oldest waiting
+        call, then keeps collecting calls for the same model for up to the
+        batch window, and runs all their texts through the model together;
+        calls for other models stay queued for the next free worker. At most
+        `workers` forward passes run at once, and when `queue_size` calls are
+        already waiting, across all models, new ones are refused with
+        InferenceQueueFull.
+
+        Args:
+            workers (int): Inference threads
+            queue_size (int): Model calls that may wait for a worker
+            batch_window_ms (int): How long a worker waits for more calls to coalesce
+            max_coalesced (int): Most comments combined into one call
+            queue_timeout_ms (int): How long submit waits for room in a full queue
+        """
+        self.workers = max(1, workers)
+        self.batch_window = batch_window_ms / 1000
+        self.max_coalesced = max(1, max_coalesced)
+        self.queue_timeout = queue_timeout_ms / 1000
+        self.queue_size = max(1, queue_size)
+        self.waiting = {}  # model name -> deque of InferenceRequest, oldest first
+        self.queued = 0
+        # guards the queues; workers wait on it for calls, submitters for room
+        self.changed = threading.Condition()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.submitted = 0
+        self.rejected = 0
+        self.forward_calls = 0
+        self.coalesced_calls = 0
+        self.wait_seconds = 0.0
+
+    def start(self):
+        """Start the worker threads (done lazily so forked processes start their own)"""
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self.work, name=f"inference-worker-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, model_name: str, texts: List[str], batch_size: Optional[int] = None) -> Future:
+        """Queue a model call, raising InferenceQueueFull if there is no room"""
+        self.start()
+        request = InferenceRequest(model_name, texts, batch_size)
+        with self.changed:
+            if not self.changed.wait_for(lambda: self.queued < self.queue_size, timeout=self.queue_timeout):
+                with self.lock:
+                    self.rejected += 1
+                raise InferenceQueueFull(f"{self.queue_size} model calls already waiting")
+            self.waiting.setdefault(model_name, deque()).append(request)
+            self.queued += 1
+            self.changed.notify_all()
+        with self.lock:
+            self.submitted += 1
+        return request.future
+
+    def infer(self, model_name: str, texts: List[str], batch_size: Optional[int] = None) -> List[Optional[dict]]:
+        """Run a model over texts on the executor and wait for the predictions"""
+        if not texts:
+            return []
+        return self.submit(model_name, texts, batch_size).result()
+
+    def qsize(self) -> int:
+        """Model calls waiting for a worker"""
+        return self.queued
+
+    def full(self) -> bool:
+        return self.queued >= self.queue_size
+
+    def take(self, model_name: str) -> InferenceRequest:
+        """Remove the oldest waiting call for a model (holding self.changed)"""
+        calls = self.waiting[model_name]
+        request = calls.popleft()
+        if not calls:
+            del self.waiting[model_name]
+        self.queued -= 1
+        self.changed.notify_all()
+        return request
+
+    def work(self):
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.queued > 0)
+                # the model whose oldest call has waited longest goes first
+                model_name = min(self.waiting, key=lambda name: self.waiting[name][0].queued_at)
+                first = self.take(model_name)
+                group = [first]
+                size = len(first.texts)
+                deadline = time.perf_counter() + self.batch_window
+
+                # only same-model calls are taken; the rest stay queued for other workers
+                while size < self.max_coalesced:
+                    calls = self.waiting.get(model_name)
+                    if calls:
+                        if size + len(calls[0].texts) > self.max_coalesced:
+                            break
+                        request = self.take(model_name)
+                        group.append(request)
+                        size += len(request.texts)
+                        continue
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self.changed.wait(timeout=remaining)
+
+            self.run_group(group)
+
+    def run_group(self, group: List[InferenceRequest]):
+        """One forward pass over every text of the grouped calls, then hand each its share"""
+        started = time.perf_counter()
+        texts = [text for request in group for text in request.texts]
+        try:
+            with acquire_model(group[0].model_name) as model:
+                predictions = run_batched(model, texts, group[0].batch_size, group[0].model_name)
+        except Exception as e:
+            logger.error(f"❌ Inference on {group[0].model_name} failed: {e}")
+            for request in group:
+                request.future.set_exception(e)
+            return
+
+        start = 0
+        for request in group:
+            request.future.set_result(predictions[start:start + len(request.texts)])
+            start += len(request.texts)
+        with self.lock:
+            self.forward_calls += 1
+            self.coalesced_calls += len(group)
+            self.wait_seconds += sum(started - request.queued_at for request in group)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "running": bool(self.threads),
+                "queued": self.queued,
+                "queue_size": self.queue_size,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "forward_calls": self.forward_calls,
+                "calls_per_forward": round(self.coalesced_calls / self.forward_calls, 2) if self.forward_calls else 0.0,
+                "average_wait_ms": round(self.wait_seconds * 1000 / self.coalesced_calls, 2) if self.coalesced_calls else 0.0,
+            }
+
+
+inference_executor = InferenceExecutor()
+
+metrics.gauge("sentinel_inference_queue_depth", "Model calls waiting for an inference worker", fn=lambda: inference_executor.qsize())
+metrics.counter("sentinel_inference_rejected_total", "Model calls refused because the inference queue was full", fn=lambda: inference_executor.rejected)
@@ -0,0 +1,105 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import List
+from langdetect import DetectorFactory, detector_factory
+from langdetect.lang_detect_exception import LangDetectException
+from metrics import metrics
+
+# Language ID settings
+LANGUAGE_ID_SEED = int(os.getenv("LANGUAGE_ID_SEED", "0"))  # langdetect is random unless seeded
+LANGUAGE_CACHE_SIZE = int(os.getenv("LANGUAGE_CACHE_SIZE", "50000"))  # memoized comments
+
+DetectorFactory.seed = LANGUAGE_ID_SEED
+
+# Scripts that identify a language on their own, with the codes used by the spam patterns.
+# Japanese mixes Kana with Han, so Han characters count as Japanese once Kana is present.
+SCRIPT_PATTERN = re.compile(
+    "(?P<ja>[\u3040-\u30ff\u31f0-\u31ff\uff66-\uff9f]+)"                      # Hiragana, Katakana
+    "|(?P<ko>[\u1100-\u11ff\u3130-\u318f\uac00-\ud7af]+)"                     # Hangul
+    "|(?P<ar>[\u0600-\u06ff\u0750-\u077f\ufb50-\ufdff\ufe70-\ufefc]+)"        # Arabic
+    "|(?P<hi>[\u0900-\u097f]+)"                                               # Devanagari
+    "|(?P<zh>[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+)"                     # Han
+    "|(?P<latin>[A-Za-z\u00c0-\u00d6\u00d8-\u00f6\u00f8-\u024f]+)"
+)
+
+# langdetect reports Chinese by region; the rest of the service uses "zh"
+LANGUAGE_ALIASES = {"zh-cn": "zh", "zh-tw": "zh"}
+
+init_lock = threading.Lock()
+
+
+def script_language(text: str) -> str | None:
+    """
+    Language implied by the writing system, if it is unambiguous
+
+    Returns the code when Kana, Hangul, Arabic, Devanagari or Han characters
+    outnumber Latin letters, "unknown" when the text has no letters of any of
+    these scripts and nothing else langdetect could use, and None when
+    langdetect has to decide.
+    """
+    counts = {}
+    for match in SCRIPT_PATTERN.finditer(text):
+        counts[match.lastgroup] = counts.get(match.lastgroup, 0) + len(match.group())
+    latin = counts.pop("latin", 0)
+    if "ja" in counts:
+        counts["ja"] += counts.pop("zh", 0)
+    if counts:
+        language, count = max(counts.items(), key=lambda item: item[1])
+        if count >= latin:
+            return language
+    if not latin and not any(char.isalpha() for char in text):
+        return "unknown"
+    return None
+
+
+def init_detector():
+    """Load the langdetect profiles once, before threads race to do it"""
+    if detector_factory._factory is None:
+        with init_lock:
+            detector_factory.init_factory()
+
+
+@lru_cache(maxsize=LANGUAGE_CACHE_SIZE)
+def identify_language(text: str) -> str:
+    """Detect the language of one comment (memoized)"""
+    language = script_language(text)
+    if language:
+        return language
+    init_detector()
+    try:
+        language = detector_factory.detect(text)
+    except LangDetectException:
+        return "unknown"
+    return LANGUAGE_ALIASES.get(language, language)
+
+
+def identify_languages(texts: List[str]) -> List[str]:
+    """Detect the language of every comment, running each distinct text once"""
+    languages = {}
+    for text in texts:
+        if text not in languages:
+            languages[text] = identify_language(text)
+    return [languages[text] for text in texts]
+
+
+def language_cache_stats() -> dict:
+    """Hit/miss counts of the memoized detector"""
+    info = identify_language.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_ratio": round(info.hits / lookups, 4) if lookups else 0.0,
+        "entries": info.currsize,
+        "max_entries": info.maxsize,
+    }
+
+
+def language_cache_lookups() -> dict:
+    info = identify_language.cache_info()
+    return {("hit",): info.hits, ("miss",): info.misses}
+
+
+metrics.counter("sentinel_language_cache_lookups_total", "Language ID memo lookups", ["result"], fn=language_cache_lookups)
@@ -0,0 +1,269 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from metrics import metrics, DB_READ_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Cache settings
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB")  # default: the app's own SQLite database (DATABASE_URL)
+RESULT_CACHE_MEMORY_SIZE = int(os.getenv("RESULT_CACHE_MEMORY_SIZE", "10000"))
+RESULT_CACHE_MAX_ROWS = int(os.getenv("RESULT_CACHE_MAX_ROWS", "200000"))
+# seconds a cache read or write waits for another writer's lock before it is skipped
+RESULT_CACHE_BUSY_TIMEOUT = float(os.getenv("RESULT_CACHE_BUSY_TIMEOUT", "0.5"))
+
+# last_used of hit rows is written in batches of this many, not on every read
+RESULT_CACHE_TOUCH_BATCH = 1000
+# pending last_used writes are dropped past this many, while writes keep failing
+RESULT_CACHE_MAX_TOUCHES = 10 * RESULT_CACHE_TOUCH_BATCH
+
+RESULT_CACHE_ERRORS = metrics.counter(
+    "sentinel_result_cache_errors_total",
+    "Result cache reads and writes skipped because SQLite was locked or failed",
+    ["operation"]
+)
+
+
+def normalize_comment(comment: str) -> str:
+    """Normalize comment text so trivially different copies share a cache entry"""
+    return " ".join(unicodedata.normalize("NFC", comment).split())
+
+
+def cache_key(comment: str, fingerprint: str) -> str:
+    """Hash of the normalized comment plus the models that produced the result"""
+    return hashlib.sha256(f"{fingerprint}\x00{normalize_comment(comment)}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, db_path, memory_size=RESULT_CACHE_MEMORY_SIZE, max_rows=RESULT_CACHE_MAX_ROWS):
+        """
+        Two level cache for per-comment classification results
+
+        The `sentiment` table is the Sentiment model's, created and upgraded
+        by models.upgrade_schema; the cache only reads and writes rows.
+
+        Args:
+            db_path (str): SQLite database holding the `sentiment` table
+            memory_size (int): Number of results kept in the in-process LRU
+            max_rows (int): Maximum number of cached rows kept in SQLite
+        """
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        # operation (read, write, touch) -> times it was skipped on an SQLite error
+        self.errors = {"read": 0, "write": 0, "touch": 0}
+        # key -> time of hits whose last_used is not written yet
+        self.touched = {}
+
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=RESULT_CACHE_BUSY_TIMEOUT, check_same_thread=False)
+        self.row_count = self.count_rows()
+        # an SQLite connection must not be shared with forked worker processes
+        os.register_at_fork(after_in_child=self.reconnect)
+
+    def reconnect(self):
+        """Open a fresh connection and lock (in a forked child)"""
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, timeout=RESULT_CACHE_BUSY_TIMEOUT, check_same_thread=False)
+
+    def skipped(self, operation: str, error: Exception):
+        """Count a read or write given up on an SQLite error (a lock held by another writer)"""
+        self.errors[operation] += 1
+        RESULT_CACHE_ERRORS.inc(operation=operation)
+        logger.warning(f"Result cache {operation} skipped: {error}")
+
+    def get_many(self, keys: list[str]) -> dict:
+        """
+        Look up cached results
+
+        When SQLite cannot be read (e.g. another writer holds the lock), the
+        keys not found so far count as misses instead of failing the caller.
+
+        Args:
+            keys (list): Keys built with cache_key
+
+        Returns:
+            dict: key -> result dict (without the comment text) for every hit
+        """
+        found = {}
+        missing = []
+        now = time.time()
+        with self.lock:
+            for key in dict.fromkeys(keys):
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[key] = self.memory[key]
+                    self.touched[key] = now
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+            if missing:
+                db_found = {}
+                try:
+                    # stay below SQLite's bound parameter limit
+                    for start in range(0, len(missing), 500):
+                        chunk = missing[start:start + 500]
+                        placeholders = ",".join("?" * len(chunk))
+                        with DB_READ_SECONDS.time(query="result_cache"):
+                            rows = self.conn.execute(
+                                "SELECT comment_hash, label, confidence, detected_language, model_used "
+                                f"FROM sentiment WHERE comment_hash IN ({placeholders})",
+                                chunk
+                            ).fetchall()
+                        for key, label, confidence, detected_language, model_used in rows:
+                            db_found[key] = {
+                                "label": label,
+                                "confidence": confidence,
+                                "detected_language": detected_language,
+                                "model_used": model_used
+                            }
+                except sqlite3.OperationalError as e:
+                    self.skipped("read", e)
+                for key, result in db_found.items():
+                    self.remember(key, result)
+                    self.touched[key] = now
+                found.update(db_found)
+                self.db_hits += len(db_found)
+                self.misses += len(missing) - len(db_found)
+
+            # reads stay reads: recency is only written once enough hits have piled up
+            if len(self.touched) >= RESULT_CACHE_TOUCH_BATCH:
+                try:
+                    with self.conn:
+                        self.flush_touches()
+                    self.touched = {}
+                except sqlite3.OperationalError as e:
+                    self.skipped("touch", e)
+                    self.drop_touches()
+
+        return found
+
+    def flush_touches(self):
+        """
+        Write last_used of the hits since the last flush
+
+        Called inside a transaction, holding the lock; the caller clears
+        `touched` once the transaction has committed.
+        """
+        if self.touched:
+            self.conn.executemany(
+                "UPDATE sentiment SET last_used = ? WHERE comment_hash = ?",
+                [(used, key) for key, used in self.touched.items()]
+            )
+
+    def drop_touches(self):
+        """Give up the pending last_used writes once too many pile up behind failing writes"""
+        if len(self.touched) > RESULT_CACHE_MAX_TOUCHES:
+            logger.warning(f"Result cache dropped {len(self.touched)} pending last_used writes")
+            self.touched = {}
+
+    def put_many(self, entries: dict):
+        """
+        Store results
+
+        When SQLite cannot be written (e.g. another writer holds the lock),
+        the results are only kept in memory and the write is skipped.
+
+        Args:
+            entries (dict): key -> result dict with comment, label, confidence,
+                            detected_language and model_used
+        """
+        if not entries:
+            return
+        now = time.time()
+        with self.lock:
+            try:
+                with self.conn:
+                    # pending recency goes out with this write, and is current before any eviction
+                    self.flush_touches()
+                    before = self.conn.total_changes
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO sentiment "
+                        "(comment_hash, comment, label, confidence, detected_language, model_used, last_used) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [
+                            (key, r["comment"], r["label"], r["confidence"], r["detected_language"], r["model_used"], now)
+                            for key, r in entries.items()
+                        ]
+                    )
+                    # replaced rows are counted too, so recount before evicting
+                    row_count = self.row_count + self.conn.total_changes - before
+                    if row_count > self.max_rows:
+                        row_count = self.count_rows()
+                    if row_count > self.max_rows:
+                        row_count = self.evict_rows(row_count - self.max_rows)
+                self.row_count = row_count
+                self.touched = {}
+            except sqlite3.OperationalError as e:
+                self.skipped("write", e)
+                self.drop_touches()
+            for key, r in entries.items():
+                self.remember(key, {k: r[k] for k in ("label", "confidence", "detected_language", "model_used")})
+
+    def remember(self, key: str, result: dict):
+        """Add a result to the in-process LRU, dropping the least recently used entries"""
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def evict_rows(self, count: int) -> int:
+        """Delete the least recently used cached rows from SQLite, returning how many are left"""
+        self.conn.execute(
+            "DELETE FROM sentiment WHERE id IN ("
+            "SELECT id FROM sentiment WHERE comment_hash IS NOT NULL ORDER BY last_used LIMIT ?)",
+            (count,)
+        )
+        logger.info(f"Evicted {count} cached results from SQLite")
+        return self.count_rows()
+
+    def count_rows(self) -> int:
+        """Number of cached rows in SQLite"""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM sentiment WHERE comment_hash IS NOT NULL"
+        ).fetchone()[0]
+
+    def stats(self) -> dict:
+        """Hit/miss counts and hit ratio, for sizing the cache"""
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_size": self.memory_size,
+            "db_rows": self.row_count,
+            "max_rows": self.max_rows,
+            "skipped_on_error": dict(self.errors),
+        }
+
+
+def create_result_cache(db_path: str | None):
+    """
+    Build the shared cache at service startup, or None when disabled or unavailable
+
+    Args:
+        db_path (str): SQLite database with an up-to-date `sentiment` table
+    """
+    if not RESULT_CACHE_ENABLED:
+        return None
+    if not db_path:
+        logger.warning("⚠️ Result cache disabled: it needs an SQLite database")
+        return None
+    try:
+        return ResultCache(db_path)
+    except Exception as e:
+        logger.warning(f"⚠️ Result cache disabled: {e}")
+        return None
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+# Input schema
+class CommentRequest(BaseModel):
+    post_id: str
+    comments: List[str]
+
+# Enhanced output schema
+class CommentResult(BaseModel):
+    comment: str
+    label: str
+    confidence: float
+    detected_language: Optional[str] = None
+    model_used: Optional[str] = None
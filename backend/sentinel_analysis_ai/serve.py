@@ -0,0 +1,156 @@
+"""
+Pre-fork server for the FastAPI sentiment service
+
+The parent process loads every analysis model once, freezes the garbage
+collector and binds the listening socket, then forks SERVE_WORKERS uvicorn
+workers that accept on that shared socket. Model weights are inherited
+copy-on-write: inference only reads them, so the pages stay shared and RAM
+does not grow with the worker count. The parent stays behind as a supervisor
+and replaces workers that die.
+
+Run from the backend directory:
+    python -m sentinel_analysis_ai.serve
+"""
+import os
+import gc
+import time
+import socket
+import signal
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Serving settings
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8001"))
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", str(os.cpu_count() or 1)))
+SERVE_MIN_UPTIME = float(os.getenv("SERVE_MIN_UPTIME", "5"))  # workers dying sooner than this are restarted with backoff
+SERVE_MAX_RESTART_DELAY = float(os.getenv("SERVE_MAX_RESTART_DELAY", "30"))
+
+
+def bind_socket(host, port, backlog=2048):
+    """Listening socket created before forking, so every worker accepts on it"""
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload_models():
+    """Load everything a worker needs before forking, then keep the GC away from it"""
+    from model_registry import registry
+    from sentinel_analysis_ai.analyzer import ANALYSIS_MODELS
+    from sentinel_analysis_ai.language_id import init_detector
+
+    registry.warm_up(ANALYSIS_MODELS, background=False)
+    init_detector()
+    # collecting in the children would write to the header of every object it visits and
+    # un-share those pages, so move everything loaded so far out of the GC's reach
+    gc.collect()
+    gc.freeze()
+    report = registry.memory_report()
+    logger.info(f"✅ Models preloaded in the parent ({report['models_mb']} MB of weights, RSS {report['process_rss_mb']} MB)")
+
+
+def serve_uvicorn(sock, index, workers):
+    """Worker body: run the FastAPI app with uvicorn on the inherited socket"""
+    import uvicorn
+    from sentinel_analysis_ai.fastapi_ai_service import app
+    from sentinel_analysis_ai.inference_backends import configure_torch_threads
+
+    # every process gets its share of the cores for torch's intra-op pool
+    configure_torch_threads(processes=workers, force=True)
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, workers=SERVE_WORKERS, host=SERVE_HOST, port=SERVE_PORT, serve_worker=serve_uvicorn, preload=preload_models):
+        """
+        Fork workers that share one socket and restart them when they die
+
+        Args:
+            workers (int): Worker processes
+            host (str): Address to bind
+            port (int): Port to bind
+            serve_worker (callable): Runs in each child as serve_worker(sock, index, workers)
+            preload (callable): Runs once in the parent before the first fork
+        """
+        self.workers = max(1, workers)
+        self.host = host
+        self.port = port
+        self.serve_worker = serve_worker
+        self.preload = preload
+        self.children = {}  # pid -> (index, started_at)
+        self.restart_delay = {}  # index -> seconds to wait before the next restart
+        self.stopping = False
+        self.sock = None
+
+    def spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            # child: default signal handling (uvicorn installs its own), serve, never return
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                self.serve_worker(self.sock, index, self.workers)
+            except BaseException:
+                logger.exception(f"Worker {index} crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = (index, time.monotonic())
+        logger.info(f"Started worker {index} (pid {pid})")
+
+    def stop(self, signum, frame):
+        """Forward the shutdown signal to the workers and stop restarting them"""
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        self.preload()
+        self.sock = bind_socket(self.host, self.port)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info(f"Serving on {self.host}:{self.port} with {self.workers} workers")
+        for index in range(self.workers):
+            self.spawn(index)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            if pid not in self.children:
+                continue
+            index, started_at = self.children.pop(pid)
+            if self.stopping:
+                continue
+
+            uptime = time.monotonic() - started_at
+            logger.warning(f"⚠️ Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)} after {uptime:.1f}s, restarting")
+            # a worker that keeps dying right away backs off instead of fork-looping
+            if uptime < SERVE_MIN_UPTIME:
+                delay = min(SERVE_MAX_RESTART_DELAY, max(1.0, self.restart_delay.get(index, 0.5) * 2))
+                self.restart_delay[index] = delay
+                time.sleep(delay)
+            else:
+                self.restart_delay.pop(index, None)
+            if not self.stopping:
+                self.spawn(index)
+
+        self.sock.close()
+        logger.info("All workers stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    Supervisor().run()
@@ -0,0 +1,62 @@
+import os
+import threading
+from collections import Counter
+
+# Cascade settings
+SPAM_CASCADE = os.getenv("SPAM_CASCADE", "1") == "1"  # 0 runs the toxicity model on every comment
+# heuristic score that is spam without the model; scores below 2 are never spam on heuristics alone
+SPAM_CASCADE_MIN_SCORE = float(os.getenv("SPAM_CASCADE_MIN_SCORE", "2"))
+SPAM_CASCADE_SKIP_NO_TEXT = os.getenv("SPAM_CASCADE_SKIP_NO_TEXT", "1") == "1"  # emoji/punctuation-only comments skip the model
+
+
+def has_letters(comment: str) -> bool:
+    """True if the comment has any letter for a text model to read"""
+    return any(char.isalpha() for char in comment)
+
+
+class CascadeCounters:
+    def __init__(self, stages):
+        """
+        Count how many comments leave a classification cascade at each stage
+
+        Args:
+            stages (list): Stage names in the order comments pass through them
+        """
+        self.stages = list(stages)
+        self.counts = Counter()
+        self.skipped = Counter()
+        self.entered = 0
+        self.lock = threading.Lock()
+
+    def enter(self, count=1):
+        """Record comments entering the cascade"""
+        with self.lock:
+            self.entered += count
+
+    def exit(self, stage, count=1):
+        """Record comments decided at a stage"""
+        with self.lock:
+            self.counts[stage] += count
+
+    def skip(self, stage, count=1):
+        """Record comments that bypass a model stage without being decided by it"""
+        with self.lock:
+            self.skipped[stage] += count
+
+    def stats(self) -> dict:
+        """Comments decided at each stage and their share of everything that entered"""
+        with self.lock:
+            entered = self.entered
+            counts = dict(self.counts)
+            skipped = dict(self.skipped)
+        return {
+            "comments": entered,
+            "stages": {
+                stage: {
+                    "count": counts.get(stage, 0),
+                    "share": round(counts.get(stage, 0) / entered, 4) if entered else 0.0,
+                }
+                for stage in self.stages
+            },
+            "skipped": skipped,
+        }
@@ -0,0 +1,169 @@
+import re
+import string
+
+# -------------------
+# Pattern lists
+# -------------------
+# English spam phrases used by spam_filter.is_spam
+HIGH_CONFIDENCE_PATTERNS = [
+    "giveaway", "win free", "free prizes", "dm for details", "dm me for",
+    "follow for follow", "f4f", "follow back", "follow me back",
+    "follow train", "followtrain", "follow4follow",
+    "like for like", "l4l", "like4like", "comment for comment",
+    "c4c", "comment4comment", "tag friends", "tag 3 friends",
+    "tag someone", "double tap if", "drop a comment if",
+    "check out my profile", "check out my page", "visit my profile",
+    "boost your followers", "gain followers", "followers fast",
+    "collaboration opportunities", "collab", "dm for collab",
+    "shop now", "great deals", "amazing deals", "#dmfordeals"
+]
+
+MEDIUM_CONFIDENCE_PATTERNS = [
+    "follow me", "support each other", "let's support",
+    "keep it up", "amazing content", "#followme",
+    "like this if", "tag a friend", "don't miss out"
+]
+
+PROMO_WORDS = ['win', 'free', 'prize', 'contest', 'deals', 'sale', 'discount']
+
+FALLBACK_SPAM_KEYWORDS = [
+    "follow me", "giveaway", "dm for", "follow for follow", "f4f",
+    "like for like", "l4l", "tag friends", "check my profile"
+]
+
+# Universal spam patterns (work across languages with Latin script)
+UNIVERSAL_SPAM_PATTERNS = [
+    "http", "www.", ".com", ".net", ".org", "bit.ly", "tinyurl",
+    "follow", "subscribe", "sub", "dm", "pm", "inbox",
+    "win", "free", "prize", "giveaway", "contest", "lottery"
+]
+
+# Language-specific spam patterns
+LANGUAGE_SPAM_PATTERNS = {
+    "es": ["sígueme", "sorteo", "gratis", "premio", "concurso", "dm", "mp", "seguir"],  # Spanish
+    "fr": ["suivez", "concours", "gratuit", "prix", "gagnant", "mp", "suivre"],       # French
+    "pt": ["siga", "sorteio", "grátis", "prêmio", "concurso", "dm", "seguir"],        # Portuguese
+    "it": ["segui", "concorso", "gratis", "premio", "vincere", "dm", "seguire"],       # Italian
+    "de": ["folgen", "gewinnspiel", "kostenlos", "preis", "gewinnen", "folgt"],       # German
+    "ar": ["متابعة", "مسابقة", "مجاني", "جائزة", "ربح", "تابع"],                      # Arabic
+    "ja": ["フォロー", "プレゼント", "無料", "賞品", "当選", "フォロバ"],                         # Japanese
+    "ko": ["팔로우", "이벤트", "무료", "상품", "당첨", "팔로백"],                          # Korean
+    "zh": ["关注", "抽奖", "免费", "奖品", "获奖", "回关"],                            # Chinese
+    "hi": ["फॉलो", "गिवअवे", "मुफ्त", "पुरस्कार", "जीत", "फॉलो बैक"],                   # Hindi
+    "ru": ["подписка", "розыгрыш", "бесплатно", "приз", "выиграть", "подписаться"],        # Russian
+    "tr": ["takip", "çekiliş", "ücretsiz", "ödül", "kazan", "takip et"],               # Turkish
+    "nl": ["volgen", "wedstrijd", "gratis", "prijs", "winnen", "volg terug"],            # Dutch
+    "sv": ["följa", "tävling", "gratis", "pris", "vinna", "följa tillbaka"],                 # Swedish
+    "da": ["følg", "konkurrence", "gratis", "præmie", "vind", "følg tilbage"],             # Danish
+    "no": ["følg", "konkurranse", "gratis", "premie", "vinn", "følg tilbake"],             # Norwegian
+}
+
+MULTILINGUAL_FALLBACK_KEYWORDS = ["http", "follow me", "giveaway", "free", "win", "dm me"]
+
+
+# -------------------
+# Compiled matcher
+# -------------------
+class PatternMatcher:
+    def __init__(self, groups: dict):
+        """
+        Count the patterns of several lists that occur in a text
+
+        All patterns are compiled into one alternation at import time,
+        longest first, and the text is scanned once: each match is the
+        longest pattern starting at that position, and the scan resumes one
+        character later so overlapping patterns are found too. Shorter
+        patterns inside a match come from a table built here, which keeps the
+        counts identical to `pattern in text`. The matched text identifies the
+        pattern; capture groups would disable the regex engine's literal
+        prefix scan and make every search many times slower.
+
+        Args:
+            groups (dict): group name -> list of lowercase patterns
+        """
+        self.groups = {name: frozenset(patterns) for name, patterns in groups.items()}
+        self.empty = dict.fromkeys(self.groups, 0)
+        patterns = sorted(set().union(*self.groups.values()), key=len, reverse=True)
+        # matched pattern -> every pattern present when it matches (itself and those inside it)
+        self.contained = {
+            pattern: frozenset(other for other in patterns if other in pattern)
+            for pattern in patterns
+        }
+        self.regex = re.compile("|".join(re.escape(p) for p in patterns)) if patterns else None
+
+    def counts(self, text_lower: str) -> dict:
+        """Number of patterns of each group found in the (already lowercased) text"""
+        if self.regex is None:
+            return dict(self.empty)
+        match = self.regex.search(text_lower)
+        if not match:
+            return dict(self.empty)
+        found = set()
+        while match:
+            found |= self.contained[match.group()]
+            match = self.regex.search(text_lower, match.start() + 1)
+        return {name: len(found & patterns) for name, patterns in self.groups.items()}
+
+
+ENGLISH_MATCHER = PatternMatcher({
+    "high": HIGH_CONFIDENCE_PATTERNS,
+    "medium": MEDIUM_CONFIDENCE_PATTERNS,
+    "promo": PROMO_WORDS,
+})
+
+FALLBACK_MATCHER = PatternMatcher({"keywords": FALLBACK_SPAM_KEYWORDS})
+
+# one matcher per language, plus one for languages without their own patterns
+MULTILINGUAL_MATCHERS = {
+    language: PatternMatcher({"universal": UNIVERSAL_SPAM_PATTERNS, "language": patterns})
+    for language, patterns in LANGUAGE_SPAM_PATTERNS.items()
+}
+UNIVERSAL_MATCHER = PatternMatcher({"universal": UNIVERSAL_SPAM_PATTERNS, "language": []})
+
+
+def multilingual_matcher(language: str) -> PatternMatcher:
+    return MULTILINGUAL_MATCHERS.get(language, UNIVERSAL_MATCHER)
+
+
+# -------------------
+# Text features
+# -------------------
+ASCII_UPPERCASE = string.ascii_uppercase.encode()
+
+
+def uppercase_count(comment: str) -> int:
+    """Number of characters for which str.isupper() is true"""
+    if comment.isascii():
+        data = comment.encode("ascii")
+        return len(data) - len(data.translate(None, ASCII_UPPERCASE))
+    return sum(map(str.isupper, comment))
+
+
+def text_features(comment: str) -> dict:
+    """
+    Character-level spam features of a comment
+
+    Returns:
+        dict: non_ascii (characters above U+007F, which is how emojis are
+        counted), hashtags, uppercase and length
+    """
+    return {
+        "non_ascii": len(comment) - len(comment.encode("ascii", "ignore")),
+        "hashtags": comment.count("#"),
+        "uppercase": uppercase_count(comment),
+        "length": len(comment),
+    }
+
+
+def english_spam_features(comment: str) -> dict:
+    """Pattern counts and text features used by spam_filter.is_spam"""
+    features = ENGLISH_MATCHER.counts(comment.lower())
+    features.update(text_features(comment))
+    return features
+
+
+def multilingual_spam_features(comment: str, language: str = "unknown") -> dict:
+    """Pattern counts and text features used by is_multilingual_spam"""
+    features = multilingual_matcher(language).counts(comment.lower())
+    features.update(text_features(comment))
+    return features
@@ -1,5 +1,15 @@
 import React, { useState, useEffect } from "react";
 
+const API_URL = "http://127.0.0.1:5000";
+const POLL_INTERVAL_MS = 1000;
+
+interface JobStatus {
+  status: "queued" | "running" | "done" | "failed";
+  progress: { stage: string | null; done: number; total: number };
+  result: { general_sentiment: string } | null;
+  error: string | null;
+}
+
 const App: React.FC = () => {
   const [instagramLink, setInstagramLink] = useState<string>("");
   const [result, setResult] = useState<string | null>(null); // store model result
@@ -9,6 +19,32 @@ const App: React.FC = () => {
     setInstagramLink(e.target.value);
   };
 
+  const pollJob = async (statusUrl: string): Promise<JobStatus> => {
+    while (true) {
+      const response = await fetch(`${API_URL}${statusUrl}`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      const job: JobStatus = await response.json();
+      if (job.status === "done") {
+        return job;
+      }
+      if (job.status === "failed") {
+        throw new Error(job.error ?? "analysis failed");
+      }
+
+      const { stage, done, total } = job.progress;
+      if (stage === "sentiment" && total > 0) {
+        setResult(`Analyzing comments... ${done}/${total}`);
+      } else if (stage === "scrape") {
+        setResult("Collecting comments...");
+      }
+
+      await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+    }
+  };
+
   const handleSubmit = async (e: React.FormEvent<HTMLFormElement>) => {
     e.preventDefault();
 
@@ -19,18 +55,22 @@ const App: React.FC = () => {
     }
 
     try {
+      // submit the analysis as a background job, then poll it until it finishes
       const response = await fetch(
-        `http://127.0.0.1:5000/api/filter?post_id=${encodeURIComponent(instagramLink)}`
+        `${API_URL}/api/filter?async=1&post_id=${encodeURIComponent(instagramLink)}`
       );
 
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const data = await response.json();
-      // Flask should return: { "general_sentiment": "positive" }
-      setResult(`The General Sentiment is: ${data.general_sentiment}`);
+      const { status_url } = await response.json();
       setError(null);
+      setResult("Analyzing comments...");
+
+      const job = await pollJob(status_url);
+      // job result is: { "general_sentiment": "positive" }
+      setResult(`The General Sentiment is: ${job.result?.general_sentiment}`);
     } catch (err) {
       console.error(err);
       setError("Failed to fetch sentiment. Please try again.");